@@ -1,14 +1,20 @@
 import os
+import time
+import uuid
+from datetime import datetime
 from crewai import Crew, Agent, Task
-from langchain_community.llms import HuggingFaceHub
 from agents.market_analysis_agent import MarketAnalysisAgent
 from agents.risk_scoring_agent import RiskScoringAgent
 from agents.project_status_agent import ProjectStatusAgent
 from agents.reporting_agent import ReportingAgent
+from utils.llm import get_llm, get_llm_config
+from utils.pg_database import get_latest_report, get_project_records, get_report_fingerprint, save_risk_report
+from utils.tracing import record_span, span
 # The newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # Do not change this unless explicitly requested by the user
 
-llm = HuggingFaceHub(repo_id="google/flan-t5-base", model_kwargs={"temperature": 0.5, "max_length": 512})
+LLM_CONFIG = get_llm_config()
+llm = get_llm()
 class RiskManagementCrew:
     def __init__(self):
         self.market_analysis_agent = MarketAnalysisAgent(llm).get_agent()
@@ -16,8 +22,27 @@ class RiskManagementCrew:
         self.project_status_agent = ProjectStatusAgent(llm).get_agent()
         self.reporting_agent = ReportingAgent(llm).get_agent()
         
-    def create_crew(self):
-        """Create and return a crew with all the agents"""
+    def create_crew(self, progress_callback=None):
+        """
+        Create and return a crew with all the agents.
+        If given, progress_callback(fraction, message) is called after each task completes.
+        """
+        tasks = self._get_tasks()
+        completed = []
+        # Tasks run one after another, so each one started when the previous one finished
+        task_started_at = [time.time_ns()]
+        
+        def task_callback(output):
+            completed.append(output)
+            finished_at = time.time_ns()
+            record_span("crew.task", task_started_at[0], finished_at, **{
+                "crew.task_index": len(completed),
+                "crew.agent": str(getattr(output, "agent", ""))
+            })
+            task_started_at[0] = finished_at
+            if progress_callback:
+                progress_callback(len(completed) / len(tasks), f"Completed task {len(completed)} of {len(tasks)}")
+        
         crew = Crew(
             agents=[
                 self.market_analysis_agent,
@@ -25,8 +50,9 @@ class RiskManagementCrew:
                 self.project_status_agent,
                 self.reporting_agent
             ],
-            tasks=self._get_tasks(),
-            verbose=True
+            tasks=tasks,
+            verbose=True,
+            task_callback=task_callback
         )
         return crew
     
@@ -60,17 +86,39 @@ class RiskManagementCrew:
         
         return [market_analysis_task, project_status_task, risk_scoring_task, reporting_task]
     
-    def run_risk_assessment(self, project_id=None):
+    def run_risk_assessment(self, project_id=None, progress_callback=None):
         """Run the risk assessment process, optionally for a specific project"""
-        crew = self.create_crew()
-        result = crew.kickoff()
+        crew = self.create_crew(progress_callback)
+        with span("crew.kickoff"):
+            result = crew.kickoff()
         return result
     
-    def get_risk_report(self, project_id):
-        """Get a risk report for a specific project"""
-        # This is a simplified implementation - in a real system, we'd retrieve stored reports
-        crew = self.create_crew()
-        result = crew.kickoff(inputs={"project_id": project_id})
+    def get_risk_report(self, project_id, force_refresh=False, progress_callback=None):
+        """
+        Get a risk report for a specific project.
+        A stored report is reused when the project data and model configuration are unchanged
+        since it was generated; otherwise the crew is run and the new report is stored.
+        """
+        fingerprint = get_report_fingerprint(project_id, model_config=LLM_CONFIG)
+        if not force_refresh:
+            stored_report = get_latest_report(project_id, fingerprint=fingerprint)
+            if stored_report:
+                return stored_report['content']['report']
+        
+        crew = self.create_crew(progress_callback)
+        with span("crew.kickoff", **{"crew.project_id": project_id}):
+            result = str(crew.kickoff(inputs={"project_id": project_id}))
+        
+        projects = get_project_records(project_id)
+        if projects:
+            save_risk_report({
+                'id': uuid.uuid4().hex,
+                'project_id': project_id,
+                'date': datetime.now().strftime('%Y-%m-%d'),
+                'risk_score': projects[0].risk_score,
+                'content': {'report': result},
+                'fingerprint': fingerprint
+            })
         return result
     
     def get_mitigation_strategies(self, risk_factor):
@@ -1,6 +1,8 @@
 import os
 from crewai import Agent
 from langchain_community.llms import HuggingFaceHub
+from langchain_core.tools import Tool
+from utils.vector_store import search_risks
 
 class MarketAnalysisAgent:
     def __init__(self, llm):
@@ -8,8 +10,21 @@ class MarketAnalysisAgent:
         
     def _create_tools(self):
         """Create the tools that the agent can use"""
-        # In a real implementation, you might have custom tools for market analysis
-        return []
+        return [
+            Tool(
+                name="market_intelligence_search",
+                func=self.search_market_intelligence,
+                description="Search the ingested market intelligence documents. "
+                            "Input is a natural language question about market conditions or external risks."
+            )
+        ]
+        
+    def search_market_intelligence(self, query):
+        """Return the market intelligence passages most relevant to the query"""
+        chunks = search_risks(query, n_results=3)
+        if not chunks:
+            return "No relevant market intelligence found."
+        return "\n\n".join(f"[{os.path.basename(chunk['source'])}] {chunk['text']}" for chunk in chunks)
         
     def get_agent(self):
         """Create and return the Market Analysis Agent"""
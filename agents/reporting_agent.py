@@ -1,6 +1,74 @@
 import os
 from crewai import Agent
 from langchain_community.llms import HuggingFaceHub
+from utils.pg_database import RISK_CATEGORIES, get_project_summaries, get_risk_factors_by_project
+from utils.report_templates import get_mitigation_template, get_template, render_template
+
+# Risk factors listed in a report
+REPORT_TOP_FACTORS = 3
+# Projects whose data is fetched per pair of bulk queries in generate_reports()
+REPORT_BATCH_SIZE = 1000
+REPORT_COLUMNS = ['id', 'name', 'status', 'risk_score', 'risk_delta'] + RISK_CATEGORIES
+
+# Shown when a report is requested for a project that is not in the database
+SAMPLE_RISK_DATA = {
+    "project_name": "Sample Project",
+    "overall_risk_score": 6.8,
+    "risk_trend": "Increasing",
+    "risk_categories": {
+        "schedule_risk": 7.2,
+        "budget_risk": 5.8,
+        "resource_risk": 6.5,
+        "technical_risk": 7.4
+    },
+    "top_risk_factors": [
+        {
+            "name": "Technical Complexity",
+            "score": 7.4,
+            "description": "Integration challenges with legacy systems",
+            "mitigation": "Conduct additional integration testing and allocate expert resources"
+        },
+        {
+            "name": "Resource Availability",
+            "score": 6.9,
+            "description": "Key technical specialists overallocated",
+            "mitigation": "Cross-train team members and consider contracting specialists"
+        }
+    ]
+}
+
+def build_risk_data(project, factors):
+    """Build a report's risk data from a project summary and its risk factors, highest scoring first"""
+    delta = project.get('risk_delta')
+    return {
+        "project_id": project['id'],
+        "project_name": project['name'],
+        "overall_risk_score": project.get('risk_score'),
+        "risk_delta": delta,
+        "risk_trend": "Increasing" if delta and delta > 0 else "Decreasing" if delta and delta < 0 else "Stable",
+        "risk_categories": {category: project.get(category) or 0 for category in RISK_CATEGORIES},
+        "top_risk_factors": [
+            {
+                "name": factor['name'],
+                "category": factor.get('category'),
+                "score": (factor.get('impact') or 0) * (factor.get('likelihood') or 0) / 10,
+                "description": factor.get('description'),
+                "mitigation": factor.get('mitigation')
+            }
+            for factor in factors[:REPORT_TOP_FACTORS]
+        ]
+    }
+
+def load_risk_data(project_ids):
+    """Get {project_id: risk data} for the projects that exist, with two bulk queries per REPORT_BATCH_SIZE projects"""
+    project_ids = list(project_ids)
+    risk_data = {}
+    for start in range(0, len(project_ids), REPORT_BATCH_SIZE):
+        batch = project_ids[start:start + REPORT_BATCH_SIZE]
+        factors = get_risk_factors_by_project(batch, limit_per_project=REPORT_TOP_FACTORS)
+        for project in get_project_summaries(batch, columns=REPORT_COLUMNS):
+            risk_data[project['id']] = build_risk_data(project, factors.get(project['id'], []))
+    return risk_data
 
 class ReportingAgent:
     def __init__(self, llm):
@@ -29,139 +97,22 @@ class ReportingAgent:
         
     def generate_report(self, project_id, risk_data=None):
         """Generate a detailed risk report for a specific project"""
-        # This is a simplified implementation
-        
         if not risk_data:
-            # In a real implementation, you would retrieve risk data from a database
-            risk_data = {
-                "project_name": "Sample Project",
-                "overall_risk_score": 6.8,
-                "risk_trend": "Increasing",
-                "risk_categories": {
-                    "schedule_risk": 7.2,
-                    "budget_risk": 5.8,
-                    "resource_risk": 6.5,
-                    "technical_risk": 7.4
-                },
-                "top_risk_factors": [
-                    {
-                        "name": "Technical Complexity",
-                        "score": 7.4,
-                        "description": "Integration challenges with legacy systems",
-                        "mitigation": "Conduct additional integration testing and allocate expert resources"
-                    },
-                    {
-                        "name": "Resource Availability",
-                        "score": 6.9,
-                        "description": "Key technical specialists overallocated",
-                        "mitigation": "Cross-train team members and consider contracting specialists"
-                    }
-                ]
-            }
-        
-        # Generate a report based on the risk data
-        # In a real implementation, this would create a structured report with visualizations
-        return f"""
-        # Risk Report: {risk_data.get('project_name', 'Project')}
-        
-        ## Executive Summary
-        
-        The project currently has an overall risk score of **{risk_data.get('overall_risk_score', 'N/A')}/10**
-        with a **{risk_data.get('risk_trend', 'stable')}** trend. Immediate attention is required for 
-        the following high-risk areas:
-        
-        1. {risk_data.get('top_risk_factors', [{}])[0].get('name', 'No major risks identified')}
-        2. {risk_data.get('top_risk_factors', [{}, {}])[1].get('name', 'No additional major risks') if len(risk_data.get('top_risk_factors', [])) > 1 else 'No additional major risks'}
-        
-        ## Detailed Risk Analysis
-        
-        [Detailed risk metrics and visualization would be included here]
-        
-        ## Recommended Mitigation Strategies
-        
-        {risk_data.get('top_risk_factors', [{}])[0].get('mitigation', 'No mitigation strategies available')}
-        
-        ## Risk Trend Analysis
-        
-        [Risk trend visualization would be included here]
+            risk_data = load_risk_data([project_id]).get(project_id, SAMPLE_RISK_DATA)
+        return render_template("report.md.j2", risk_data=risk_data)
         
+    def generate_reports(self, project_ids):
+        """
+        Generate the risk reports of many projects as {project_id: report}.
+        The data is fetched in bulk and the reports are rendered from templates without calling the LLM.
         """
+        template = get_template("report.md.j2")
+        return {
+            project_id: template.render(risk_data=risk_data)
+            for project_id, risk_data in load_risk_data(project_ids).items()
+        }
         
     def suggest_mitigation_strategy(self, risk_factor):
         """Suggest mitigation strategies for a specific risk factor"""
-        # This is a simplified implementation
-        
         risk_type = risk_factor.get('category', 'unknown').lower() if isinstance(risk_factor, dict) else 'unknown'
-        
-        if risk_type == 'schedule_risk':
-            return """
-            # Mitigation Strategy for Schedule Risk
-            
-            ## Recommended Actions:
-            
-            1. **Buffer Management**: Add buffer periods to critical path activities
-            2. **Resource Optimization**: Allocate additional resources to high-risk activities
-            3. **Dependency Review**: Re-evaluate and potentially restructure task dependencies
-            4. **Milestone Tracking**: Implement more frequent milestone reviews
-            5. **Scope Control**: Consider reducing non-essential scope elements
-            
-            ## Implementation Timeline:
-            
-            - **Immediate**: Review critical path and identify potential schedule compression opportunities
-            - **Short-term**: Allocate additional resources to at-risk activities
-            - **Ongoing**: Weekly schedule risk assessment and adjustment
-            
-            ## Success Metrics:
-            
-            - Schedule Performance Index (SPI) improved to >0.95
-            - All critical milestones met within 3 business days of baseline
-            - No further schedule deterioration in monthly assessments
-            """
-        elif risk_type == 'budget_risk':
-            return """
-            # Mitigation Strategy for Budget Risk
-            
-            ## Recommended Actions:
-            
-            1. **Cost Control**: Implement enhanced cost tracking and approval processes
-            2. **Vendor Management**: Renegotiate terms with key suppliers
-            3. **Scope Management**: Review requirements for potential descoping opportunities
-            4. **Resource Optimization**: Evaluate resource utilization and adjust allocation
-            5. **Contingency Planning**: Review and potentially increase contingency reserves
-            
-            ## Implementation Timeline:
-            
-            - **Immediate**: Conduct cost variance analysis and identify saving opportunities
-            - **Short-term**: Implement revised approval processes for all expenditures
-            - **Ongoing**: Bi-weekly budget reviews with stakeholders
-            
-            ## Success Metrics:
-            
-            - Cost Performance Index (CPI) improved to >0.95
-            - Monthly expenditure within 5% of revised budget
-            - Identified cost savings of at least 10% in non-critical areas
-            """
-        else:
-            return """
-            # Mitigation Strategy
-            
-            ## Recommended Actions:
-            
-            1. **Risk Assessment**: Conduct detailed analysis of the risk factor
-            2. **Stakeholder Engagement**: Engage relevant stakeholders to develop mitigation plan
-            3. **Monitoring Plan**: Establish clear metrics for tracking the risk
-            4. **Contingency Planning**: Develop contingency plans for worst-case scenarios
-            5. **Regular Review**: Schedule periodic reviews of risk status and mitigation effectiveness
-            
-            ## Implementation Timeline:
-            
-            - **Immediate**: Assign risk owner and begin detailed assessment
-            - **Short-term**: Develop and begin implementing mitigation plan
-            - **Ongoing**: Regular monitoring and adjustment of mitigation strategies
-            
-            ## Success Metrics:
-            
-            - Risk score reduction of at least 20% within one month
-            - No major impacts to project objectives from this risk factor
-            - Stakeholder confidence in risk management approach
-            """
\ No newline at end of file
+        return get_mitigation_template(risk_type).render(risk_factor=risk_factor)
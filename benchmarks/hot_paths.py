@@ -0,0 +1,227 @@
+"""
+Benchmark suite for the data layer, scoring, search and visualization hot paths.
+
+Each benchmark runs against a synthetic SQLite portfolio (see benchmarks.portfolio)
+at every requested scale, with the LLM stubbed out. Results are written as JSON so
+a later run can be compared with a stored baseline. The figure cache is cleared
+before every timed run, so figure benchmarks measure building the figure; those
+named *.cache_hit measure a repeated call served from the cache instead.
+
+Usage:
+    python -m benchmarks.hot_paths [--scales 10,100,1000,10000] [--repeat 5]
+                                   [--only db.] [--output results.json]
+                                   [--compare baseline.json] [--tolerance 1.2]
+
+--compare exits with status 1 if any benchmark's median is slower than the
+baseline by more than the tolerance factor.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+# Imported first: it configures the environment the application modules read on import
+from benchmarks.portfolio import load_portfolio
+import pandas as pd
+from agents.risk_scoring_agent import RiskScoringAgent
+from components.dashboard import create_dashboard, create_project_table, create_risk_category_gauges, create_risk_scatter_plot
+from components.risk_visualizations import bin_risk_factors, create_portfolio_risk_heatmap, create_risk_bubble_chart, create_risk_matrix
+from utils.figure_cache import figure_cache
+from utils.pg_database import get_projects, get_risk_factor_counts, iter_project_risk_factors, search_similar_risks
+
+DEFAULT_SCALES = [10, 100, 1000, 10000]
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "hot_paths.json")
+SEARCH_QUERY = "supply chain delays and vendor price increases"
+
+BENCHMARKS = {}
+
+def benchmark(name, warm_cache=False):
+    """
+    Register a benchmark; it is called with the portfolio fixture dict for the current scale.
+    With warm_cache the figure cache is kept between runs, so repeated figures are cache hits.
+    """
+    def decorator(func):
+        func.warm_cache = warm_cache
+        BENCHMARKS[name] = func
+        return func
+    return decorator
+
+@benchmark("db.get_projects")
+def bench_get_projects(fixture):
+    get_projects()
+
+@benchmark("db.search_similar_risks")
+def bench_search_similar_risks(fixture):
+    search_similar_risks(SEARCH_QUERY, n_results=5)
+
+@benchmark("scoring.score_project_risk")
+def bench_score_project_risk(fixture):
+    # The same per-project inputs the scheduler builds when rescoring the portfolio
+    scorer = fixture['scorer']
+    for project_id, factors in iter_project_risk_factors():
+        project_data = {}
+        for factor in factors:
+            project_data.setdefault(f"{factor.category}_factors", []).append(
+                {'name': factor.name, 'impact': factor.impact or 0, 'likelihood': factor.likelihood or 0}
+            )
+        scorer.score_project_risk(project_id, project_data)
+
+@benchmark("dashboard.dataframe")
+def bench_dashboard_dataframe(fixture):
+    pd.DataFrame(fixture['projects'])
+
+@benchmark("dashboard.risk_scatter_plot")
+def bench_risk_scatter_plot(fixture):
+    create_risk_scatter_plot(pd.DataFrame(fixture['projects']))
+
+@benchmark("dashboard.risk_scatter_plot.cache_hit", warm_cache=True)
+def bench_risk_scatter_plot_cache_hit(fixture):
+    create_risk_scatter_plot(pd.DataFrame(fixture['projects']))
+
+@benchmark("dashboard.category_gauges")
+def bench_category_gauges(fixture):
+    create_risk_category_gauges(pd.DataFrame(fixture['projects']))
+
+@benchmark("dashboard.project_table")
+def bench_project_table(fixture):
+    create_project_table()
+
+@benchmark("dashboard.create_dashboard")
+def bench_create_dashboard(fixture):
+    create_dashboard(fixture['projects'])
+
+@benchmark("visualization.risk_matrix")
+def bench_risk_matrix(fixture):
+    create_risk_matrix(fixture['largest_project'])
+
+@benchmark("visualization.portfolio_risk_matrix")
+def bench_portfolio_risk_matrix(fixture):
+    create_portfolio_risk_heatmap(bin_risk_factors(*get_risk_factor_counts()))
+
+@benchmark("visualization.risk_bubble_chart")
+def bench_risk_bubble_chart(fixture):
+    create_risk_bubble_chart(pd.DataFrame(fixture['portfolio_rows']))
+
+def make_fixture(n_projects, directory):
+    """Load a portfolio of n_projects and precompute the inputs the benchmarks share."""
+    load_portfolio(n_projects, directory=directory)
+    projects = get_projects()
+    return {
+        'projects': projects,
+        'largest_project': max(projects, key=lambda project: len(project['risk_factors'])),
+        # The rows visualize_portfolio_risks() builds for the bubble chart
+        'portfolio_rows': [
+            {
+                'name': p['name'], 'id': p['id'], 'risk_score': p['risk_score'],
+                'schedule_risk': p.get('schedule_risk', 0), 'budget_risk': p.get('budget_risk', 0),
+                'resource_risk': p.get('resource_risk', 0), 'market_risk': p.get('market_risk', 0),
+                'technical_risk': p.get('technical_risk', 0), 'budget': p.get('budget', 0), 'status': p['status']
+            }
+            for p in projects
+        ],
+        'scorer': RiskScoringAgent(llm=None)
+    }
+
+def time_benchmark(func, fixture, repeat):
+    """
+    Run func once to warm up, then `repeat` timed runs; returns the timings in seconds. Unless
+    func is registered with warm_cache, the figure cache is cleared before each run.
+    """
+    func(fixture)
+    timings = []
+    for _ in range(repeat):
+        if not func.warm_cache:
+            figure_cache.clear()
+        start = time.perf_counter()
+        func(fixture)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(scales, repeat, only=None):
+    """Run every registered benchmark (or those whose names start with `only`) at each scale."""
+    results = []
+    with tempfile.TemporaryDirectory(prefix="risk_benchmark_") as directory:
+        for scale in scales:
+            start = time.perf_counter()
+            fixture = make_fixture(scale, directory)
+            print(f"\n{scale:,} projects (loaded in {time.perf_counter() - start:.1f} s)")
+            print(f"{'benchmark':<34} {'min (ms)':>10} {'median (ms)':>12} {'max (ms)':>10}")
+            for name, func in BENCHMARKS.items():
+                if only and not name.startswith(only):
+                    continue
+                timings = time_benchmark(func, fixture, repeat)
+                result = {
+                    'benchmark': name,
+                    'scale': scale,
+                    'repeat': repeat,
+                    'min_s': min(timings),
+                    'median_s': statistics.median(timings),
+                    'max_s': max(timings)
+                }
+                results.append(result)
+                print(f"{name:<34} {result['min_s'] * 1e3:>10.2f} {result['median_s'] * 1e3:>12.2f} {result['max_s'] * 1e3:>10.2f}")
+    return results
+
+def compare(results, baseline, tolerance):
+    """Print median ratios against a baseline; returns the (benchmark, scale) pairs that regressed."""
+    baseline_medians = {(entry['benchmark'], entry['scale']): entry['median_s'] for entry in baseline['results']}
+    regressions = []
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp', 'unknown time')})")
+    for result in results:
+        key = (result['benchmark'], result['scale'])
+        if key not in baseline_medians:
+            continue
+        ratio = result['median_s'] / baseline_medians[key]
+        flag = "  REGRESSION" if ratio > tolerance else ""
+        print(f"{result['benchmark']:<34} {result['scale']:>8,} {ratio:>7.2f}x{flag}")
+        if ratio > tolerance:
+            regressions.append(key)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)),
+                        help="comma-separated portfolio sizes, up to 100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", help="only run benchmarks whose names start with this prefix")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", help="baseline results JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="slowdown factor reported as a regression")
+    args = parser.parse_args()
+
+    # Read the baseline first; it may be the file this run is about to overwrite
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    scales = [int(scale) for scale in args.scales.split(",")]
+    results = run_suite(scales, args.repeat, args.only)
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if baseline and compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Accuracy and latency benchmark for chat query routing.
+
+Compares the intent router with the keyword cascade process_query() used before,
+on a labeled set of queries that is separate from the router's training examples.
+
+Usage:
+    python -m benchmarks.intent_routing [--repeat 200]
+"""
+import argparse
+import statistics
+import time
+from utils.intent_router import get_router, route_query
+
+LABELED_QUERIES = [
+    ("What's the status of Project Alpha?", 'project_status'),
+    ("How is Project Epsilon going?", 'project_status'),
+    ("Is the Beta project behind schedule?", 'project_status'),
+    ("Give me an update on project gamma", 'project_status'),
+    ("status please", 'project_status'),
+    ("How are our projects doing right now?", 'project_status'),
+    ("Can I get a report of portfolio risks?", 'risk_report'),
+    ("Summarize the risk scores", 'risk_report'),
+    ("Which projects are the riskiest?", 'risk_report'),
+    ("I need a risk overview for leadership", 'risk_report'),
+    ("List projects and their risk levels", 'risk_report'),
+    ("Show a summary report of the project statuses", 'risk_report'),
+    ("How do we mitigate hardware delays?", 'mitigation'),
+    ("What can be done about user adoption risk?", 'mitigation'),
+    ("Suggest strategies for budget overruns", 'mitigation'),
+    ("How should we handle integration issues with legacy systems?", 'mitigation'),
+    ("Ways to reduce schedule slippage", 'mitigation'),
+    ("What actions lower the risk of cost escalation?", 'mitigation'),
+    ("Is risk going up for Project Gamma?", 'risk_trend'),
+    ("Which projects are trending worse?", 'risk_trend'),
+    ("Show me how risk scores changed over time", 'risk_trend'),
+    ("Are any risks decreasing?", 'risk_trend'),
+    ("Has risk improved since last quarter?", 'risk_trend'),
+    ("What's the risk trend for the portfolio?", 'risk_trend'),
+    ("What is a risk register?", 'general'),
+    ("Hi there", 'general'),
+    ("Explain how likelihood is estimated", 'general'),
+    ("What are typical risks for data center migrations?", 'general'),
+    ("Who are you?", 'general'),
+    ("Why does impact matter more than likelihood?", 'general'),
+]
+
+def keyword_route(query):
+    """The keyword cascade that process_query() used before the intent router."""
+    query_lower = query.lower()
+    if "status" in query_lower and ("project" in query_lower or "projects" in query_lower):
+        return 'project_status'
+    elif "report" in query_lower or "summary" in query_lower:
+        return 'risk_report'
+    elif "mitigation" in query_lower or "strategies" in query_lower:
+        return 'mitigation'
+    elif "trend" in query_lower or "increasing" in query_lower or "decreasing" in query_lower:
+        return 'risk_trend'
+    return 'general'
+
+def router_route(query):
+    return route_query(query)[0]
+
+def evaluate(route, repeat):
+    correct = sum(route(query) == label for query, label in LABELED_QUERIES)
+    timings = []
+    for _ in range(repeat):
+        for query, _label in LABELED_QUERIES:
+            start = time.perf_counter()
+            route(query)
+            timings.append((time.perf_counter() - start) * 1e6)
+    timings.sort()
+    return {
+        'accuracy': correct / len(LABELED_QUERIES),
+        'p50_us': statistics.median(timings),
+        'p95_us': timings[int(len(timings) * 0.95) - 1]
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    get_router()
+    print(f"Router built in {(time.perf_counter() - start) * 1e3:.1f} ms")
+    print(f"{'router':<10} {'accuracy':>9} {'p50 (us)':>10} {'p95 (us)':>10}")
+    for label, route in [("keyword", keyword_route), ("intent", router_route)]:
+        result = evaluate(route, args.repeat)
+        print(f"{label:<10} {result['accuracy']:>9.0%} {result['p50_us']:>10.1f} {result['p95_us']:>10.1f}")
+
+    misrouted = [(query, label, route_query(query)) for query, label in LABELED_QUERIES if router_route(query) != label]
+    for query, label, (intent, confidence) in misrouted:
+        print(f"  misrouted: {query!r} expected {label}, got {intent} ({confidence:.2f})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Synthetic project portfolios for the benchmarks.
+
+generate_portfolio() builds project dicts in the same shape as the sample data in
+initialize_database(), with risk factors and risk history, deterministically from
+a seed. load_portfolio() bulk-inserts a portfolio into a fresh SQLite database and
+points utils.pg_database at it, so the real read paths can be timed at any scale.
+"""
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+
+# utils.pg_database connects on import; benchmarks never touch the configured database
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Keep the LLM and tracing out of the measurements
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("TRACE_EXPORT_PATH", "")
+
+from sqlalchemy import create_engine
+from utils import pg_database
+from utils.pg_database import Base, Project, RiskFactor, RiskHistory
+
+STATUSES = ['At Risk', 'In Progress', 'On Track', 'Planning']
+CATEGORIES = ['schedule_risk', 'budget_risk', 'resource_risk', 'market_risk', 'technical_risk']
+RISK_NAMES = [
+    'Supply Chain Delays', 'Budget Overrun', 'Key Staff Turnover', 'Regulatory Changes',
+    'Integration Complexity', 'Vendor Price Increases', 'Scope Creep', 'Technical Debt',
+    'User Adoption', 'Currency Fluctuation', 'Hardware Shortages', 'Security Vulnerabilities'
+]
+INSERT_BATCH_SIZE = 5000
+
+def generate_portfolio(n_projects, factors_per_project=4, history_per_project=6, seed=0):
+    """Yield n_projects synthetic project dicts with nested risk_factors and risk_history lists."""
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    for i in range(n_projects):
+        category_scores = {category: round(rng.uniform(1, 10), 1) for category in CATEGORIES}
+        risk_score = round(sum(category_scores.values()) / len(CATEGORIES), 1)
+        budget = rng.randrange(50_000, 5_000_000, 1000)
+        project_start = start + timedelta(days=rng.randrange(365))
+        history_scores = [round(min(10, max(0, risk_score + rng.uniform(-2, 2))), 1) for _ in range(history_per_project - 1)]
+        history_scores.append(risk_score)
+        yield {
+            'id': f"PRJ{i + 1:06d}",
+            'name': f"Project {i + 1:06d}",
+            'description': f"Synthetic benchmark project {i + 1}",
+            'status': rng.choice(STATUSES),
+            'start_date': project_start.isoformat(),
+            'end_date': (project_start + timedelta(days=rng.randrange(90, 720))).isoformat(),
+            'budget': budget,
+            'spent': round(budget * rng.random()),
+            'team_size': rng.randrange(3, 60),
+            'risk_score': risk_score,
+            'risk_delta': round(risk_score - history_scores[-2], 1) if history_per_project > 1 else 0.0,
+            **category_scores,
+            'risk_factors': [
+                {
+                    'name': rng.choice(RISK_NAMES),
+                    'description': f"Synthetic risk factor {j + 1} for project {i + 1}",
+                    'category': rng.choice(CATEGORIES),
+                    'impact': rng.randrange(1, 11),
+                    'likelihood': rng.randrange(1, 11),
+                    'mitigation': "Synthetic mitigation strategy"
+                }
+                for j in range(factors_per_project)
+            ],
+            'risk_history': [
+                {'date': (start + timedelta(days=30 * k)).isoformat(), 'risk_score': score}
+                for k, score in enumerate(history_scores)
+            ]
+        }
+
+def use_database(url):
+    """Point utils.pg_database (engine and sessions) at another database."""
+    engine = create_engine(url)
+    pg_database.engine = engine
+    pg_database.Session.configure(bind=engine)
+    pg_database._schema_ready = False
+    return engine
+
+def _insert(connection, table, rows):
+    if rows:
+        connection.execute(table.insert(), rows)
+        rows.clear()
+
+def load_portfolio(n_projects, directory=None, **portfolio_options):
+    """
+    Create a SQLite database holding a synthetic portfolio of n_projects and make it
+    the active database. Returns the database file path.
+    """
+    directory = directory or tempfile.mkdtemp(prefix="risk_benchmark_")
+    path = os.path.join(directory, f"portfolio_{n_projects}.db")
+    if os.path.exists(path):
+        os.remove(path)
+    engine = use_database(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+
+    projects, factors, history = [], [], []
+    with engine.begin() as connection:
+        for project in generate_portfolio(n_projects, **portfolio_options):
+            project = dict(project)
+            factors.extend({'project_id': project['id'], **factor} for factor in project.pop('risk_factors'))
+            history.extend({'project_id': project['id'], **entry} for entry in project.pop('risk_history'))
+            projects.append(project)
+            if len(projects) >= INSERT_BATCH_SIZE:
+                _insert(connection, Project.__table__, projects)
+                _insert(connection, RiskFactor.__table__, factors)
+                _insert(connection, RiskHistory.__table__, history)
+        _insert(connection, Project.__table__, projects)
+        _insert(connection, RiskFactor.__table__, factors)
+        _insert(connection, RiskHistory.__table__, history)
+        # Core inserts bypass the session events that keep the data version current
+        pg_database.bump_data_version(connection)
+    # Adds the columns and indexes that create_all() leaves to the upgrade step
+    pg_database.initialize_database()
+    return path
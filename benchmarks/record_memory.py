@@ -0,0 +1,66 @@
+"""
+Memory and build-time benchmark for risk factor read paths.
+
+Compares building one dict per row (the shape returned by RiskFactor.to_dict())
+with building slotted RiskFactorRecord objects straight from row tuples.
+
+Usage:
+    python -m benchmarks.record_memory [--rows 1000000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from utils.records import RiskFactorRecord
+
+CATEGORIES = ['schedule_risk', 'budget_risk', 'resource_risk', 'market_risk', 'technical_risk']
+COLUMNS = ['id', 'project_id', 'name', 'description', 'category', 'impact', 'likelihood', 'mitigation']
+
+def make_rows(n_rows):
+    """Generate synthetic risk factor row tuples in table column order."""
+    return [
+        (
+            i,
+            f"PRJ{i // 4:07d}",
+            f"Risk factor {i}",
+            "Synthetic risk factor description",
+            CATEGORIES[i % len(CATEGORIES)],
+            i % 10 + 1,
+            (i * 7) % 10 + 1,
+            "Synthetic mitigation strategy"
+        )
+        for i in range(n_rows)
+    ]
+
+def build_dicts(rows):
+    return [dict(zip(COLUMNS, row)) for row in rows]
+
+def build_records(rows):
+    return [RiskFactorRecord(*row) for row in rows]
+
+def measure(builder, rows):
+    """Return (seconds, bytes allocated) for building all rows with `builder`."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = builder(rows)
+    elapsed = time.perf_counter() - start
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, allocated
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    print(f"Building {args.rows:,} risk factors")
+    print(f"{'layout':<10} {'build (s)':>10} {'total (MB)':>12} {'bytes/row':>10}")
+    for label, builder in [("dict", build_dicts), ("record", build_records)]:
+        elapsed, allocated = measure(builder, rows)
+        print(f"{label:<10} {elapsed:>10.3f} {allocated / 1e6:>12.1f} {allocated / args.rows:>10.1f}")
+
+if __name__ == "__main__":
+    main()
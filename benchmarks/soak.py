@@ -0,0 +1,229 @@
+"""
+Load and soak test for concurrent Streamlit sessions.
+
+Streamlit runs every session as a thread in one server process, so each simulated
+session is a thread that repeatedly does what a rerun of app.py does: initialize
+the database, load the projects and render a page (the dashboard, the portfolio
+visualizations or a chat turn). The Streamlit calls run headless and the LLM is
+the stub backend.
+
+Every report interval it prints throughput, latency percentiles, database
+connection pool usage and process RSS, and at the end the RSS growth rate over the
+second half of the run, which should be close to zero once caches are warm.
+
+Usage:
+    python -m benchmarks.soak [--sessions 20] [--duration 60] [--projects 100]
+                              [--database-url postgresql://...] [--output load.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+# Imported first: it configures the environment the application modules read on import
+from benchmarks.portfolio import load_portfolio, use_database
+import numpy as np
+from benchmarks.intent_routing import LABELED_QUERIES
+from components.chat_interface import process_query
+from components.dashboard import create_dashboard
+from components.risk_visualizations import visualize_portfolio_risks
+from utils import pg_database
+from utils.pg_database import get_projects, initialize_database, query_projects
+
+# Relative frequency of each page among simulated reruns
+PAGE_WEIGHTS = {'dashboard': 0.4, 'portfolio': 0.2, 'chat': 0.4}
+# RSS growth per minute over the second half of a run that is reported as a possible leak
+LEAK_THRESHOLD_MB_PER_MINUTE = 1.0
+
+def render_dashboard(rng):
+    result = query_projects()
+    create_dashboard(result['projects'], facets=result['facets'])
+
+def render_portfolio(rng):
+    visualize_portfolio_risks(get_projects())
+
+def render_chat(rng):
+    process_query(rng.choice(LABELED_QUERIES)[0])
+
+PAGES = {'dashboard': render_dashboard, 'portfolio': render_portfolio, 'chat': render_chat}
+
+def current_rss_bytes():
+    """Resident set size of this process (peak RSS where the current value is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+class LoadStats:
+    """Latencies and errors per page, shared by all session threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.interval_latencies = []
+
+    def record(self, page, seconds, error=None):
+        with self.lock:
+            self.latencies[page].append(seconds)
+            self.interval_latencies.append(seconds)
+            if error is not None:
+                self.errors[f"{page}: {type(error).__name__}"] += 1
+
+    def take_interval(self):
+        with self.lock:
+            latencies, self.interval_latencies = self.interval_latencies, []
+        return latencies
+
+def run_session(session_index, stats, stop, think_time, seed):
+    """One simulated user: rerun the app on a random page until told to stop."""
+    rng = random.Random(seed + session_index)
+    pages, weights = zip(*PAGE_WEIGHTS.items())
+    while not stop.is_set():
+        page = rng.choices(pages, weights)[0]
+        start = time.perf_counter()
+        error = None
+        try:
+            # Every rerun of app.py initializes the database before rendering
+            initialize_database()
+            PAGES[page](rng)
+        except Exception as e:
+            error = e
+        stats.record(page, time.perf_counter() - start, error)
+        if think_time:
+            stop.wait(rng.uniform(0, 2 * think_time))
+
+def pool_status():
+    """Checked-out connections and pool size of the application's engine."""
+    pool = pg_database.engine.pool
+    checked_out = pool.checkedout() if hasattr(pool, "checkedout") else 0
+    size = pool.size() if hasattr(pool, "size") else 0
+    return checked_out, size
+
+def _percentiles(values):
+    if not values:
+        return 0.0, 0.0, 0.0
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, [50, 95, 99])
+    return p50, p95, p99
+
+def rss_growth_mb_per_minute(samples):
+    """Least-squares slope of RSS over the second half of the (elapsed seconds, bytes) samples."""
+    tail = samples[len(samples) // 2:]
+    if len(tail) < 2:
+        return 0.0
+    elapsed, rss = np.array(tail, dtype=float).T
+    slope = np.polyfit(elapsed, rss, 1)[0]
+    return slope * 60 / 1024 ** 2
+
+def run_load(sessions, duration, report_interval, think_time, seed=0, out=None):
+    """Run the simulated sessions for `duration` seconds, printing a line to `out` every report_interval."""
+    stats = LoadStats()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=run_session, args=(i, stats, stop, think_time, seed), name=f"session-{i}", daemon=True)
+        for i in range(sessions)
+    ]
+    rss_samples = []
+    max_checked_out = 0
+    start = time.perf_counter()
+    baseline_rss = current_rss_bytes()
+    for thread in threads:
+        thread.start()
+
+    print(f"{'elapsed (s)':>11} {'ops/s':>8} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9} {'db conns':>9} {'rss (MB)':>9}", file=out)
+    last_report = start
+    while True:
+        now = time.perf_counter()
+        if now - start >= duration:
+            break
+        # Sample the pool often; it is only briefly exhausted under contention
+        stop.wait(min(0.1, duration - (now - start)))
+        checked_out, pool_size = pool_status()
+        max_checked_out = max(max_checked_out, checked_out)
+        now = time.perf_counter()
+        if now - last_report >= report_interval:
+            latencies = stats.take_interval()
+            rss = current_rss_bytes()
+            rss_samples.append((now - start, rss))
+            p50, p95, p99 = _percentiles(latencies)
+            print(f"{now - start:>11.0f} {len(latencies) / (now - last_report):>8.1f} {p50:>9.1f} {p95:>9.1f} {p99:>9.1f} "
+                  f"{checked_out:>4}/{pool_size:<4} {rss / 1024 ** 2:>9.1f}", file=out, flush=True)
+            last_report = now
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    rss_samples.append((elapsed, current_rss_bytes()))
+
+    pages = {}
+    for page, latencies in stats.latencies.items():
+        p50, p95, p99 = _percentiles(latencies)
+        pages[page] = {'count': len(latencies), 'ops_per_s': len(latencies) / elapsed, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+    return {
+        'sessions': sessions,
+        'duration_s': elapsed,
+        'operations': sum(page['count'] for page in pages.values()),
+        'ops_per_s': sum(page['count'] for page in pages.values()) / elapsed,
+        'pages': pages,
+        'errors': dict(stats.errors),
+        'max_db_connections_checked_out': max_checked_out,
+        'db_pool_size': pool_status()[1],
+        'rss_start_mb': baseline_rss / 1024 ** 2,
+        'rss_end_mb': rss_samples[-1][1] / 1024 ** 2,
+        'rss_growth_mb_per_minute': rss_growth_mb_per_minute(rss_samples)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60, help="seconds to run; use hours for a soak test")
+    parser.add_argument("--report-interval", type=float, default=5)
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean seconds between a session's reruns")
+    parser.add_argument("--projects", type=int, default=100, help="size of the synthetic SQLite portfolio")
+    parser.add_argument("--database-url", help="run against this database (e.g. a local Postgres) instead")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the summary as JSON to this file")
+    args = parser.parse_args()
+
+    # Streamlit warns on every call made outside a running app
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    if args.database_url:
+        use_database(args.database_url)
+        initialize_database()
+    else:
+        load_portfolio(args.projects)
+
+    # initialize_database() prints on every rerun; only the report goes to the terminal
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        summary = run_load(args.sessions, args.duration, args.report_interval, args.think_time, args.seed, out=sys.__stdout__)
+
+    print(f"\n{summary['operations']:,} operations in {summary['duration_s']:.0f} s ({summary['ops_per_s']:.1f}/s) "
+          f"from {summary['sessions']} sessions")
+    print(f"{'page':<10} {'count':>7} {'ops/s':>7} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for page, result in sorted(summary['pages'].items()):
+        print(f"{page:<10} {result['count']:>7} {result['ops_per_s']:>7.1f} {result['p50_ms']:>9.1f} "
+              f"{result['p95_ms']:>9.1f} {result['p99_ms']:>9.1f}")
+    print(f"DB connections: at most {summary['max_db_connections_checked_out']} checked out (pool size {summary['db_pool_size']})")
+    print(f"RSS: {summary['rss_start_mb']:.0f} MB -> {summary['rss_end_mb']:.0f} MB, "
+          f"{summary['rss_growth_mb_per_minute']:+.2f} MB/min over the second half")
+    if summary['rss_growth_mb_per_minute'] > LEAK_THRESHOLD_MB_PER_MINUTE:
+        print("  RSS is still growing; possible leak")
+    for error, count in summary['errors'].items():
+        print(f"  error: {error} x{count}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+
+if __name__ == "__main__":
+    main()
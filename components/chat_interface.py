@@ -1,15 +1,19 @@
 import streamlit as st
 import datetime
 import json
-from langchain_community.llms import HuggingFaceHub
+import logging
 from agents.crew_setup import RiskManagementCrew
-from utils.pg_database import get_projects, get_project, search_similar_risks
-from utils.vector_store import search_risks
-
-llm = HuggingFaceHub(
-    repo_id="google/flan-t5-base",
-    model_kwargs={"temperature": 0.5, "max_length": 512}
-)
+from utils.pg_database import get_project_summaries
+from utils.entity_matcher import extract_project_ids
+from utils.context_builder import build_context, count_tokens
+from utils.intent_router import route_query
+from utils.llm import LLMUnavailableError, get_llm
+from utils.tracing import span
+
+llm = get_llm()
+logger = logging.getLogger(__name__)
+# Most projects a single status query will ask the LLM about
+MAX_STATUS_PROJECTS = 3
 
 def create_chat_interface():
     if "messages" not in st.session_state:
@@ -35,69 +39,91 @@ def create_chat_interface():
 
 def process_query(query):
     try:
-        query_lower = query.lower()
-        if "status" in query_lower and ("project" in query_lower or "projects" in query_lower):
-            return handle_project_status_query(query)
-        elif "report" in query_lower or "summary" in query_lower:
-            return handle_risk_report_query(query)
-        elif "mitigation" in query_lower or "strategies" in query_lower:
-            return handle_mitigation_query(query)
-        elif "trend" in query_lower or "increasing" in query_lower or "decreasing" in query_lower:
-            return handle_risk_trend_query(query)
-        else:
-            return handle_general_query(query)
+        with span("chat.process_query", **{"chat.query_chars": len(query)}) as current:
+            # Low-confidence queries are routed to the general (LLM) handler
+            intent, confidence = route_query(query)
+            current.set_attribute("chat.intent", intent)
+            current.set_attribute("chat.confidence", confidence)
+            handler = QUERY_HANDLERS.get(intent, handle_general_query)
+            with span(f"chat.handler.{intent}"):
+                return handler(query)
+    except LLMUnavailableError as e:
+        wait = f" in about {e.retry_after:.0f} seconds" if e.retry_after else " in a moment"
+        return f"The language model is temporarily unavailable ({e}). Please try again{wait}."
     except Exception as e:
         return f"I encountered an error while processing your query: {str(e)}. Could you please rephrase your question?"
 
 def handle_project_status_query(query):
-    projects = get_projects()
-    project = projects[0] if projects else None
-    if not project:
-        return "No projects available to analyze."
-
-    prompt = f"What is the current risk status of the project named {project['name']}?"
-    return llm.invoke(prompt)
+    project_ids = extract_project_ids(query)[:MAX_STATUS_PROJECTS]
+    if not project_ids:
+        # No specific project named: answer from the lightweight summaries without the LLM
+        projects = get_project_summaries()
+        if not projects:
+            return "No projects available to analyze."
+        status = "Here is the current status of all projects:\n\n"
+        for p in projects:
+            status += f"- **{p['name']}**: {p['status']}, Risk Score {p['risk_score']}/10\n"
+        return status
+
+    responses = []
+    for project in get_project_summaries(project_ids):
+        prompt = (
+            f"What is the current risk status of the project named {project['name']}? "
+            f"Its status is {project['status']} and its risk score is {project['risk_score']}/10."
+        )
+        responses.append(f"**{project['name']}**: {llm.invoke(prompt)}")
+    return "\n\n".join(responses)
 
 def handle_risk_report_query(query):
-    projects = get_projects()
-    summary = "Here is the current risk summary across all available projects:
-
-"
+    # Restrict the summary to any projects named in the query
+    project_ids = extract_project_ids(query) or None
+    projects = get_project_summaries(project_ids)
+    scope = "the requested projects" if project_ids else "all available projects"
+    summary = f"Here is the current risk summary across {scope}:\n\n"
     for p in projects:
-        summary += f"- **{p['name']}**: Risk Score {p['risk_score']}/10, Status: {p['status']}
-"
+        summary += f"- **{p['name']}**: Risk Score {p['risk_score']}/10, Status: {p['status']}\n"
     return summary
 
 def handle_mitigation_query(query):
-    risks = search_similar_risks(query)
-    if not risks:
+    context = build_context(query, sources=('risk_factors',))
+    if not context.snippets:
         return "I could not find any matching risks. Please refine your query."
-    top_risk = risks[0]
-    prompt = f"What are mitigation strategies for the following risk: {top_risk['name']}?
-
-Description: {top_risk['description']}"
+    prompt = f"What are mitigation strategies for the following risks?\n\n{context.text}"
+    log_prompt("mitigation", prompt, context)
     return llm.invoke(prompt)
 
 def handle_risk_trend_query(query):
-    projects = get_projects()
-    trends = "Risk trend analysis:
-
-"
+    project_ids = extract_project_ids(query) or None
+    projects = get_project_summaries(project_ids)
+    trends = "Risk trend analysis:\n\n"
     for p in projects:
-        delta = p.get('risk_delta', 0)
+        delta = p.get('risk_delta') or 0
         if delta > 0:
             trend = "⬆️ Increasing"
         elif delta < 0:
             trend = "⬇️ Decreasing"
         else:
             trend = "⏸ Stable"
-        trends += f"- **{p['name']}**: {trend} (Δ{delta})
-"
+        trends += f"- **{p['name']}**: {trend} (Δ{delta})\n"
     return trends
 
 def handle_general_query(query):
-    memory = search_risks(query)
-    prompt = f"Context: {memory}
+    context = build_context(query)
+    prompt = f"Context:\n{context.text}\n\nAnswer this user query about project risk management: {query}"
+    log_prompt("general", prompt, context)
+    return llm.invoke(prompt)
 
-Answer this user query about project risk management: {query}"
-    return llm.invoke(prompt)
\ No newline at end of file
+def log_prompt(handler, prompt, context):
+    """Record the prompt size and context assembly time for a request"""
+    logger.info(
+        "%s prompt: %d tokens (%d context tokens from %d snippets), assembled in %.1f ms",
+        handler, count_tokens(prompt), context.tokens, len(context.snippets), context.assembly_ms
+    )
+
+QUERY_HANDLERS = {
+    'project_status': handle_project_status_query,
+    'risk_report': handle_risk_report_query,
+    'mitigation': handle_mitigation_query,
+    'risk_trend': handle_risk_trend_query,
+    'general': handle_general_query,
+}
\ No newline at end of file
@@ -2,19 +2,137 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 import datetime
-from utils.pg_database import get_projects, get_risk_factors
+import json
+import math
+from components.risk_visualizations import (
+    STATUS_COLORS, add_status_legend, add_top_risk_labels, portfolio_matrix_fragment, status_marker_colors, use_webgl
+)
+from utils.figure_cache import cached_figure
+from utils.pg_database import (
+    RISK_BANDS, RISK_CATEGORIES, get_data_version, get_project_page, get_projects, get_risk_factors,
+    get_top_risk_factors, query_projects
+)
 
-def create_dashboard(projects):
-    """Create the main risk dashboard display"""
+PROJECT_STATUSES = ['At Risk', 'In Progress', 'On Track', 'Planning']
+TABLE_PAGE_SIZES = [25, 50, 100]
+# Sort choices offered in the project table, mapped to indexed columns
+TABLE_SORT_OPTIONS = {'Overall Risk': 'risk_score', 'Project Name': 'name', 'Status': 'status'}
+TABLE_RISK_COLUMNS = ['Overall Risk', 'Schedule Risk', 'Budget Risk', 'Resource Risk', 'Market Risk']
+# Query results kept per dashboard section; entries are keyed by data version and inputs
+SECTION_CACHE_ENTRIES = 32
+# Cell styles for the high (>= 7), medium (>= 4) and low risk bands
+RISK_BAND_STYLES = ['background-color: #ffcccc', 'background-color: #ffe0b3', 'background-color: #d6f5d6']
+
+@st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)
+def _query_projects(data_version, filters):
+    return query_projects(filters)
+
+@st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)
+def _project_page(data_version, filters, sort_by, descending, offset, limit):
+    return get_project_page(filters, sort_by, descending, offset, limit)
+
+@st.cache_data(max_entries=SECTION_CACHE_ENTRIES, show_spinner=False)
+def _top_risk_factors(data_version, filters, limit):
+    return get_top_risk_factors(filters, limit)
+
+def load_dashboard_projects(filters=None):
+    """query_projects(), cached until the data changes"""
+    return _query_projects(get_data_version(), filters)
+
+def cached_project_page(filters, sort_by, descending, offset, limit):
+    """get_project_page(), cached until the data changes"""
+    return _project_page(get_data_version(), filters, sort_by, descending, offset, limit)
+
+def cached_top_risk_factors(filters, limit):
+    """get_top_risk_factors(), cached until the data changes"""
+    return _top_risk_factors(get_data_version(), filters, limit)
+
+def create_dashboard_filters():
+    """Show the dashboard filter widgets and return the selected filters for query_projects()"""
+    filters = {}
+    with st.expander("Filters"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            filters['statuses'] = st.multiselect("Status", PROJECT_STATUSES, key="dashboard_statuses")
+            filters['risk_bands'] = st.multiselect(
+                "Risk Band", list(RISK_BANDS), format_func=str.title, key="dashboard_risk_bands"
+            )
+        with col2:
+            category = st.selectbox(
+                "Risk Category", [None] + RISK_CATEGORIES,
+                format_func=lambda c: "Any" if c is None else c.replace('_', ' ').title(),
+                key="dashboard_category"
+            )
+            if category:
+                minimum = st.slider("Minimum Category Score", 0.0, 10.0, 7.0, 0.5, key="dashboard_category_min")
+                filters['category_thresholds'] = {category: minimum}
+        with col3:
+            budget_min = st.number_input("Minimum Budget ($)", min_value=0, value=0, step=50000, key="dashboard_budget_min")
+            budget_max = st.number_input("Maximum Budget ($, 0 for no limit)", min_value=0, value=0, step=50000, key="dashboard_budget_max")
+            filters['budget_min'] = budget_min or None
+            filters['budget_max'] = budget_max or None
+        col1, col2 = st.columns(2)
+        with col1:
+            filters['start_after'] = st.date_input("Starting On or After", value=None, key="dashboard_start_after")
+        with col2:
+            filters['end_before'] = st.date_input("Ending On or Before", value=None, key="dashboard_end_before")
+    return {key: value for key, value in filters.items() if value}
+
+def show_facets(total, facets):
+    """Show the number of filtered projects and how many projects each risk band, status and category would match"""
+    cols = st.columns(4)
+    cols[0].metric("Projects", f"{total:,}")
+    for col, band in zip(cols[1:], RISK_BANDS):
+        col.metric(f"{band.title()} Risk", f"{facets['risk_band'][band]:,}")
+    statuses = " · ".join(f"{status}: {count:,}" for status, count in sorted(facets['status'].items()))
+    categories = " · ".join(
+        f"{category.replace('_', ' ').title()}: {count:,}" for category, count in facets['category'].items() if count
+    )
+    st.caption(f"By status: {statuses}")
+    if categories:
+        st.caption(f"High risk by category: {categories}")
+
+def create_dashboard(projects, facets=None, filters=None):
+    """
+    Create the main risk dashboard display.
+    `projects` may be full project dicts or the summaries returned by query_projects(),
+    in which case its facets and the filters used are passed along as well.
+    """
+    
+    if facets:
+        show_facets(len(projects), facets)
     
     if not projects:
-        st.warning("No projects found in the database.")
+        st.warning("No projects match the current filters." if filters else "No projects found in the database.")
         return
     
     # Convert projects to dataframe for easier manipulation
     df = pd.DataFrame(projects)
     
+    # Each section is a fragment: interacting with one reruns only that section
+    overview_fragment(df)
+    
+    # Risk metrics row
+    st.subheader("Risk Metrics by Category")
+    category_charts_fragment(df)
+    
+    # Portfolio-wide impact x likelihood matrix of the filtered projects' risk factors
+    st.subheader("Portfolio Risk Matrix")
+    portfolio_matrix_fragment(filters)
+    
+    # Project details
+    st.subheader("Project Details")
+    project_table_fragment(filters)
+    
+    # Risk factors section
+    st.subheader("Top Risk Factors")
+    risk_factors_fragment(filters)
+
+def create_overview_section(df):
+    """Create the risk scatter plot and the high risk alert summary"""
+    
     # Dashboard layout
     col1, col2 = st.columns([2, 1])
     
@@ -47,38 +165,61 @@ def create_dashboard(projects):
                             st.markdown("Trend: ➡️ No change")
         else:
             st.info("No high-risk projects at this time.")
-    
-    # Risk metrics row
-    st.subheader("Risk Metrics by Category")
-    create_risk_category_charts(df)
-    
-    # Project details
-    st.subheader("Project Details")
-    create_project_table(df)
-    
-    # Risk factors section
-    st.subheader("Top Risk Factors")
-    create_risk_factors_section(projects)
 
+@cached_figure(columns=['id', 'name', 'risk_score', 'budget', 'status', 'start_date', 'end_date'])
 def create_risk_scatter_plot(df):
     """Create a scatter plot of projects by risk score and budget"""
     
     # Add a size column for budget (handling missing values)
     df['budget_size'] = df['budget'].fillna(0) / 10000  # Adjust for visualization
     
-    # Add hover text
-    df['hover_text'] = df.apply(
-        lambda row: f"Project: {row['name']}<br>" +
-                    f"Risk Score: {row['risk_score']}/10<br>" +
-                    f"Status: {row['status']}<br>" +
-                    f"Budget: ${row.get('budget', 0):,.0f}<br>" +
-                    f"Timeline: {row.get('start_date', 'N/A')} to {row.get('end_date', 'N/A')}",
-        axis=1
+    # Add hover text, built column-wise so it stays cheap for large portfolios
+    na_dates = pd.Series('N/A', index=df.index)
+    df['hover_text'] = (
+        "Project: " + df['name'].astype(str) +
+        "<br>Risk Score: " + df['risk_score'].astype(str) + "/10" +
+        "<br>Status: " + df['status'].astype(str) +
+        "<br>Budget: " + df['budget'].fillna(0).map('${:,.0f}'.format) +
+        "<br>Timeline: " + df.get('start_date', na_dates).astype(str) + " to " + df.get('end_date', na_dates).astype(str)
+    )
+    
+    if use_webgl(df):
+        # One WebGL trace for every project, coloured by status; only the riskiest are labelled
+        fig = go.Figure(go.Scattergl(
+            x=df['risk_score'],
+            y=df['budget'],
+            mode='markers',
+            marker=dict(
+                size=df['budget_size'],
+                sizemode='area',
+                sizeref=2 * max(df['budget_size'].max(), 1) / 20 ** 2,
+                sizemin=4,
+                **status_marker_colors(df['status'])
+            ),
+            customdata=df[['id', 'hover_text']],
+            hovertemplate='%{customdata[1]}<extra></extra>',
+            showlegend=False
+        ))
+        fig.update_layout(title='Project Risk Assessment')
+        add_top_risk_labels(fig, df, 'risk_score', 'budget')
+        add_status_legend(fig, df['status'])
+    else:
+        fig = _svg_risk_scatter_plot(df)
+    
+    fig.update_layout(
+        xaxis=dict(title='Risk Score (0-10)', range=[0, 10]),
+        yaxis=dict(title='Budget ($)', tickformat='$,.0f'),
+        hovermode='closest',
+        showlegend=True
     )
     
-    # Create color mapping for status
-    status_colors = {'At Risk': 'red', 'In Progress': 'orange', 'On Track': 'green', 'Planning': 'blue'}
+    # Add a vertical line to indicate high risk threshold
+    fig.add_vline(x=7, line_width=1, line_dash="dash", line_color="red")
     
+    return fig
+
+def _svg_risk_scatter_plot(df):
+    """Labelled per-status SVG scatter traces, for portfolios small enough to draw every label"""
     # Create the scatter plot
     fig = px.scatter(
         df,
@@ -86,7 +227,7 @@ def create_risk_scatter_plot(df):
         y='budget',
         size='budget_size',
         color='status',
-        color_discrete_map=status_colors,
+        color_discrete_map=STATUS_COLORS,
         hover_name='name',
         hover_data={'budget_size': False, 'risk_score': True, 'budget': True, 'status': True},
         text='name',
@@ -102,82 +243,99 @@ def create_risk_scatter_plot(df):
         textfont=dict(size=10)
     )
     
+    return fig
+
+def create_risk_category_gauges(df):
+    """One figure with a gauge per risk category showing its portfolio average"""
+    
+    # All category averages in one pass; categories missing from the data average 0
+    averages = df.reindex(columns=RISK_CATEGORIES).astype(float).mean().fillna(0)
+    
+    fig = go.Figure()
+    for i, category in enumerate(RISK_CATEGORIES):
+        fig.add_trace(go.Indicator(
+            mode="gauge+number",
+            value=averages[category],
+            domain={'row': 0, 'column': i},
+            title={'text': category.replace('_', ' ').title()},
+            number={'valueformat': '.1f'},
+            gauge={
+                'axis': {'range': [0, 10]},
+                'bar': {'color': "gray"},
+                'steps': [
+                    {'range': [0, 3.9], 'color': "green"},
+                    {'range': [4, 6.9], 'color': "orange"},
+                    {'range': [7, 10], 'color': "red"}
+                ],
+                'threshold': {
+                    'line': {'color': "red", 'width': 4},
+                    'thickness': 0.75,
+                    'value': 7
+                }
+            }
+        ))
+    
     fig.update_layout(
-        xaxis=dict(title='Risk Score (0-10)', range=[0, 10]),
-        yaxis=dict(title='Budget ($)', tickformat='$,.0f'),
-        hovermode='closest',
-        showlegend=True
+        grid={'rows': 1, 'columns': len(RISK_CATEGORIES), 'pattern': "independent"},
+        height=180,
+        margin=dict(l=30, r=30, t=40, b=20)
     )
-    
-    # Add a vertical line to indicate high risk threshold
-    fig.add_vline(x=7, line_width=1, line_dash="dash", line_color="red")
-    
     return fig
 
 def create_risk_category_charts(df):
     """Create charts showing risk breakdown by category"""
-    
-    # Initialize the columns for all categories to ensure consistent data
-    risk_categories = ['schedule_risk', 'budget_risk', 'resource_risk', 'market_risk']
-    for category in risk_categories:
-        if category not in df.columns:
-            df[category] = 0
-    
-    # Calculate averages
-    avg_risks = {
-        'Schedule Risk': df['schedule_risk'].mean(),
-        'Budget Risk': df['budget_risk'].mean(),
-        'Resource Risk': df['resource_risk'].mean(),
-        'Market Risk': df['market_risk'].mean()
-    }
-    
-    # Create columns for charts
-    cols = st.columns(len(risk_categories))
-    
-    for i, (category_name, risk_value) in enumerate(avg_risks.items()):
-        with cols[i]:
-            # Create gauge chart
-            fig = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=risk_value,
-                domain={'x': [0, 1], 'y': [0, 1]},
-                title={'text': category_name},
-                gauge={
-                    'axis': {'range': [0, 10]},
-                    'bar': {'color': "gray"},
-                    'steps': [
-                        {'range': [0, 3.9], 'color': "green"},
-                        {'range': [4, 6.9], 'color': "orange"},
-                        {'range': [7, 10], 'color': "red"}
-                    ],
-                    'threshold': {
-                        'line': {'color': "red", 'width': 4},
-                        'thickness': 0.75,
-                        'value': 7
-                    }
-                }
-            ))
-            
-            fig.update_layout(height=150, margin=dict(l=20, r=20, t=30, b=20))
-            st.plotly_chart(fig, use_container_width=True)
+    # A single figure keeps this to one serialized payload and one frontend component
+    st.plotly_chart(create_risk_category_gauges(df), use_container_width=True)
 
-def create_project_table(df):
-    """Create an interactive table of projects with risk information"""
-    
-    # Ensure necessary columns exist and create the display dataframe
-    display_columns = ['name', 'status', 'risk_score', 'schedule_risk', 
-                       'budget_risk', 'resource_risk', 'market_risk', 'start_date', 'end_date']
-    
-    # Create a copy to avoid modifying the original
-    display_df = df.copy()
+def risk_band_styles(df):
+    """Background colours for risk score cells by band (high/medium/low), computed for all cells at once"""
+    values = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    styles = np.select([values >= 7, values >= 4, ~np.isnan(values)], RISK_BAND_STYLES, default='')
+    return pd.DataFrame(styles, index=df.index, columns=df.columns)
+
+def current_table_page(query):
+    """
+    The project table page to show for a query (filters, search, sort and page size):
+    the page the user chose, or the first page whenever the query has changed
+    """
+    query_key = json.dumps(query, sort_keys=True, default=str)
+    if st.session_state.get("project_table_query") != query_key:
+        st.session_state["project_table_query"] = query_key
+        st.session_state["project_table_page"] = 1
+    return st.session_state.get("project_table_page", 1)
+
+def create_project_table(filters=None):
+    """Create a paginated table of projects; sorting, filtering and paging happen in the database"""
     
-    # Ensure all columns exist by adding missing ones with N/A
-    for col in display_columns:
-        if col not in display_df.columns:
-            display_df[col] = 'N/A'
+    # Table controls
+    col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+    with col1:
+        search = st.text_input("Search projects", key="project_table_search")
+    with col2:
+        sort_label = st.selectbox("Sort by", list(TABLE_SORT_OPTIONS), key="project_table_sort")
+    with col3:
+        descending = st.toggle("Descending", value=True, key="project_table_descending")
+    with col4:
+        page_size = st.selectbox("Rows per page", TABLE_PAGE_SIZES, key="project_table_page_size")
+    
+    filters = {**(filters or {}), 'name': search}
+    sort_by = TABLE_SORT_OPTIONS[sort_label]
+    page = current_table_page([filters, sort_by, descending, page_size])
+    rows, total = cached_project_page(filters, sort_by, descending, offset=(page - 1) * page_size, limit=page_size)
+    
+    # Narrower filters can leave the current page past the end
+    page_count = max(1, math.ceil(total / page_size))
+    if page > page_count:
+        page = page_count
+        st.session_state["project_table_page"] = page
+        rows, total = cached_project_page(filters, sort_by, descending, offset=(page - 1) * page_size, limit=page_size)
+    
+    if not rows:
+        st.info("No projects match the current filters.")
+        return
     
-    # Select and rename columns for display
-    display_df = display_df[display_columns].rename(columns={
+    # Only the visible page is converted, renamed and styled
+    display_df = pd.DataFrame(rows).drop(columns='id').rename(columns={
         'name': 'Project Name',
         'status': 'Status',
         'risk_score': 'Overall Risk',
@@ -188,55 +346,26 @@ def create_project_table(df):
         'start_date': 'Start Date',
         'end_date': 'End Date'
     })
+    styled_df = display_df.style.apply(risk_band_styles, axis=None, subset=TABLE_RISK_COLUMNS)
+    st.dataframe(styled_df, use_container_width=True, hide_index=True)
     
-    # Style the dataframe
-    def highlight_risk(val):
-        """Highlight risk scores based on severity"""
-        try:
-            val = float(val)
-            if val >= 7:
-                return 'background-color: #ffcccc'
-            elif val >= 4:
-                return 'background-color: #ffe0b3'
-            else:
-                return 'background-color: #d6f5d6'
-        except:
-            return ''
-    
-    # Apply styling and display
-    styled_df = display_df.style.map(
-        highlight_risk, 
-        subset=['Overall Risk', 'Schedule Risk', 'Budget Risk', 'Resource Risk', 'Market Risk']
-    )
+    col1, col2 = st.columns([1, 3])
+    with col1:
+        st.number_input("Page", min_value=1, max_value=page_count, key="project_table_page")
+    with col2:
+        first = (page - 1) * page_size + 1
+        st.caption(f"Showing {first:,}-{first + len(rows) - 1:,} of {total:,} projects")
+
+def create_risk_factors_section(filters=None):
+    """Create a section showing top risk factors across the (filtered) projects"""
     
-    st.dataframe(styled_df, use_container_width=True)
+    # Select top 5 by combined impact and likelihood, ranked in the database
+    top_factors = cached_top_risk_factors(filters, limit=5)
 
-def create_risk_factors_section(projects):
-    """Create a section showing top risk factors across projects"""
-    
-    # Extract risk factors from all projects
-    all_risk_factors = []
-    
-    for project in projects:
-        if 'risk_factors' in project and project['risk_factors']:
-            for factor in project['risk_factors']:
-                factor_copy = factor.copy()
-                factor_copy['project_name'] = project['name']
-                factor_copy['project_id'] = project['id']
-                # Calculate a score for sorting
-                factor_copy['risk_score'] = (factor.get('impact', 5) * factor.get('likelihood', 5)) / 10
-                all_risk_factors.append(factor_copy)
-    
-    if not all_risk_factors:
+    if not top_factors:
         st.info("No risk factors found for any projects.")
         return
     
-    # Sort by combined impact and likelihood
-    sorted_factors = sorted(all_risk_factors, key=lambda x: x.get('risk_score', 0), reverse=True)
-    
-    # Display top factors
-    top_factors = sorted_factors[:5]  # Show top 5 factors
-    
     col1, col2 = st.columns([1, 2])
     
     with col1:
@@ -268,4 +397,10 @@ def create_risk_factors_section(projects):
                 st.write(f"**Category:** {factor.get('category', 'Uncategorized').replace('_', ' ').title()}")
                 st.write(f"**Description:** {factor['description']}")
                 st.write(f"**Impact:** {factor.get('impact', 'N/A')}/10 | **Likelihood:** {factor.get('likelihood', 'N/A')}/10")
-                st.write(f"**Mitigation Strategy:** {factor.get('mitigation', 'No mitigation strategy provided.')}")
\ No newline at end of file
+                st.write(f"**Mitigation Strategy:** {factor.get('mitigation', 'No mitigation strategy provided.')}")
+
+# Fragments rerun on their own when a widget inside them changes
+overview_fragment = st.fragment(create_overview_section)
+category_charts_fragment = st.fragment(create_risk_category_charts)
+project_table_fragment = st.fragment(create_project_table)
+risk_factors_fragment = st.fragment(create_risk_factors_section)
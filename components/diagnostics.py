@@ -0,0 +1,49 @@
+import pandas as pd
+import streamlit as st
+from utils.figure_cache import figure_cache
+from utils.llm import get_llm_metrics
+from utils.tracing import TRACE_EXPORT_PATH, get_stage_stats, reset_stats
+
+def create_diagnostics_page():
+    """Show latency percentiles per traced stage, the LLM client and the figure cache metrics"""
+    st.subheader("Stage Latency")
+    include_workers = st.checkbox(
+        "Include background workers",
+        value=False,
+        help=f"Read spans from the trace export ({TRACE_EXPORT_PATH}) instead of this process only",
+        disabled=not TRACE_EXPORT_PATH
+    )
+    stats = get_stage_stats(from_export=include_workers)
+    if stats:
+        stats_df = pd.DataFrame(stats).rename(columns={
+            'stage': 'Stage', 'count': 'Spans', 'p50_ms': 'p50 (ms)', 'p95_ms': 'p95 (ms)', 'max_ms': 'Max (ms)'
+        })
+        st.dataframe(
+            stats_df.style.format({'p50 (ms)': '{:.1f}', 'p95 (ms)': '{:.1f}', 'Max (ms)': '{:.1f}'}),
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.info("No spans recorded yet. Use the dashboard or chat to generate some.")
+
+    if st.button("Reset Statistics"):
+        reset_stats()
+        st.rerun()
+
+    st.subheader("LLM Client")
+    llm_metrics = get_llm_metrics()
+    if llm_metrics:
+        st.dataframe(pd.DataFrame.from_dict(llm_metrics, orient='index'), use_container_width=True)
+    else:
+        st.info("The LLM has not been used in this process yet.")
+
+    st.subheader("Figure Cache")
+    cache_metrics = figure_cache.get_metrics()
+    cols = st.columns(4)
+    cols[0].metric("Hits", cache_metrics['hits'])
+    cols[1].metric("Misses", cache_metrics['misses'])
+    cols[2].metric("Entries", cache_metrics['entries'])
+    cols[3].metric("Size (MB)", f"{cache_metrics['bytes'] / 1024 ** 2:.1f}")
+    if st.button("Clear Figure Cache"):
+        figure_cache.clear()
+        st.rerun()
@@ -0,0 +1,71 @@
+import os
+import streamlit as st
+from utils.job_queue import CANCELLED, FAILED, FINISHED_STATUSES, QUEUED, SUCCEEDED, cancel_job, enqueue_job, get_job
+
+# Seconds between job status polls while a job is queued or running
+JOB_POLL_INTERVAL = 2
+
+def create_report_job_panel(project_id):
+    """Queue a background risk report for a project and show its progress"""
+    report_jobs = st.session_state.setdefault("report_jobs", {})
+
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        if st.button("Generate Risk Report", key=f"generate_report_{project_id}"):
+            report_jobs[project_id] = enqueue_job('risk_report', {'project_id': project_id})
+    with col2:
+        if st.button("Force Regenerate", key=f"regenerate_report_{project_id}"):
+            report_jobs[project_id] = enqueue_job('risk_report', {'project_id': project_id, 'force_refresh': True})
+    with col3:
+        if st.button("Export HTML/PDF", key=f"export_report_{project_id}"):
+            report_jobs[project_id] = enqueue_job('report_render', {'project_ids': [project_id]})
+
+    job_id = report_jobs.get(project_id)
+    if job_id:
+        show_job_status(job_id)
+
+def show_job_status(job_id):
+    """Show a job's status, polling for updates only while it is still active"""
+    job = get_job(job_id)
+    if job is None:
+        st.warning("The requested job no longer exists.")
+        return
+
+    run_every = None if job['status'] in FINISHED_STATUSES else JOB_POLL_INTERVAL
+    st.fragment(_render_job, run_every=run_every)(job_id, job['status'])
+
+def _render_job(job_id, initial_status):
+    job = get_job(job_id)
+
+    # Rerun the page once the job finishes so polling stops
+    if job['status'] != initial_status and job['status'] in FINISHED_STATUSES:
+        st.rerun()
+
+    if job['status'] == SUCCEEDED:
+        st.success("Risk report ready.")
+        st.markdown((job['result'] or {}).get('output', ''))
+        for report in (job['result'] or {}).get('reports', []):
+            show_report_downloads(report)
+    elif job['status'] == FAILED:
+        st.error("The job failed.")
+        with st.expander("Error details"):
+            st.code(job['error'] or "No details available")
+    elif job['status'] == CANCELLED:
+        st.info("The job was cancelled.")
+    else:
+        label = "Waiting for a worker..." if job['status'] == QUEUED else (job['message'] or "Running...")
+        st.progress(job['progress'] or 0.0, text=label)
+        if st.button("Cancel", key=f"cancel_job_{job_id}", disabled=job['cancel_requested']):
+            cancel_job(job_id)
+
+def show_report_downloads(report):
+    """Download buttons for the files of a rendered report"""
+    for kind, mime in (('html', "text/html"), ('pdf', "application/pdf")):
+        path = report.get(kind)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                st.download_button(
+                    f"Download {kind.upper()}", f.read(),
+                    file_name=os.path.basename(path), mime=mime,
+                    key=f"download_{kind}_{report['project_id']}"
+                )
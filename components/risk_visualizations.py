@@ -4,8 +4,66 @@ import plotly.graph_objects as go
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from utils.pg_database import get_project, get_projects
+from utils.figure_cache import cached_figure
+from utils.pg_database import (
+    RISK_CATEGORIES, get_cell_risk_factors, get_data_version, get_project, get_projects, get_risk_factor_counts
+)
 
+# Point charts with more points than this render through WebGL (Scattergl) as a single
+# trace coloured per point, and only the riskiest projects get a text label
+WEBGL_POINT_THRESHOLD = 1000
+TOP_LABELED_POINTS = 20
+STATUS_COLORS = {'At Risk': 'red', 'In Progress': 'orange', 'On Track': 'green', 'Planning': 'blue'}
+# Bin edges of the portfolio risk matrix: ten cells per axis, centred on the scores 1-10
+RISK_MATRIX_EDGES = np.arange(0.5, 11)
+# Factors listed when drilling down into one risk matrix cell
+RISK_MATRIX_DRILLDOWN_LIMIT = 50
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _risk_factor_grid(data_version, filters, categories):
+    return bin_risk_factors(*get_risk_factor_counts(filters, list(categories)))
+
+def use_webgl(df):
+    """Whether a point chart of df should render through WebGL"""
+    return len(df) > WEBGL_POINT_THRESHOLD
+
+def status_marker_colors(statuses):
+    """
+    Marker colour settings for a Series of project statuses: a numeric code per point on a
+    stepped colour scale, which Plotly validates far faster than an array of colour names
+    """
+    palette = list(STATUS_COLORS.values())
+    codes = statuses.map({status: i for i, status in enumerate(STATUS_COLORS)}).fillna(palette.index('blue'))
+    colorscale = []
+    for i, color in enumerate(palette):
+        colorscale += [[i / len(palette), color], [(i + 1) / len(palette), color]]
+    return dict(color=codes.to_numpy(dtype=float), colorscale=colorscale, cmin=-0.5, cmax=len(palette) - 0.5, showscale=False)
+
+def add_status_legend(fig, statuses):
+    """Legend entries for the statuses present, for charts drawn as one per-point coloured trace"""
+    for status in sorted(statuses.dropna().unique()):
+        fig.add_trace(go.Scattergl(
+            x=[None], y=[None],
+            mode='markers',
+            marker=dict(size=10, color=STATUS_COLORS.get(status, 'blue')),
+            name=status,
+            hoverinfo='skip'
+        ))
+
+def add_top_risk_labels(fig, df, x, y, n=TOP_LABELED_POINTS):
+    """Label the n highest risk projects with a small text-only trace"""
+    top = df.nlargest(n, 'risk_score')
+    fig.add_trace(go.Scattergl(
+        x=top[x], y=top[y],
+        mode='text',
+        text=top['name'],
+        textposition='top center',
+        textfont=dict(size=10),
+        hoverinfo='skip',
+        showlegend=False
+    ))
+
+@cached_figure(columns=['name', 'risk_history'])
 def create_risk_trend_chart(project):
     """Create a line chart showing risk score trends over time for a project"""
     
@@ -63,6 +121,7 @@ def create_risk_trend_chart(project):
     
     return fig
 
+@cached_figure(columns=['name', 'risk_factors'])
 def create_risk_matrix(project):
     """Create a risk matrix visualization (impact vs. likelihood)"""
     
@@ -199,6 +258,7 @@ def create_risk_matrix(project):
     
     return fig
 
+@cached_figure(columns=['name'] + RISK_CATEGORIES)
 def create_risk_radar_chart(project):
     """Create a radar chart showing risk by category"""
     
@@ -257,18 +317,24 @@ def create_risk_radar_chart(project):
 
 def visualize_project_risks(project, container=None):
     """Create and display a comprehensive set of risk visualizations for a project"""
-    target = container if container else st
-    
-    target.header(f"Risk Visualizations: {project['name']}")
-    
-    # Risk score trend chart
-    target.subheader("Risk Score Trend")
+    with container if container else st.container():
+        st.header(f"Risk Visualizations: {project['name']}")
+        
+        # Each section is a fragment, so it can rerun without rebuilding the others
+        project_trend_fragment(project)
+        project_matrix_fragment(project)
+        project_factors_fragment(project)
+
+def create_project_trend_section(project):
+    """Risk score trend chart for a project"""
+    st.subheader("Risk Score Trend")
     trend_chart = create_risk_trend_chart(project)
     if trend_chart:
-        target.plotly_chart(trend_chart, use_container_width=True)
-    
-    # Risk matrix
-    col1, col2 = target.columns(2)
+        st.plotly_chart(trend_chart, use_container_width=True)
+
+def create_project_matrix_section(project):
+    """Risk matrix and category radar chart for a project, side by side"""
+    col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Risk Matrix (Impact vs. Likelihood)")
@@ -280,10 +346,11 @@ def visualize_project_risks(project, container=None):
         st.subheader("Risk Categories")
         radar = create_risk_radar_chart(project)
         st.plotly_chart(radar, use_container_width=True)
-    
-    # Display detailed risk factors
+
+def create_project_factors_section(project):
+    """Detailed risk factors for a project, highest impact x likelihood first"""
     if 'risk_factors' in project and project['risk_factors']:
-        target.subheader("Risk Factors")
+        st.subheader("Risk Factors")
         
         # Sort risk factors by impact * likelihood
         sorted_factors = sorted(
@@ -293,11 +360,77 @@ def visualize_project_risks(project, container=None):
         )
         
         for i, factor in enumerate(sorted_factors):
-            with target.expander(f"{i+1}. {factor['name']} (Impact: {factor.get('impact', 'N/A')}/10, Likelihood: {factor.get('likelihood', 'N/A')}/10)"):
+            with st.expander(f"{i+1}. {factor['name']} (Impact: {factor.get('impact', 'N/A')}/10, Likelihood: {factor.get('likelihood', 'N/A')}/10)"):
                 st.write(f"**Description:** {factor['description']}")
                 st.write(f"**Category:** {factor.get('category', 'Uncategorized').replace('_', ' ').title()}")
                 st.write(f"**Mitigation Strategy:** {factor.get('mitigation', 'No mitigation strategy provided')}")
 
+def bin_risk_factors(impact, likelihood, counts=None):
+    """
+    Count risk factors per risk matrix cell: an array of counts indexed [impact cell][likelihood cell].
+    `counts` gives the number of factors at each impact and likelihood pair (default: one each)
+    """
+    counts, _, _ = np.histogram2d(impact, likelihood, bins=[RISK_MATRIX_EDGES, RISK_MATRIX_EDGES], weights=counts)
+    return counts.astype(int)
+
+def create_portfolio_risk_heatmap(counts):
+    """Create a heatmap of risk factor counts per impact x likelihood cell; its size does not depend on the factor count"""
+    centers = (RISK_MATRIX_EDGES[:-1] + RISK_MATRIX_EDGES[1:]) / 2
+    fig = go.Figure(go.Heatmap(
+        z=counts,
+        x=centers,
+        y=centers,
+        colorscale='Reds',
+        colorbar=dict(title='Factors'),
+        hovertemplate='Impact: %{y}<br>Likelihood: %{x}<br>Risk Factors: %{z:,}<extra></extra>'
+    ))
+    fig.update_layout(
+        title='Portfolio Risk Matrix',
+        xaxis=dict(title='Likelihood (1-10)', dtick=1),
+        yaxis=dict(title='Impact (1-10)', dtick=1),
+        height=500
+    )
+    return fig
+
+def create_portfolio_matrix_section(filters=None):
+    """Show the portfolio risk matrix for the projects matching `filters`, with drill-down into one cell"""
+    categories = st.multiselect(
+        "Risk Categories", RISK_CATEGORIES,
+        format_func=lambda c: c.replace('_', ' ').title(),
+        key="portfolio_matrix_categories"
+    )
+    counts = _risk_factor_grid(get_data_version(), filters, tuple(categories))
+    if not counts.any():
+        st.info("No risk factors match the current filters.")
+        return
+    st.plotly_chart(create_portfolio_risk_heatmap(counts), use_container_width=True)
+    
+    # Drill down into one non-empty cell, highest risk cells first
+    centers = (RISK_MATRIX_EDGES[:-1] + RISK_MATRIX_EDGES[1:]) / 2
+    cells = sorted(zip(*np.nonzero(counts)), key=lambda cell: (-centers[cell[0]] * centers[cell[1]], -counts[cell]))
+    cell = st.selectbox(
+        "Show risk factors in cell", cells,
+        format_func=lambda cell: f"Impact {centers[cell[0]]:g} × Likelihood {centers[cell[1]]:g} ({counts[cell]:,} factors)",
+        key="portfolio_matrix_cell"
+    )
+    i, j = cell
+    factors = get_cell_risk_factors(
+        (RISK_MATRIX_EDGES[i], RISK_MATRIX_EDGES[i + 1]), (RISK_MATRIX_EDGES[j], RISK_MATRIX_EDGES[j + 1]),
+        filters, categories, limit=RISK_MATRIX_DRILLDOWN_LIMIT
+    )
+    factors_df = pd.DataFrame(factors)[['project_name', 'name', 'category', 'impact', 'likelihood', 'mitigation']]
+    factors_df['category'] = factors_df['category'].fillna('Uncategorized').str.replace('_', ' ').str.title()
+    st.dataframe(
+        factors_df.rename(columns={
+            'project_name': 'Project', 'name': 'Risk Factor', 'category': 'Category',
+            'impact': 'Impact', 'likelihood': 'Likelihood', 'mitigation': 'Mitigation'
+        }),
+        use_container_width=True,
+        hide_index=True
+    )
+    if counts[cell] > len(factors):
+        st.caption(f"Showing {len(factors)} of {counts[cell]:,} risk factors in this cell.")
+
 def visualize_portfolio_risks(projects, container=None):
     """Create and display portfolio-level risk visualizations"""
     target = container if container else st
@@ -331,18 +464,18 @@ def visualize_portfolio_risks(projects, container=None):
     category_fig = create_risk_category_comparison(df)
     target.plotly_chart(category_fig, use_container_width=True)
 
+@cached_figure(columns=['name', 'risk_score', 'budget', 'status'] + RISK_CATEGORIES)
 def create_risk_bubble_chart(df):
     """Create a bubble chart visualization of project risks"""
     
-    # Add hover text
-    df['hover_text'] = df.apply(
-        lambda row: f"Project: {row['name']}<br>" +
-                    f"Risk Score: {row['risk_score']:.1f}/10<br>" +
-                    f"Schedule Risk: {row['schedule_risk']:.1f}/10<br>" +
-                    f"Budget Risk: {row['budget_risk']:.1f}/10<br>" +
-                    f"Resource Risk: {row['resource_risk']:.1f}/10<br>" +
-                    f"Market Risk: {row['market_risk']:.1f}/10",
-        axis=1
+    # Add hover text, built column-wise so it stays cheap for large portfolios
+    df['hover_text'] = (
+        "Project: " + df['name'].astype(str) +
+        "<br>Risk Score: " + df['risk_score'].map('{:.1f}'.format) + "/10" +
+        "<br>Schedule Risk: " + df['schedule_risk'].map('{:.1f}'.format) + "/10" +
+        "<br>Budget Risk: " + df['budget_risk'].map('{:.1f}'.format) + "/10" +
+        "<br>Resource Risk: " + df['resource_risk'].map('{:.1f}'.format) + "/10" +
+        "<br>Market Risk: " + df['market_risk'].map('{:.1f}'.format) + "/10"
     )
     
     # Create size values proportional to budget
@@ -352,28 +485,47 @@ def create_risk_bubble_chart(df):
     # Create the figure
     fig = go.Figure()
     
-    # Add a trace for each status category
-    for status in df['status'].unique():
-        subset = df[df['status'] == status]
-        
-        color = 'red' if status == 'At Risk' else 'orange' if status == 'In Progress' else 'green' if status == 'On Track' else 'blue'
-        
-        fig.add_trace(go.Scatter(
-            x=subset['market_risk'],
-            y=subset['technical_risk'],
-            mode='markers+text',
+    if use_webgl(df):
+        # One WebGL trace for every project, coloured by status; only the riskiest are labelled
+        fig.add_trace(go.Scattergl(
+            x=df['market_risk'],
+            y=df['technical_risk'],
+            mode='markers',
             marker=dict(
-                size=subset['size'],
-                color=color,
+                size=df['size'],
+                **status_marker_colors(df['status']),
                 opacity=0.7,
                 line=dict(color='white', width=1)
             ),
-            text=subset['name'],
-            textposition='top center',
-            name=status,
-            customdata=subset['hover_text'],
-            hovertemplate='%{customdata}<extra></extra>'
+            customdata=df['hover_text'],
+            hovertemplate='%{customdata}<extra></extra>',
+            showlegend=False
         ))
+        add_top_risk_labels(fig, df, 'market_risk', 'technical_risk')
+        add_status_legend(fig, df['status'])
+    else:
+        # Add a trace for each status category
+        for status in df['status'].unique():
+            subset = df[df['status'] == status]
+            
+            color = STATUS_COLORS.get(status, 'blue')
+            
+            fig.add_trace(go.Scatter(
+                x=subset['market_risk'],
+                y=subset['technical_risk'],
+                mode='markers+text',
+                marker=dict(
+                    size=subset['size'],
+                    color=color,
+                    opacity=0.7,
+                    line=dict(color='white', width=1)
+                ),
+                text=subset['name'],
+                textposition='top center',
+                name=status,
+                customdata=subset['hover_text'],
+                hovertemplate='%{customdata}<extra></extra>'
+            ))
     
     # Update layout
     fig.update_layout(
@@ -389,6 +541,7 @@ def create_risk_bubble_chart(df):
     
     return fig
 
+@cached_figure(columns=['name', 'risk_score'] + RISK_CATEGORIES)
 def create_risk_category_comparison(df):
     """Create a comparison of risk categories across all projects"""
     
@@ -441,4 +594,10 @@ def create_risk_category_comparison(df):
         legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
     )
     
-    return fig
\ No newline at end of file
+    return fig
+
+# Fragments rerun on their own when a widget inside them changes
+project_trend_fragment = st.fragment(create_project_trend_section)
+project_matrix_fragment = st.fragment(create_project_matrix_section)
+project_factors_fragment = st.fragment(create_project_factors_section)
+portfolio_matrix_fragment = st.fragment(create_portfolio_matrix_section)
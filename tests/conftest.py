@@ -0,0 +1,27 @@
+import os
+import sys
+
+# Run from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Imported first: it sets the environment (an in-memory DATABASE_URL, the stub LLM,
+# no trace export) that the application modules read on import
+from benchmarks.portfolio import load_portfolio, use_database
+import pytest
+from utils import pg_database
+
+@pytest.fixture
+def database(tmp_path):
+    """A fresh, empty SQLite database with the full schema, made the active database."""
+    engine = use_database(f"sqlite:///{tmp_path / 'test.db'}")
+    pg_database.Base.metadata.create_all(engine)
+    pg_database._schema_ready = True
+    return engine
+
+@pytest.fixture
+def portfolio(tmp_path):
+    """A SQLite database holding a small synthetic portfolio (see benchmarks.portfolio)."""
+    def load(n_projects=20, **options):
+        load_portfolio(n_projects, directory=str(tmp_path), **options)
+        return [f"PRJ{i + 1:06d}" for i in range(n_projects)]
+    return load
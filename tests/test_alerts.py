@@ -0,0 +1,57 @@
+import json
+from datetime import timedelta
+import numpy as np
+import pytest
+from utils.alerts import AlertRule, FileSink, evaluate_rules, load_portfolio_metrics, run_alert_evaluation, suppress_recent
+from utils.pg_database import record_alert_events
+
+class FailingSink:
+    def send(self, alerts):
+        raise ConnectionError("SMTP server unavailable")
+
+def _threshold_rule(project_index=0):
+    """A risk_score rule whose threshold is exactly the score of one of the projects."""
+    project_ids, _names, values = load_portfolio_metrics(['risk_score'])
+    threshold = float(values[project_index, 0])
+    expected = sorted(project_ids[values[:, 0] >= threshold])
+    return AlertRule("risk_score_threshold", 'risk_score', threshold), expected
+
+def test_rules_fire_at_the_threshold_and_ignore_missing_values():
+    rules = [AlertRule("risk_threshold", 'risk_score', 7.0), AlertRule("budget_threshold", 'budget_risk', 5.0)]
+    values = np.array([[7.0, 4.9], [6.9, np.nan], [np.nan, 5.0]])
+    alerts = evaluate_rules(rules, np.array(['A', 'B', 'C']), np.array(['a', 'b', 'c']), values,
+                            ['risk_score', 'budget_risk'])
+    assert [(alert['project_id'], alert['rule'], alert['value']) for alert in alerts] == [
+        ('A', 'risk_threshold', 7.0), ('C', 'budget_threshold', 5.0)
+    ]
+    assert evaluate_rules([], np.array(['A']), np.array(['a']), values[:1], ['risk_score']) == []
+
+def test_alerts_repeat_only_after_the_cooldown(portfolio):
+    portfolio(20)
+    rule, expected = _threshold_rule()
+    project_ids, names, values = load_portfolio_metrics(['risk_score'])
+    alerts = evaluate_rules([rule], project_ids, names, values, ['risk_score'])
+    assert sorted(alert['project_id'] for alert in alerts) == expected
+
+    record_alert_events(alerts[:1])
+    assert suppress_recent(alerts) == alerts[1:]
+    assert suppress_recent(alerts, cooldown=timedelta(0)) == alerts
+
+def test_run_records_alerts_only_once_the_sink_succeeds(portfolio, tmp_path):
+    portfolio(20)
+    rule, expected = _threshold_rule()
+    settings = {'risk_threshold': 7}
+
+    with pytest.raises(ConnectionError):
+        run_alert_evaluation(settings, rules=[rule], sink=FailingSink())
+
+    sink = FileSink(str(tmp_path / "alerts" / "alerts.jsonl"))
+    alerts = run_alert_evaluation(settings, rules=[rule], sink=sink)
+    assert sorted(alert['project_id'] for alert in alerts) == expected
+    with open(sink.path, encoding="utf-8") as f:
+        logged = [json.loads(line) for line in f]
+    assert [entry['project_id'] for entry in logged] == [alert['project_id'] for alert in alerts]
+    assert all(entry['rule'] == rule.name and entry['sent_at'] for entry in logged)
+
+    # Within the cooldown the same rule does not fire again
+    assert run_alert_evaluation(settings, rules=[rule], sink=FailingSink()) == []
@@ -0,0 +1,89 @@
+import threading
+import time
+import pytest
+from langchain_core.language_models.llms import LLM
+from utils.llm import CoalescingLLM, coalesce_key
+
+class CountingLLM(LLM):
+    """Answers after a delay, counting the calls that reach it; raises if told to fail."""
+    delay: float = 0.2
+    calls: int = 0
+    fail: bool = False
+    lock: object = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.lock = threading.Lock()
+
+    @property
+    def _llm_type(self):
+        return "counting"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("upstream down")
+        return f"answer to {prompt.strip()}"
+
+def _invoke_concurrently(llm, prompts):
+    barrier = threading.Barrier(len(prompts))
+    results = [None] * len(prompts)
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = llm.invoke(prompts[i])
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(prompts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_identical_prompts_share_one_call():
+    upstream = CountingLLM()
+    llm = CoalescingLLM(llm=upstream)
+    results = _invoke_concurrently(llm, ["status of alpha"] * 8)
+    assert results == ["answer to status of alpha"] * 8
+    assert upstream.calls == 1
+    metrics = llm.get_metrics()
+    assert metrics["calls"] == 8 and metrics["upstream_calls"] == 1 and metrics["coalesced"] == 7
+    assert metrics["in_flight"] == 0
+
+def test_whitespace_differences_coalesce_but_options_do_not():
+    assert coalesce_key("status of  alpha\n") == coalesce_key(" status of alpha")
+    assert coalesce_key("status of alpha", stop=["\n"]) != coalesce_key("status of alpha")
+    upstream = CountingLLM()
+    results = _invoke_concurrently(CoalescingLLM(llm=upstream), ["status of alpha", "status  of alpha\n", "status of beta"])
+    assert upstream.calls == 2
+    assert results[0] == results[1] and results[2] == "answer to status of beta"
+
+def test_calls_after_completion_are_not_served_from_the_old_result():
+    upstream = CountingLLM(delay=0.0)
+    llm = CoalescingLLM(llm=upstream)
+    llm.invoke("prompt")
+    llm.invoke("prompt")
+    assert upstream.calls == 2
+
+def test_errors_reach_every_waiter():
+    upstream = CountingLLM(fail=True)
+    llm = CoalescingLLM(llm=upstream)
+    results = _invoke_concurrently(llm, ["prompt"] * 4)
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert upstream.calls == 1 and llm.get_metrics()["errors"] == 1
+
+def test_waiter_times_out_while_the_call_carries_on():
+    upstream = CountingLLM(delay=0.5)
+    llm = CoalescingLLM(llm=upstream, timeout=0.1)
+    results = []
+    leader = threading.Thread(target=lambda: results.append(llm.invoke("prompt")))
+    leader.start()
+    time.sleep(0.05)
+    with pytest.raises(TimeoutError):
+        llm.invoke("prompt")
+    leader.join()
+    assert results == ["answer to prompt"]
+    assert upstream.calls == 1 and llm.get_metrics()["timeouts"] == 1
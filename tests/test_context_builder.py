@@ -0,0 +1,26 @@
+from utils.context_builder import MAX_FACTOR_CANDIDATES, factor_snippets, search_terms
+from utils.pg_database import Project, RiskFactor, Session
+
+def test_search_terms_drop_stop_words_and_short_words():
+    assert search_terms("What is the risk of an IT vendor insolvency for PRJ001?") == [
+        'risk', 'vendor', 'insolvency', 'prj001'
+    ]
+    assert search_terms("is it on?") == []
+
+def test_stop_words_do_not_crowd_out_matching_factors(database):
+    session = Session()
+    session.add(Project(id="PRJ001", name="Harbour Expansion"))
+    # Factors matching nothing but the query's stop words (as substrings)
+    session.add_all(
+        RiskFactor(project_id="PRJ001", name=f"The plan for the site {i} is late", description="Then there is the other",
+                   impact=5, likelihood=5)
+        for i in range(MAX_FACTOR_CANDIDATES + 5)
+    )
+    session.add(RiskFactor(project_id="PRJ001", name="Supplier insolvency", description="Key supplier may fail",
+                           impact=8, likelihood=4))
+    session.commit()
+    session.close()
+
+    snippets = factor_snippets("what is the plan if there is an insolvency of the supplier")
+    assert any("Supplier insolvency" in snippet.text for snippet in snippets)
+    assert factor_snippets("what is the") == []
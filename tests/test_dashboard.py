@@ -0,0 +1,81 @@
+import importlib
+import sys
+from unittest.mock import MagicMock
+import numpy as np
+import pandas as pd
+import pytest
+from utils.pg_database import RISK_CATEGORIES
+
+@pytest.fixture
+def dashboard(monkeypatch):
+    # Only paging and figure building are tested, so Streamlit is replaced by a mock with a real session state
+    streamlit = MagicMock()
+    streamlit.session_state = {}
+    monkeypatch.setitem(sys.modules, "streamlit", streamlit)
+    for name in ("components.dashboard", "components.risk_visualizations"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    module = importlib.import_module("components.dashboard")
+    yield module
+    for name in ("components.dashboard", "components.risk_visualizations"):
+        sys.modules.pop(name, None)
+
+def test_page_is_kept_while_the_query_is_unchanged(dashboard):
+    query = [{'statuses': ['At Risk']}, 'risk_score', True, 25]
+    assert dashboard.current_table_page(query) == 1
+    dashboard.st.session_state["project_table_page"] = 4
+    assert dashboard.current_table_page(list(query)) == 4
+
+@pytest.mark.parametrize("changed", [
+    [{'statuses': ['On Track']}, 'risk_score', True, 25],
+    [{'statuses': ['At Risk'], 'name': 'alpha'}, 'risk_score', True, 25],
+    [{'statuses': ['At Risk']}, 'name', True, 25],
+    [{'statuses': ['At Risk']}, 'risk_score', False, 25],
+    [{'statuses': ['At Risk']}, 'risk_score', True, 50],
+])
+def test_page_resets_when_filters_or_sort_change(dashboard, changed):
+    dashboard.current_table_page([{'statuses': ['At Risk']}, 'risk_score', True, 25])
+    dashboard.st.session_state["project_table_page"] = 4
+    assert dashboard.current_table_page(changed) == 1
+    assert dashboard.st.session_state["project_table_page"] == 1
+
+def _portfolio_frame(rows, statuses=('At Risk', 'On Track')):
+    rng = np.random.default_rng(rows)
+    frame = pd.DataFrame({
+        'id': [f"PRJ{i:06d}" for i in range(rows)],
+        'name': [f"Project {i}" for i in range(rows)],
+        'risk_score': rng.uniform(0, 10, rows),
+        'budget': rng.uniform(1e4, 1e7, rows),
+        'status': [statuses[i % len(statuses)] for i in range(rows)],
+        'start_date': '2024-01-01',
+        'end_date': '2025-01-01'
+    })
+    for category in RISK_CATEGORIES:
+        frame[category] = rng.uniform(0, 10, rows)
+    return frame
+
+def _point_charts(dashboard):
+    visualizations = sys.modules["components.risk_visualizations"]
+    return [dashboard.create_risk_scatter_plot, visualizations.create_risk_bubble_chart]
+
+def test_large_point_charts_use_one_webgl_trace_with_top_labels(dashboard):
+    visualizations = sys.modules["components.risk_visualizations"]
+    rows = visualizations.WEBGL_POINT_THRESHOLD + 1
+    for create_chart in _point_charts(dashboard):
+        fig = create_chart(_portfolio_frame(rows))
+        assert all(trace.type == 'scattergl' for trace in fig.data)
+        points = [trace for trace in fig.data if trace.mode == 'markers' and trace.showlegend is False]
+        assert len(points) == 1 and len(points[0].x) == rows
+        labels = [trace for trace in fig.data if trace.mode == 'text']
+        assert len(labels) == 1 and len(labels[0].text) == visualizations.TOP_LABELED_POINTS
+        legend = [trace.name for trace in fig.data if trace.showlegend is not False and trace.mode != 'text']
+        assert legend == ['At Risk', 'On Track']
+
+def test_small_point_charts_keep_labelled_svg_traces_per_status(dashboard):
+    visualizations = sys.modules["components.risk_visualizations"]
+    rows = visualizations.WEBGL_POINT_THRESHOLD
+    for create_chart in _point_charts(dashboard):
+        fig = create_chart(_portfolio_frame(rows))
+        assert all(trace.type == 'scatter' for trace in fig.data)
+        assert sorted(trace.name for trace in fig.data) == ['At Risk', 'On Track']
+        assert all('text' in trace.mode for trace in fig.data)
+        assert sum(len(trace.x) for trace in fig.data) == rows
@@ -0,0 +1,55 @@
+from utils.job_queue import enqueue_job
+from utils.pg_database import (
+    RiskFactor, Session, acquire_lease, apply_risk_scores, get_data_version, get_projects, save_settings
+)
+
+def test_loading_a_portfolio_changes_the_version(database, portfolio):
+    before = get_data_version()
+    portfolio(5)
+    assert get_data_version() != before
+
+def test_editing_factor_text_changes_the_version(portfolio):
+    portfolio(5)
+    before = get_data_version()
+    session = Session()
+    factor = session.query(RiskFactor).first()
+    factor.description = "Rewritten description"
+    session.commit()
+    session.close()
+    assert get_data_version() > before
+
+def test_bulk_updates_change_the_version(portfolio):
+    portfolio(5)
+    before = get_data_version()
+    session = Session()
+    session.query(RiskFactor).filter(RiskFactor.category == 'market_risk').update(
+        {'category': 'technical_risk'}, synchronize_session=False
+    )
+    session.commit()
+    session.close()
+    assert get_data_version() > before
+
+def test_rescoring_changes_the_version(portfolio):
+    project_id = portfolio(5)[0]
+    before = get_data_version()
+    apply_risk_scores(project_id, {'overall_risk': 5.0}, "fingerprint")
+    assert get_data_version() > before
+
+def test_reads_and_unrelated_writes_keep_the_version(portfolio):
+    portfolio(5)
+    before = get_data_version()
+    get_projects()
+    save_settings({'risk_threshold': 8})
+    acquire_lease("refresh", "owner", 60)
+    enqueue_job('risk_report', {'project_id': 'PRJ000001'})
+    assert get_data_version() == before
+
+def test_rolled_back_writes_keep_the_version(portfolio):
+    portfolio(5)
+    before = get_data_version()
+    session = Session()
+    session.query(RiskFactor).first().impact = 1
+    session.flush()
+    session.rollback()
+    session.close()
+    assert get_data_version() == before
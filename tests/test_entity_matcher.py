@@ -0,0 +1,51 @@
+import random
+from utils.entity_matcher import AhoCorasick, ProjectMatcher, extract_project_ids
+from utils.pg_database import Project, Session
+
+def _brute_force(patterns, text):
+    return sorted(
+        (start, start + len(pattern), value)
+        for pattern, value in patterns
+        for start in range(len(text) - len(pattern) + 1)
+        if text.startswith(pattern, start)
+    )
+
+def test_finds_overlapping_and_nested_patterns():
+    patterns = [("he", 1), ("she", 2), ("his", 3), ("hers", 4)]
+    assert sorted(AhoCorasick(patterns).find("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+
+def test_matches_brute_force_on_random_text():
+    rng = random.Random(0)
+    for _ in range(50):
+        patterns = [("".join(rng.choices("abc", k=rng.randint(1, 4))), i) for i in range(8)]
+        text = "".join(rng.choices("abc", k=60))
+        assert sorted(AhoCorasick(patterns).find(text)) == _brute_force(patterns, text)
+
+def test_project_matcher_uses_ids_names_and_short_names():
+    matcher = ProjectMatcher([("PRJ001", "Project Alpha"), ("PRJ002", "Project Beta"), ("PRJ003", "Gamma Rollout")])
+    assert matcher.match("How is BETA doing compared to prj001?") == ["PRJ002", "PRJ001"]
+    assert matcher.match("Status of the gamma rollout and Project Alpha, then alpha again") == ["PRJ003", "PRJ001"]
+
+def test_project_matcher_only_accepts_whole_words():
+    matcher = ProjectMatcher([("PRJ001", "Project Alpha"), ("PRJ002", "Project Beta")])
+    assert matcher.match("the alphabet and betamax") == []
+    assert matcher.match("alpha-beta") == ["PRJ001", "PRJ002"]
+
+def test_matcher_is_rebuilt_when_projects_change(database):
+    session = Session()
+    session.add(Project(id="PRJ100", name="Project Orion", status="Planning"))
+    session.commit()
+    assert extract_project_ids("Is orion on track?") == ["PRJ100"]
+    assert extract_project_ids("What about vega?") == []
+
+    session.add(Project(id="PRJ101", name="Project Vega", status="Planning"))
+    session.commit()
+    session.close()
+    assert extract_project_ids("What about vega?") == ["PRJ101"]
+
+    session = Session()
+    session.query(Project).filter(Project.id == "PRJ100").update({'name': "Project Lyra"})
+    session.commit()
+    session.close()
+    assert extract_project_ids("Is lyra or orion on track?") == ["PRJ100"]
+    assert extract_project_ids("Is orion on track?") == []
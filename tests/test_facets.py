@@ -0,0 +1,38 @@
+from utils.pg_database import RISK_BANDS, RISK_CATEGORIES, query_projects
+
+def _band(score):
+    for band, (low, high) in RISK_BANDS.items():
+        if (low is None or score >= low) and (high is None or score < high):
+            return band
+
+def test_facets_without_filters_count_every_project(portfolio):
+    portfolio(200)
+    result = query_projects()
+    assert result['total'] == 200
+    assert sum(result['facets']['status'].values()) == 200
+    assert sum(result['facets']['risk_band'].values()) == 200
+
+def test_each_facet_ignores_its_own_filter(portfolio):
+    portfolio(200)
+    everything = query_projects()
+    statuses = sorted(everything['facets']['status'])
+    filters = {'statuses': [statuses[0]], 'risk_bands': ['high']}
+    result = query_projects(filters)
+
+    assert all(p['status'] == statuses[0] and _band(p['risk_score']) == 'high' for p in result['projects'])
+    # Status counts apply only the band filter, band counts only the status filter
+    assert result['facets']['status'] == query_projects({'risk_bands': ['high']})['facets']['status']
+    assert result['facets']['risk_band'] == query_projects({'statuses': [statuses[0]]})['facets']['risk_band']
+    assert result['facets']['status'][statuses[1]] > 0
+    assert result['facets']['risk_band']['low'] > 0
+    # Category counts apply both filters
+    high = RISK_BANDS['high'][0]
+    for category in RISK_CATEGORIES:
+        assert result['facets']['category'][category] == sum(p[category] >= high for p in result['projects'])
+
+def test_category_facet_ignores_category_thresholds(portfolio):
+    portfolio(200)
+    filters = {'category_thresholds': {'budget_risk': 7}}
+    result = query_projects(filters)
+    assert result['facets']['category'] == query_projects()['facets']['category']
+    assert result['facets']['status'] != query_projects()['facets']['status']
@@ -0,0 +1,64 @@
+import json
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+from utils.figure_cache import FigureCache, cached_figure
+
+def _frame(rows=20000):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'name': [f"Project {i}" for i in range(rows)],
+        'risk_score': rng.uniform(0, 10, rows),
+        'budget': rng.uniform(1e4, 1e7, rows)
+    })
+
+def _scatter(df):
+    """Built like the dashboard figures: a WebGL trace, labels for the riskiest points and a threshold line."""
+    fig = go.Figure(go.Scattergl(
+        x=df['risk_score'], y=df['budget'], mode='markers',
+        text="Project: " + df['name'] + "<br>Risk Score: " + df['risk_score'].round(1).astype(str)
+    ))
+    for row in df.nlargest(50, 'risk_score').itertuples():
+        fig.add_annotation(x=row.risk_score, y=row.budget, text=row.name, showarrow=False, yshift=10)
+    fig.add_vline(x=7, line_dash='dash', line_color='red')
+    fig.update_layout(title='Project Risk Assessment', xaxis=dict(range=[0, 10]))
+    return fig
+
+def test_hit_does_not_call_the_builder():
+    df = _frame(100)
+    cache = FigureCache()
+    calls = []
+    cached = cached_figure(columns=['name', 'risk_score', 'budget'], cache=cache)(
+        lambda data: calls.append(len(data)) or _scatter(data))
+    cached(df)
+    cached(df)
+    cached(df.copy())
+    assert calls == [100]
+    metrics = cache.get_metrics()
+    assert metrics['misses'] == 1 and metrics['hits'] == 2 and metrics['entries'] == 1
+
+def test_hit_returns_an_independent_equal_figure():
+    df = _frame(100)
+    cache = FigureCache()
+    cached = cached_figure(columns=['name', 'risk_score', 'budget'], cache=cache)(_scatter)
+    built = cached(df)
+    hit = cached(df)
+    assert cache.get_metrics()['hits'] == 1
+    assert json.loads(hit.to_json()) == json.loads(built.to_json())
+
+    hit.update_layout(title='Changed')
+    hit.data[0].marker.color = 'black'
+    hit.layout.annotations[0].text = 'Changed'
+    again = cached(df)
+    assert again.layout.title.text == 'Project Risk Assessment'
+    assert again.data[0].marker.color is None
+    assert json.loads(again.to_json()) == json.loads(built.to_json())
+
+def test_changed_data_misses_and_cache_is_bounded():
+    cache = FigureCache(max_entries=2)
+    cached = cached_figure(columns=['name', 'risk_score', 'budget'], cache=cache)(_scatter)
+    for rows in (10, 20, 30):
+        cached(_frame(rows))
+    metrics = cache.get_metrics()
+    assert metrics['misses'] == 3 and metrics['entries'] == 2 and metrics['evictions'] == 1
+    assert metrics['bytes'] > 0
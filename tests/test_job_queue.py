@@ -0,0 +1,112 @@
+import threading
+import time
+from datetime import datetime, timedelta
+import pytest
+from utils import job_queue
+from utils.job_queue import (
+    CANCELLED, QUEUED, RUNNING, SUCCEEDED, JobCancelled, claim_next_job, enqueue_job, get_job,
+    new_worker_id, register_job, report_progress, requeue_stale_jobs, run_job
+)
+from utils.pg_database import Job, Session
+
+@register_job('test_echo')
+def _echo(payload, progress):
+    progress(0.5, "Halfway")
+    return {'output': payload.get('text')}
+
+@register_job('test_slow')
+def _slow(payload, progress):
+    time.sleep(payload['seconds'])
+    return {'output': "done"}
+
+def _set_heartbeat(job_id, heartbeat_at):
+    session = Session()
+    session.query(Job).filter(Job.id == job_id).update({'heartbeat_at': heartbeat_at}, synchronize_session=False)
+    session.commit()
+    session.close()
+
+def test_job_runs_to_completion(database):
+    job_id = enqueue_job('test_echo', {'text': "hello"})
+    job = claim_next_job("worker-a")
+    assert job['id'] == job_id and job['status'] == RUNNING
+    run_job(job)
+    finished = get_job(job_id)
+    assert finished['status'] == SUCCEEDED
+    assert finished['result'] == {'output': "hello"}
+    assert finished['progress'] == 1.0
+
+def test_concurrent_claims_have_exactly_one_winner(database):
+    job_id = enqueue_job('test_echo', {'text': "once"})
+    barrier = threading.Barrier(8)
+    claimed = []
+    def claim(worker_id):
+        barrier.wait()
+        job = claim_next_job(worker_id)
+        if job:
+            claimed.append((worker_id, job['id']))
+    threads = [threading.Thread(target=claim, args=(f"worker-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(claimed) == 1
+    assert claimed[0][1] == job_id
+    assert get_job(job_id)['worker_id'] == claimed[0][0]
+
+def test_each_queued_job_is_claimed_once(database):
+    job_ids = {enqueue_job('test_echo') for _ in range(10)}
+    claimed = []
+    def claim_all(worker_id):
+        while (job := claim_next_job(worker_id)) is not None:
+            claimed.append(job['id'])
+    threads = [threading.Thread(target=claim_all, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == sorted(job_ids)
+
+def test_stale_job_is_requeued_and_the_old_worker_cannot_finish_it(database):
+    job_id = enqueue_job('test_echo', {'text': "first"})
+    first = claim_next_job("worker-a")
+    _set_heartbeat(job_id, datetime.now() - timedelta(hours=1))
+
+    assert requeue_stale_jobs() == 1
+    assert get_job(job_id)['status'] == QUEUED
+    second = claim_next_job("worker-b")
+    assert second['id'] == job_id
+
+    # The first worker wakes up: its progress reports stop it and its outcome is discarded
+    with pytest.raises(JobCancelled):
+        report_progress(job_id, "worker-a", 0.9)
+    assert not job_queue._finish_job(job_id, "worker-a", CANCELLED, message="Cancelled")
+    assert get_job(job_id)['status'] == RUNNING
+    assert get_job(job_id)['worker_id'] == "worker-b"
+
+    run_job(second)
+    assert get_job(job_id)['status'] == SUCCEEDED
+
+def test_heartbeat_keeps_a_long_step_from_going_stale(database):
+    job_id = enqueue_job('test_slow', {'seconds': 0.5})
+    job = claim_next_job("worker-a")
+    _set_heartbeat(job_id, datetime.now() - timedelta(hours=1))
+
+    runner = threading.Thread(target=run_job, args=(job,), kwargs={'heartbeat_interval': 0.1})
+    runner.start()
+    time.sleep(0.3)
+    # The handler has not reported progress since it started, but the heartbeat thread has
+    assert requeue_stale_jobs(timeout=timedelta(seconds=0.2)) == 0
+    runner.join()
+    assert get_job(job_id)['status'] == SUCCEEDED
+
+def test_cancel_requested_stops_the_job(database):
+    job_id = enqueue_job('test_echo')
+    job = claim_next_job("worker-a")
+    job_queue.cancel_job(job_id)
+    run_job(job)
+    assert get_job(job_id)['status'] == CANCELLED
+
+def test_worker_ids_are_unique():
+    assert new_worker_id() != new_worker_id()
+    assert new_worker_id("worker-0") != new_worker_id("worker-0")
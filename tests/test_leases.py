@@ -0,0 +1,37 @@
+import threading
+import time
+from utils.pg_database import acquire_lease, release_lease
+
+def test_only_one_owner_holds_a_lease(database):
+    assert acquire_lease("refresh", "a", 60)
+    assert not acquire_lease("refresh", "b", 60)
+    # The holder can renew its own lease
+    assert acquire_lease("refresh", "a", 60)
+
+def test_released_lease_can_be_taken(database):
+    assert acquire_lease("refresh", "a", 60)
+    release_lease("refresh", "b")
+    assert not acquire_lease("refresh", "b", 60)
+    release_lease("refresh", "a")
+    assert acquire_lease("refresh", "b", 60)
+
+def test_expired_lease_is_taken_over(database):
+    assert acquire_lease("refresh", "a", 0.2)
+    assert not acquire_lease("refresh", "b", 60)
+    time.sleep(0.3)
+    assert acquire_lease("refresh", "b", 60)
+    assert not acquire_lease("refresh", "a", 60)
+
+def test_concurrent_acquire_has_one_winner(database):
+    barrier = threading.Barrier(8)
+    winners = []
+    def contend(owner):
+        barrier.wait()
+        if acquire_lease("refresh", owner, 60):
+            winners.append(owner)
+    threads = [threading.Thread(target=contend, args=(f"owner-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(winners) == 1
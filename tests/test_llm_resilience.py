@@ -0,0 +1,124 @@
+import threading
+import time
+import pytest
+from langchain_core.language_models.llms import LLM
+from utils import llm as llm_module
+from utils.llm import CircuitBreaker, LLMUnavailableError, ResilientLLM
+
+class _HTTPError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.response = type("Response", (), {"status_code": status_code, "headers": {}})()
+
+class ScriptedLLM(LLM):
+    """Raises or returns the scripted outcomes in order, then answers 'ok'."""
+    outcomes: list = []
+    calls: int = 0
+
+    @property
+    def _llm_type(self):
+        return "scripted"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_module, "RETRY_BASE_SECONDS", 0.0)
+
+def test_breaker_opens_after_threshold_and_rejects_calls():
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(LLMUnavailableError) as raised:
+        breaker.before_call()
+    assert 0 < raised.value.retry_after <= 60
+
+def test_half_open_breaker_allows_a_single_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.1)
+    breaker.record_failure()
+    time.sleep(0.15)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.before_call()
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=0.1)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+def test_transient_failures_are_retried():
+    upstream = ScriptedLLM(outcomes=[_HTTPError(503), TimeoutError(), "answer"])
+    resilient = ResilientLLM(llm=upstream, burst=10)
+    assert resilient.invoke("prompt") == "answer"
+    metrics = resilient.get_metrics()
+    assert metrics["attempts"] == 3 and metrics["retries"] == 2 and metrics["circuit"] == "closed"
+
+def test_non_retryable_errors_do_not_reset_the_failure_count():
+    upstream = ScriptedLLM(outcomes=[_HTTPError(503)] * 4 + [_HTTPError(400)] + [_HTTPError(503)] * 4)
+    resilient = ResilientLLM(llm=upstream, burst=20, max_retries=3)
+    with pytest.raises(LLMUnavailableError):
+        resilient.invoke("prompt")
+    with pytest.raises(_HTTPError):
+        resilient.invoke("prompt")
+    assert resilient.breaker.failures == 4
+    with pytest.raises(LLMUnavailableError):
+        resilient.invoke("prompt")
+    # Four failures, a bad request, then the fifth failure opens the circuit and its retry is rejected
+    assert resilient.get_metrics()["circuit"] == "open"
+    assert upstream.calls == 6
+    with pytest.raises(LLMUnavailableError):
+        resilient.invoke("prompt")
+    assert upstream.calls == 6 and resilient.get_metrics()["rejected"] == 2
+
+def test_non_retryable_trial_keeps_the_circuit_half_open():
+    upstream = ScriptedLLM(outcomes=[_HTTPError(400)])
+    resilient = ResilientLLM(llm=upstream, burst=10)
+    resilient.breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.1)
+    resilient.breaker.record_failure()
+    time.sleep(0.15)
+    with pytest.raises(_HTTPError):
+        resilient.invoke("bad prompt")
+    assert resilient.breaker.state == "half_open" and resilient.breaker.failures == 1
+    # The next call is let through as the trial and closes the circuit
+    assert resilient.invoke("prompt") == "ok"
+    assert resilient.breaker.state == "closed"
+
+def test_concurrency_is_bounded():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    class SlowLLM(ScriptedLLM):
+        def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.05)
+            with lock:
+                active[0] -= 1
+            return "ok"
+
+    resilient = ResilientLLM(llm=SlowLLM(), burst=20, max_concurrent_calls=2)
+    threads = [threading.Thread(target=resilient.invoke, args=(f"prompt {i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
@@ -0,0 +1,44 @@
+import threading
+from utils.llm import LocalSeq2SeqLLM, enforce_stop_sequences
+
+class EchoSeq2SeqLLM(LocalSeq2SeqLLM):
+    """The local backend with the model replaced by an echo of each prompt."""
+    batch_sizes: list = []
+
+    def _generate_batch(self, prompts):
+        self.batch_sizes.append(len(prompts))
+        return [f"answer to {prompt}\nObservation: more text" for prompt in prompts]
+
+def test_enforce_stop_sequences():
+    assert enforce_stop_sequences("Final Answer: 42\nObservation: x", ["\nObservation"]) == "Final Answer: 42"
+    assert enforce_stop_sequences("a.b|c", ["|", "."]) == "a"
+    assert enforce_stop_sequences("no stop here", ["STOP"]) == "no stop here"
+    assert enforce_stop_sequences("unchanged", None) == "unchanged"
+
+def test_invoke_truncates_at_stop_sequences():
+    llm = EchoSeq2SeqLLM(batch_sizes=[])
+    assert llm.invoke("q1", stop=["\nObservation"]) == "answer to q1"
+    assert llm.invoke("q2") == "answer to q2\nObservation: more text"
+
+def test_generate_truncates_every_prompt_and_batches_them():
+    llm = EchoSeq2SeqLLM(batch_sizes=[], max_wait_seconds=0.2)
+    result = llm.generate(["q1", "q2", "q3"], stop=["Observation"])
+    assert [generations[0].text for generations in result.generations] == [
+        "answer to q1\n", "answer to q2\n", "answer to q3\n"
+    ]
+    assert llm.batch_sizes == [3]
+
+def test_concurrent_prompts_share_a_batch():
+    llm = EchoSeq2SeqLLM(batch_sizes=[], max_wait_seconds=0.2)
+    results = {}
+    barrier = threading.Barrier(4)
+    def ask(i):
+        barrier.wait()
+        results[i] = llm.invoke(f"q{i}", stop=["\n"])
+    threads = [threading.Thread(target=ask, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == {i: f"answer to q{i}" for i in range(4)}
+    assert sum(llm.batch_sizes) == 4 and len(llm.batch_sizes) < 4
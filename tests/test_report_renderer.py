@@ -0,0 +1,69 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+import plotly.graph_objects as go
+import pytest
+from utils import report_renderer
+from utils.report_renderer import render_reports
+
+class _ThreadPool(ThreadPoolExecutor):
+    """
+    Stands in for the process pool. With max_tasks_per_child set, workers are spawned
+    rather than forked, so they would not see the test database or the stubs below.
+    """
+    def __init__(self, max_workers, initializer=None, max_tasks_per_child=None):
+        super().__init__(max_workers=max_workers, initializer=initializer)
+
+@pytest.fixture
+def rendered_images(monkeypatch):
+    """Stub kaleido out; returns the titles of the figures rendered to images."""
+    # The visualization module imports Streamlit at the top; rendering does not use it
+    monkeypatch.setitem(sys.modules, "streamlit", MagicMock())
+    monkeypatch.setattr(report_renderer, "ProcessPoolExecutor", _ThreadPool)
+    rendered = []
+
+    def to_image(fig, format=None, width=None, height=None):
+        rendered.append(fig.layout.title.text)
+        return b"\x89PNG " + fig.to_json().encode("utf-8")[:64]
+
+    monkeypatch.setattr(go.Figure, "to_image", to_image)
+    return rendered
+
+def _images(output_dir, project_id):
+    return sorted(os.listdir(os.path.join(output_dir, "images", project_id)))
+
+def test_reports_render_serially_and_in_a_pool_reusing_images(portfolio, rendered_images, tmp_path):
+    project_ids = portfolio(3)
+    output_dir = str(tmp_path / "reports")
+    progress = []
+
+    results = render_reports(project_ids + ["PRJ_MISSING"], output_dir, pdf=False, workers=1,
+                             progress=lambda fraction, message: progress.append(fraction))
+    assert [result['project_id'] for result in results] == project_ids
+    assert progress[-1] == 1
+    rendered = len(rendered_images)
+    assert rendered == sum(len(_images(output_dir, project_id)) for project_id in project_ids) > 0
+    for result in results:
+        assert result['html'] == os.path.join(output_dir, f"{result['project_id']}.html")
+        assert result['pdf'] is None
+        with open(result['html'], encoding="utf-8") as f:
+            html = f.read()
+        assert f"Project {result['project_id']}" in html
+        assert html.count("data:image/png;base64,") == len(_images(output_dir, result['project_id']))
+
+    # A stale image left by an earlier version of the report is pruned; unchanged figures are reused
+    stale = os.path.join(output_dir, "images", project_ids[0], "stale.png")
+    open(stale, "wb").close()
+    before = {project_id: _images(output_dir, project_id) for project_id in project_ids}
+    progress.clear()
+    results = render_reports(project_ids, output_dir, pdf=False, workers=2,
+                             progress=lambda fraction, message: progress.append(fraction))
+    assert sorted(result['project_id'] for result in results) == project_ids
+    assert all(os.path.exists(result['html']) and result['pdf'] is None for result in results)
+    assert progress[-1] == 1
+    assert len(rendered_images) == rendered
+    assert not os.path.exists(stale)
+    assert {project_id: _images(output_dir, project_id) for project_id in project_ids} == {
+        project_id: [name for name in names if name != "stale.png"] for project_id, names in before.items()
+    }
@@ -0,0 +1,84 @@
+import importlib
+import sys
+import types
+import pytest
+from utils.pg_database import Project, RiskFactor, Session, get_risk_factors_by_project
+from utils.report_templates import get_mitigation_template, render_template
+
+@pytest.fixture
+def reporting_agent(monkeypatch):
+    # The agent module imports the crew frameworks at the top; report generation does not use them
+    monkeypatch.setitem(sys.modules, "crewai", types.SimpleNamespace(Agent=object))
+    monkeypatch.setitem(sys.modules, "langchain_community", types.ModuleType("langchain_community"))
+    monkeypatch.setitem(sys.modules, "langchain_community.llms", types.SimpleNamespace(HuggingFaceHub=object))
+    monkeypatch.delitem(sys.modules, "agents.reporting_agent", raising=False)
+    return importlib.import_module("agents.reporting_agent")
+
+def _ranked_factors(project_id):
+    session = Session()
+    factors = session.query(RiskFactor).filter(RiskFactor.project_id == project_id).all()
+    session.close()
+    return sorted(factors, key=lambda factor: (-(factor.impact or 0) * (factor.likelihood or 0), factor.id))
+
+def test_mitigation_template_per_category_with_default_fallback():
+    assert get_mitigation_template("schedule_risk").name == "mitigation/schedule_risk.md.j2"
+    assert get_mitigation_template("budget_risk").name == "mitigation/budget_risk.md.j2"
+    assert get_mitigation_template("unknown").name == "mitigation/default.md.j2"
+    assert get_mitigation_template("market_risk").name == "mitigation/default.md.j2"
+
+def test_suggest_mitigation_strategy_falls_back_to_default(reporting_agent):
+    agent = reporting_agent.ReportingAgent(llm=None)
+    default = agent.suggest_mitigation_strategy({'name': 'Vendor lock-in', 'category': 'market_risk'})
+    assert default.startswith("# Mitigation Strategy")
+    assert agent.suggest_mitigation_strategy("not a factor") == default
+
+def test_factors_are_limited_per_project_in_ranking_order(portfolio):
+    project_ids = portfolio(30)
+    limited = get_risk_factors_by_project(project_ids + ["PRJ_MISSING"], limit_per_project=2)
+    assert limited["PRJ_MISSING"] == []
+    for project_id in project_ids:
+        expected = [factor.id for factor in _ranked_factors(project_id)]
+        assert [factor['id'] for factor in limited[project_id]] == expected[:2]
+    unlimited = get_risk_factors_by_project(project_ids[:3])
+    assert [factor['id'] for factor in unlimited[project_ids[0]]] == [f.id for f in _ranked_factors(project_ids[0])]
+
+def test_generate_reports_round_trip(portfolio, reporting_agent):
+    project_ids = portfolio(30)
+    reports = reporting_agent.ReportingAgent(llm=None).generate_reports(project_ids + ["PRJ_MISSING"])
+    assert sorted(reports) == project_ids
+
+    session = Session()
+    project = session.get(Project, project_ids[0])
+    name, risk_score = project.name, project.risk_score
+    session.close()
+    report = reports[project_ids[0]]
+    assert report.startswith(f"# Risk Report: {name}")
+    assert f"**{risk_score}/10**" in report
+    top = _ranked_factors(project_ids[0])
+    for factor in top[:reporting_agent.REPORT_TOP_FACTORS]:
+        assert f"- **{factor.name}** (score {factor.impact * factor.likelihood / 10:.1f}/10)" in report
+    for factor in top[reporting_agent.REPORT_TOP_FACTORS:]:
+        assert f"(score {factor.impact * factor.likelihood / 10:.1f}/10): {factor.description}" not in report
+
+def test_html_report_escapes_project_data():
+    html = render_template(
+        "report.html.j2",
+        project={'id': 'PRJ1', 'name': '<script>alert(1)</script>', 'status': 'At Risk & Late', 'budget': 1000},
+        generated_at='2026-01-01 00:00',
+        categories={'schedule_risk': 5},
+        images=[],
+        risk_factors=[{'name': 'Vendor <b>', 'category': 'budget_risk', 'impact': 5, 'likelihood': 5,
+                       'mitigation': '"quoted" & <i>'}],
+        report_text='<img src=x onerror=alert(1)>'
+    )
+    assert '<script>' not in html and '&lt;script&gt;alert(1)&lt;/script&gt;' in html
+    assert 'At Risk &amp; Late' in html
+    assert 'Vendor &lt;b&gt;' in html
+    assert '&#34;quoted&#34; &amp; &lt;i&gt;' in html
+    assert '<img src=x' not in html
+
+def test_markdown_templates_are_not_escaped():
+    report = render_template("report.md.j2", risk_data={
+        'project_name': 'R&D <Beta>', 'risk_categories': {}, 'top_risk_factors': []
+    })
+    assert report.startswith("# Risk Report: R&D <Beta>")
@@ -0,0 +1,35 @@
+from collections import Counter
+from utils.pg_database import Project, RiskFactor, Session, get_cell_risk_factors, get_risk_factor_counts
+
+def _factor_pairs(statuses=None, categories=None):
+    session = Session()
+    query = session.query(RiskFactor.impact, RiskFactor.likelihood).join(Project, RiskFactor.project_id == Project.id)
+    if statuses:
+        query = query.filter(Project.status.in_(statuses))
+    if categories:
+        query = query.filter(RiskFactor.category.in_(categories))
+    pairs = Counter((impact, likelihood) for impact, likelihood in query if impact is not None and likelihood is not None)
+    session.close()
+    return pairs
+
+def _counted_pairs(*args):
+    impact, likelihood, counts = get_risk_factor_counts(*args)
+    return Counter({(int(i), int(l)): int(c) for i, l, c in zip(impact, likelihood, counts)})
+
+def test_counts_match_the_factors(portfolio):
+    portfolio(200)
+    counted = _counted_pairs()
+    assert len(counted) <= 100
+    assert counted == _factor_pairs()
+
+def test_counts_respect_project_filters_and_categories(portfolio):
+    portfolio(200)
+    filters = {'statuses': ['At Risk']}
+    assert _counted_pairs(filters, ['schedule_risk']) == _factor_pairs(['At Risk'], ['schedule_risk'])
+
+def test_cell_drilldown_lists_the_factors_of_one_cell(portfolio):
+    portfolio(200)
+    (impact, likelihood), count = _counted_pairs().most_common(1)[0]
+    factors = get_cell_risk_factors((impact - 0.5, impact + 0.5), (likelihood - 0.5, likelihood + 0.5), limit=1000)
+    assert len(factors) == count
+    assert all(factor['impact'] == impact and factor['likelihood'] == likelihood for factor in factors)
@@ -0,0 +1,105 @@
+import time
+from datetime import datetime, timedelta
+from utils import scheduler
+from utils.pg_database import Lease, Session, acquire_lease, get_settings, save_settings
+
+def _overdue():
+    save_settings({'update_frequency': 'Hourly', 'last_refresh_at': (datetime.now() - timedelta(days=1)).isoformat()})
+
+def _count_attempts(monkeypatch):
+    calls = []
+    original = scheduler.acquire_lease
+    def counting_acquire_lease(*args, **kwargs):
+        calls.append(time.monotonic())
+        return original(*args, **kwargs)
+    monkeypatch.setattr(scheduler, "acquire_lease", counting_acquire_lease)
+    return calls
+
+def test_backs_off_while_another_process_holds_the_lease(database, monkeypatch):
+    _overdue()
+    assert acquire_lease(scheduler.REFRESH_LEASE, "other-process", 3600)
+    calls = _count_attempts(monkeypatch)
+
+    refresh = scheduler.RefreshScheduler(jitter=0, retry_backoff=60)
+    refresh.start()
+    time.sleep(1)
+    refresh.stop()
+
+    assert len(calls) == 1
+    assert refresh.seconds_until_next_run() > 50
+
+def test_backs_off_after_a_failed_run(database, monkeypatch):
+    _overdue()
+    calls = _count_attempts(monkeypatch)
+    def failing_refresh(force):
+        raise RuntimeError("refresh failed")
+    refresh = scheduler.RefreshScheduler(jitter=0, retry_backoff=60)
+    monkeypatch.setattr(refresh, "_refresh", failing_refresh)
+    monkeypatch.setattr(scheduler.traceback, "print_exc", lambda: None)
+
+    refresh.start()
+    time.sleep(1)
+    refresh.stop()
+
+    assert len(calls) == 1
+
+def test_retries_once_the_backoff_has_passed(database, monkeypatch):
+    _overdue()
+    assert acquire_lease(scheduler.REFRESH_LEASE, "other-process", 3600)
+    calls = _count_attempts(monkeypatch)
+
+    refresh = scheduler.RefreshScheduler(jitter=0, retry_backoff=0.2)
+    refresh.start()
+    time.sleep(1)
+    refresh.stop()
+
+    # Roughly one attempt per backoff period, not a busy loop
+    assert 2 <= len(calls) <= 6
+
+def test_completed_run_waits_for_the_next_interval(database, monkeypatch):
+    _overdue()
+    refresh = scheduler.RefreshScheduler(jitter=0)
+    monkeypatch.setattr(scheduler, "get_data_version", lambda: "unchanged")
+    save_settings({'last_refresh_version': "unchanged"})
+    monkeypatch.setattr("utils.vector_store.ingest_documents", lambda: None)
+
+    assert refresh.run_once() is None
+    assert refresh.seconds_until_next_run() > 3500
+
+def _lease():
+    session = Session()
+    lease = session.get(Lease, scheduler.REFRESH_LEASE)
+    result = (lease.owner, lease.expires_at) if lease else None
+    session.close()
+    return result
+
+def test_lease_is_renewed_between_steps_and_a_lost_lease_stops_the_run(database, monkeypatch):
+    monkeypatch.setattr("utils.vector_store.ingest_documents", lambda: None)
+    monkeypatch.setattr(scheduler, "rescore_changed_projects", lambda: ["PRJ001"])
+    refresh = scheduler.RefreshScheduler(jitter=0, retry_backoff=60)
+    leases = []
+
+    def slow_step(changed_project_ids, settings):
+        leases.append(_lease())
+        time.sleep(0.01)
+
+    monkeypatch.setattr(scheduler, "REFRESH_STEPS", [slow_step, slow_step])
+    assert refresh.run_once(force=True) == ["PRJ001"]
+    assert [owner for owner, _expires_at in leases] == [refresh.owner] * 2
+    assert leases[1][1] > leases[0][1]
+    assert _lease() is None
+
+    def taken_over(changed_project_ids, settings):
+        # The lease expired mid-run and another process acquired it
+        session = Session()
+        session.query(Lease).update({'owner': "other-process"})
+        session.commit()
+        session.close()
+
+    steps = []
+    monkeypatch.setattr(scheduler, "REFRESH_STEPS", [taken_over, lambda *args: steps.append(args)])
+    last_refresh = get_settings()['last_refresh_at']
+    assert refresh.run_once(force=True) is None
+    assert steps == []
+    assert get_settings()['last_refresh_at'] == last_refresh
+    assert _lease()[0] == "other-process"
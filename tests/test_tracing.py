@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+import pytest
+from utils import tracing
+from utils.tracing import span
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    path = tmp_path / "traces" / "spans.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_EXPORT_PATH", str(path))
+    monkeypatch.setattr(tracing, "_export_file", None)
+    monkeypatch.setattr(tracing, "_written_since_check", 0)
+    yield path
+    if tracing._export_file is not None:
+        tracing._export_file.close()
+
+def test_export_is_off_unless_configured(tmp_path):
+    environment = {key: value for key, value in os.environ.items() if key != "TRACE_EXPORT_PATH"}
+    environment["PYTHONPATH"] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = (
+        "from utils import tracing\n"
+        "with tracing.span('test.stage'):\n"
+        "    pass\n"
+        "print(repr(tracing.TRACE_EXPORT_PATH), tracing._export_file)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=environment,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["''", "None"]
+    assert not any(tmp_path.iterdir())
+
+def test_spans_are_exported_when_configured(export):
+    with span("test.stage", rows=3):
+        pass
+    stats = tracing.get_stage_stats(from_export=True)
+    assert [stage['stage'] for stage in stats] == ["test.stage"]
+
+def test_export_file_is_rotated_at_the_size_cap(export, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_EXPORT_MAX_BYTES", 20_000)
+    monkeypatch.setattr(tracing, "ROTATE_CHECK_INTERVAL", 10)
+    for _ in range(2000):
+        with span("test.stage"):
+            pass
+    rotated = export.with_name(export.name + ".1")
+    assert rotated.exists()
+    # Each file overshoots the cap by at most one check interval of spans
+    line_bytes = os.path.getsize(rotated) / len(rotated.read_text().splitlines())
+    assert os.path.getsize(export) <= 20_000 + 10 * line_bytes
+    assert os.path.getsize(rotated) <= 20_000 + 10 * line_bytes
+    assert sorted(os.listdir(export.parent)) == ["spans.jsonl", "spans.jsonl.1"]
+
+def test_rotation_by_another_process_is_followed(export):
+    with span("test.stage"):
+        pass
+    os.replace(export, str(export) + ".1")
+    tracing._written_since_check = tracing.ROTATE_CHECK_INTERVAL
+    with span("test.after"):
+        pass
+    assert "test.after" in export.read_text()
+    assert "test.after" not in export.with_name(export.name + ".1").read_text()
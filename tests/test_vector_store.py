@@ -0,0 +1,126 @@
+import hashlib
+import threading
+import pytest
+from utils import vector_store
+from utils.pg_database import DocumentFile, Session, acquire_lease
+from utils.vector_store import ingest_documents, iter_chunks, iter_words, search_risks
+
+@pytest.fixture(autouse=True)
+def fresh_index(monkeypatch):
+    # The in-memory index is keyed by the chunk count and last ID, which repeat across test databases
+    monkeypatch.setattr(vector_store, "_index", None)
+    monkeypatch.setattr(vector_store, "_index_version", None)
+
+def _paragraph(seed, words=120):
+    return " ".join(f"w{seed}x{i}" for i in range(words))
+
+def _chunk_hashes(path):
+    return {hashlib.sha256(text.encode("utf-8")).hexdigest() for text in iter_chunks(iter_words(path))}
+
+def test_edit_keeps_hashes_of_untouched_chunks(tmp_path):
+    path = tmp_path / "doc.txt"
+    paragraphs = [_paragraph(i) for i in range(20)]
+    path.write_text("\n\n".join(paragraphs))
+    before = _chunk_hashes(path)
+
+    # Insert a paragraph at the start and edit one word in the middle of another
+    paragraphs[10] = paragraphs[10].replace("w10x60", "edited")
+    path.write_text("\n\n".join(["new opening paragraph"] + paragraphs))
+    after = _chunk_hashes(path)
+
+    assert len(before - after) <= 3
+    assert len(after - before) <= 4
+
+def test_long_paragraphs_are_split_at_content_boundaries():
+    words = _paragraph(0, words=5000).split()
+    chunks = list(iter_chunks(iter(words)))
+    limit = vector_store.CHUNK_MAX_WORDS + vector_store.CHUNK_OVERLAP_WORDS
+    assert all(len(chunk.split()) <= limit for chunk in chunks)
+    assert len(chunks) > 5000 // vector_store.CHUNK_MAX_WORDS
+    # Dropping the first words only changes the chunks before the first shared boundary
+    shifted = set(iter_chunks(iter(words[7:])))
+    assert len(set(chunks) - shifted) <= 2
+
+def test_chunks_overlap_so_text_across_a_boundary_stays_whole():
+    words = _paragraph(0, words=3000).split()
+    chunks = [chunk.split() for chunk in iter_chunks(iter(words))]
+    overlap = vector_store.CHUNK_OVERLAP_WORDS
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk[:overlap] == previous[-overlap:]
+    # Every run of `overlap` consecutive words appears whole in some chunk
+    texts = [" ".join(chunk) for chunk in chunks]
+    for start in range(0, len(words) - overlap, 97):
+        sentence = " ".join(words[start:start + overlap])
+        assert any(sentence in text for text in texts)
+
+def test_short_paragraphs_are_merged_forward():
+    paragraphs = ["# Heading", _paragraph(1, words=10), _paragraph(2, words=60), "## Next", _paragraph(3, words=60)]
+    words = []
+    for paragraph in paragraphs:
+        words += paragraph.split() + [vector_store.PARAGRAPH_BREAK]
+    chunks = list(iter_chunks(iter(words)))
+    assert chunks[0].startswith("# Heading w1x0")
+    assert len(chunks) == 2 and "## Next w3x0" in chunks[1]
+    assert all(len(chunk.split()) >= vector_store.CHUNK_MIN_WORDS for chunk in chunks)
+
+def test_words_are_not_split_across_blocks(tmp_path):
+    path = tmp_path / "doc.txt"
+    path.write_text("alpha beta\n\n\ngamma delta epsilon\n")
+    assert list(iter_words(path, block_size=3)) == ["alpha", "beta", None, "gamma", "delta", "epsilon"]
+
+def _write_docs(directory, count=5):
+    directory.mkdir()
+    for i in range(count):
+        (directory / f"doc{i}.txt").write_text(f"topic{i} supplier risk\n\n" + _paragraph(i, words=300))
+
+def test_ingest_is_skipped_while_another_process_holds_the_lease(database, tmp_path):
+    _write_docs(tmp_path / "docs")
+    assert acquire_lease(vector_store.INGEST_LEASE, "other", 60)
+    stats = ingest_documents(str(tmp_path / "docs"))
+    assert stats['lease_held'] and stats['files_processed'] == 0
+
+def test_concurrent_ingests_do_not_conflict(database, tmp_path):
+    _write_docs(tmp_path / "docs")
+    barrier = threading.Barrier(4)
+    results, errors = [], []
+    def ingest():
+        barrier.wait()
+        try:
+            results.append(ingest_documents(str(tmp_path / "docs")))
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=ingest) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sum(stats['files_processed'] for stats in results) == 5
+    session = Session()
+    assert session.query(DocumentFile).count() == 5
+    session.close()
+
+def test_existing_document_row_is_updated(database, tmp_path):
+    _write_docs(tmp_path / "docs", count=1)
+    path = str((tmp_path / "docs" / "doc0.txt").resolve())
+    session = Session()
+    session.add(DocumentFile(path=path, size=0, modified_at=0.0))
+    session.commit()
+    session.close()
+
+    assert ingest_documents(str(tmp_path / "docs"))['files_processed'] == 1
+    session = Session()
+    assert session.get(DocumentFile, path).size > 0
+    session.close()
+
+def test_search_scans_when_index_is_over_the_cap(database, tmp_path, monkeypatch):
+    _write_docs(tmp_path / "docs")
+    ingest_documents(str(tmp_path / "docs"))
+    indexed = search_risks("topic3 w3x5 w3x6", n_results=3)
+    assert indexed and indexed[0]['source'].endswith("doc3.txt")
+
+    monkeypatch.setattr(vector_store, "INDEX_MAX_CHUNKS", 2)
+    monkeypatch.setattr(vector_store, "SCAN_BATCH_SIZE", 2)
+    assert vector_store._chunk_index() is None
+    assert search_risks("topic3 w3x5 w3x6", n_results=3) == indexed
@@ -0,0 +1,135 @@
+"""
+Threshold and delta alert evaluation over the whole project portfolio.
+
+All projects are loaded once into a numeric matrix and every rule is evaluated in
+a single vectorized comparison, so cost grows with the size of that matrix rather
+than with per-project, per-rule Python loops. Fired alerts are deduplicated and
+rate-limited per (project, rule) and delivered as one batch through a pluggable sink.
+"""
+import json
+import os
+import smtplib
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+import numpy as np
+import pandas as pd
+from utils.pg_database import get_recent_alert_keys, get_settings, iter_projects, record_alert_events
+
+RISK_COLUMNS = ['risk_score', 'schedule_risk', 'budget_risk', 'resource_risk', 'market_risk', 'technical_risk']
+# Alert when the overall risk score rose by at least this much since the previous scoring
+RISK_DELTA_THRESHOLD = 1.0
+# The same rule fires at most once per project within this window
+ALERT_COOLDOWN = timedelta(hours=24)
+ALERT_LOG_PATH = os.environ.get("ALERT_LOG_PATH", os.path.join("data", "alerts", "alerts.jsonl"))
+SMTP_HOST = os.environ.get("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.environ.get("SMTP_PORT", "1025"))
+SMTP_SENDER = os.environ.get("SMTP_SENDER", "risk-alerts@localhost")
+
+@dataclass(slots=True)
+class AlertRule:
+    """Fire when `column` is greater than or equal to `threshold`."""
+    name: str
+    column: str
+    threshold: float
+
+def default_rules(settings):
+    """Build the threshold rules for every risk column plus the risk delta rule."""
+    threshold = float(settings['risk_threshold'])
+    rules = [AlertRule(f"{column}_threshold", column, threshold) for column in RISK_COLUMNS]
+    rules.append(AlertRule("risk_score_increase", 'risk_delta', RISK_DELTA_THRESHOLD))
+    return rules
+
+def load_portfolio_metrics(columns):
+    """Load project IDs, names and a float matrix of the given columns (NaN for missing values)."""
+    rows = iter_projects(columns=['id', 'name'] + columns)
+    frame = pd.DataFrame.from_records(rows, columns=['id', 'name'] + columns)
+    values = frame[columns].to_numpy(dtype=float, na_value=np.nan)
+    return frame['id'].to_numpy(), frame['name'].to_numpy(), values
+
+def evaluate_rules(rules, project_ids, project_names, values, columns):
+    """Evaluate all rules against all projects in one vectorized pass and return the fired alerts."""
+    if not rules or len(project_ids) == 0:
+        return []
+
+    column_index = np.array([columns.index(rule.column) for rule in rules])
+    thresholds = np.array([rule.threshold for rule in rules])
+    # Shape (projects, rules); NaN comparisons are False so missing values never fire
+    rule_values = values[:, column_index]
+    fired = rule_values >= thresholds
+
+    project_rows, rule_columns = np.nonzero(fired)
+    return [
+        {
+            'project_id': project_ids[i],
+            'project_name': project_names[i],
+            'rule': rules[j].name,
+            'column': rules[j].column,
+            'value': float(rule_values[i, j]),
+            'threshold': float(thresholds[j])
+        }
+        for i, j in zip(project_rows, rule_columns)
+    ]
+
+def suppress_recent(alerts, cooldown=ALERT_COOLDOWN):
+    """Drop alerts for (project, rule) pairs that already fired within the cooldown window."""
+    recent = get_recent_alert_keys(datetime.now() - cooldown)
+    return [alert for alert in alerts if (alert['project_id'], alert['rule']) not in recent]
+
+def format_alerts(alerts):
+    lines = [f"{len(alerts)} project risk alert(s):", ""]
+    for alert in alerts:
+        label = alert['column'].replace('_', ' ').title()
+        lines.append(f"- {alert['project_name']}: {label} {alert['value']:.1f} (threshold {alert['threshold']:.1f})")
+    return "\n".join(lines)
+
+class FileSink:
+    """Append each alert batch as JSON lines to a local file."""
+
+    def __init__(self, path=ALERT_LOG_PATH):
+        self.path = path
+
+    def send(self, alerts):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        sent_at = datetime.now().isoformat()
+        with open(self.path, "a", encoding="utf-8") as f:
+            for alert in alerts:
+                f.write(json.dumps({**alert, 'sent_at': sent_at}) + "\n")
+
+class SMTPSink:
+    """Send each alert batch as one email. Defaults to a local SMTP server on port 1025."""
+
+    def __init__(self, recipient, host=SMTP_HOST, port=SMTP_PORT, sender=SMTP_SENDER):
+        self.recipient = recipient
+        self.host = host
+        self.port = port
+        self.sender = sender
+
+    def send(self, alerts):
+        message = EmailMessage()
+        message['Subject'] = f"Project risk alerts ({len(alerts)})"
+        message['From'] = self.sender
+        message['To'] = self.recipient
+        message.set_content(format_alerts(alerts))
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            smtp.send_message(message)
+
+def get_alert_sink(settings):
+    """Email alerts when notifications are enabled and an address is set, otherwise log them to a file."""
+    if settings.get('email_notifications') and settings.get('notification_email'):
+        return SMTPSink(settings['notification_email'])
+    return FileSink()
+
+def run_alert_evaluation(settings=None, rules=None, sink=None):
+    """Evaluate alert rules over the portfolio, send new alerts as one batch and return them."""
+    settings = settings or get_settings()
+    rules = rules if rules is not None else default_rules(settings)
+    columns = sorted({rule.column for rule in rules})
+
+    project_ids, project_names, values = load_portfolio_metrics(columns)
+    alerts = suppress_recent(evaluate_rules(rules, project_ids, project_names, values, columns))
+    if alerts:
+        (sink or get_alert_sink(settings)).send(alerts)
+        # Only record alerts once they were delivered, so failed sends are retried next run
+        record_alert_events(alerts)
+    return alerts
@@ -0,0 +1,181 @@
+"""
+Prompt context assembly for the chat LLM handlers.
+
+Candidate snippets are gathered from risk factors, stored risk reports and the
+ingested market intelligence document chunks (see utils.vector_store), ranked against the query with BM25,
+deduplicated and greedily packed under a token budget. Every build records how
+long assembly took and how large the resulting context is.
+"""
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from utils.entity_matcher import extract_project_ids
+from utils.pg_database import list_risk_reports, search_similar_risks
+from utils.tracing import traced
+from utils.vector_store import search_risks
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the assembled context; flan-t5-base only reads 512 input tokens
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "320"))
+# Candidate risk factors pulled from the keyword search before ranking
+MAX_FACTOR_CANDIDATES = 20
+# Shorter query words are left out of the keyword search, which matches substrings
+MIN_SEARCH_TERM_LENGTH = 3
+MAX_REPORT_CANDIDATES = 5
+MAX_DOCUMENT_CANDIDATES = 10
+# Snippets whose word sets overlap at least this much with a selected snippet are dropped
+DUPLICATE_SIMILARITY = 0.8
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Query words too common to say anything about relevance
+STOP_WORDS = frozenset(
+    "a about an and are as at be by can do does for from how i in is it me of on or our "
+    "should the their there these this to us we what when which who why will with you".split()
+)
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+def count_tokens(text):
+    """
+    Approximate the model's token count: one token per word or punctuation mark,
+    plus one for every further 6 characters of long words that get split into pieces.
+    """
+    return sum(1 + (len(piece) - 1) // 6 for piece in _TOKEN_PATTERN.findall(text))
+
+def _words(text):
+    return _WORD_PATTERN.findall(text.lower())
+
+@dataclass(slots=True)
+class Snippet:
+    source: str
+    text: str
+    score: float = 0.0
+    tokens: int = 0
+
+@dataclass
+class ContextResult:
+    """Assembled prompt context together with its size and assembly statistics."""
+    text: str
+    snippets: list = field(default_factory=list)
+    candidates: int = 0
+    tokens: int = 0
+    budget: int = CONTEXT_TOKEN_BUDGET
+    assembly_ms: float = 0.0
+
+def search_terms(query):
+    """The query words the keyword search should match: no stop words or very short words."""
+    return [word for word in _words(query) if word not in STOP_WORDS and len(word) >= MIN_SEARCH_TERM_LENGTH]
+
+def factor_snippets(query):
+    """Snippets for the risk factors matching the query."""
+    # Stop words would otherwise match most factors and crowd the candidates out before ranking
+    terms = search_terms(query)
+    if not terms:
+        return []
+    snippets = []
+    for factor in search_similar_risks(" ".join(terms), n_results=MAX_FACTOR_CANDIDATES):
+        text = f"Risk '{factor['name']}'"
+        if factor.get('project_name'):
+            text += f" on {factor['project_name']}"
+        text += f" (impact {factor['impact']}/10, likelihood {factor['likelihood']}/10): {factor['description']}."
+        if factor.get('mitigation'):
+            text += f" Current mitigation: {factor['mitigation']}."
+        snippets.append(Snippet('risk_factor', text))
+    return snippets
+
+def report_snippets(query):
+    """Paragraph snippets from the latest stored reports of the projects named in the query (or overall)."""
+    project_ids = extract_project_ids(query)
+    if project_ids:
+        reports = [report for project_id in project_ids for report in list_risk_reports(project_id, limit=1)]
+    else:
+        reports = list_risk_reports(limit=MAX_REPORT_CANDIDATES)
+    snippets = []
+    for report in reports:
+        content = (report.get('content') or {}).get('report', '')
+        for paragraph in re.split(r"\n\s*\n", content):
+            if paragraph.strip():
+                snippets.append(Snippet('report', paragraph.strip()))
+    return snippets
+
+def document_snippets(query):
+    """Snippets for the ingested document chunks most similar to the query."""
+    return [Snippet('document', chunk['text']) for chunk in search_risks(query, n_results=MAX_DOCUMENT_CANDIDATES)]
+
+SNIPPET_SOURCES = {
+    'risk_factors': factor_snippets,
+    'reports': report_snippets,
+    'documents': document_snippets,
+}
+
+def rank_snippets(query, snippets):
+    """Score snippets against the query with BM25 and return them best first."""
+    query_terms = set(_words(query)) - STOP_WORDS
+    documents = [Counter(_words(snippet.text)) for snippet in snippets]
+    if not documents or not query_terms:
+        return []
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents) or 1
+    document_frequency = Counter(term for doc in documents for term in query_terms if term in doc)
+
+    for snippet, doc in zip(snippets, documents):
+        length = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            frequency = doc.get(term)
+            if not frequency:
+                continue
+            idf = math.log(1 + (len(documents) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+            score += idf * frequency * (BM25_K1 + 1) / (frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length))
+        snippet.score = score
+    return sorted((snippet for snippet in snippets if snippet.score > 0), key=lambda snippet: snippet.score, reverse=True)
+
+def _is_duplicate(words, selected_words):
+    for other in selected_words:
+        overlap = len(words & other) / (len(words | other) or 1)
+        if overlap >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+def pack_snippets(ranked, budget):
+    """Greedily take the best non-duplicate snippets that still fit in the token budget."""
+    selected = []
+    selected_words = []
+    used = 0
+    for snippet in ranked:
+        words = set(_words(snippet.text))
+        if _is_duplicate(words, selected_words):
+            continue
+        snippet.tokens = count_tokens(snippet.text)
+        if used + snippet.tokens > budget:
+            continue
+        selected.append(snippet)
+        selected_words.append(words)
+        used += snippet.tokens
+    return selected, used
+
+@traced("context.build")
+def build_context(query, sources=tuple(SNIPPET_SOURCES), budget=CONTEXT_TOKEN_BUDGET):
+    """Assemble the most relevant context for a query from the given sources, within the token budget."""
+    start = time.perf_counter()
+    candidates = [snippet for source in sources for snippet in SNIPPET_SOURCES[source](query)]
+    selected, used = pack_snippets(rank_snippets(query, candidates), budget)
+    result = ContextResult(
+        text="\n".join(f"- {snippet.text}" for snippet in selected),
+        snippets=selected,
+        candidates=len(candidates),
+        tokens=used,
+        budget=budget,
+        assembly_ms=(time.perf_counter() - start) * 1000
+    )
+    logger.info(
+        "Built prompt context: %d/%d snippets, %d/%d tokens in %.1f ms",
+        len(selected), len(candidates), used, budget, result.assembly_ms
+    )
+    return result
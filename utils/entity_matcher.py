@@ -0,0 +1,109 @@
+"""
+Project name and ID extraction for chat queries.
+
+An Aho-Corasick automaton over every project's ID, full name and short name
+("alpha" for "Project Alpha") finds all referenced projects in a single pass over
+the query. The automaton is rebuilt only when the projects table changes.
+"""
+import threading
+from collections import deque
+from utils.pg_database import get_data_version, iter_projects
+
+class AhoCorasick:
+    """Multi-pattern string matcher; each pattern maps to a value returned on match."""
+
+    def __init__(self, patterns):
+        # Each node is a dict of transitions; fail links and outputs are kept in parallel lists
+        self.transitions = [{}]
+        self.fail = [0]
+        self.outputs = [[]]
+        for pattern, value in patterns:
+            self._add(pattern, value)
+        self._link()
+
+    def _add(self, pattern, value):
+        node = 0
+        for char in pattern:
+            next_node = self.transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self.transitions)
+                self.transitions[node][char] = next_node
+                self.transitions.append({})
+                self.fail.append(0)
+                self.outputs.append([])
+            node = next_node
+        self.outputs[node].append((len(pattern), value))
+
+    def _link(self):
+        queue = deque(self.transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.transitions[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and char not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.transitions[fallback].get(char, 0)
+                self.outputs[child] = self.outputs[child] + self.outputs[self.fail[child]]
+
+    def find(self, text):
+        """Yield (start, end, value) for every pattern occurrence in text."""
+        node = 0
+        for index, char in enumerate(text):
+            while node and char not in self.transitions[node]:
+                node = self.fail[node]
+            node = self.transitions[node].get(char, 0)
+            for length, value in self.outputs[node]:
+                yield index - length + 1, index + 1, value
+
+def _aliases(project_id, name):
+    """Lowercase strings that refer to a project: its ID, full name and name without a 'Project' prefix."""
+    aliases = {project_id.lower()}
+    if name:
+        name = name.lower()
+        aliases.add(name)
+        if name.startswith("project "):
+            aliases.add(name[len("project "):])
+    return {alias for alias in aliases if alias.strip()}
+
+class ProjectMatcher:
+    """Finds the projects referenced in a piece of text."""
+
+    def __init__(self, projects):
+        patterns = [(alias, project_id) for project_id, name in projects for alias in _aliases(project_id, name)]
+        self.automaton = AhoCorasick(patterns)
+
+    def match(self, text):
+        """Return the IDs of the referenced projects, in order of first mention."""
+        text = text.lower()
+        matches = []
+        for start, end, project_id in self.automaton.find(text):
+            # Only accept whole-word matches so "alpha" does not match "alphabet"
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            matches.append((start, project_id))
+        matched_ids = []
+        for _start, project_id in sorted(matches):
+            if project_id not in matched_ids:
+                matched_ids.append(project_id)
+        return matched_ids
+
+_matcher = None
+_matcher_version = None
+_matcher_lock = threading.Lock()
+
+def get_project_matcher():
+    """Get the process-wide matcher, rebuilding it once the project data changed."""
+    global _matcher, _matcher_version
+    version = get_data_version()
+    with _matcher_lock:
+        if _matcher is None or version != _matcher_version:
+            _matcher = ProjectMatcher(iter_projects(columns=['id', 'name']))
+            _matcher_version = version
+        return _matcher
+
+def extract_project_ids(text):
+    """Return the IDs of the projects referenced in text."""
+    return get_project_matcher().match(text)
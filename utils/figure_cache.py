@@ -0,0 +1,134 @@
+"""
+Memoized Plotly figures keyed by a fingerprint of their input data.
+
+Decorate a figure builder with @cached_figure(columns=[...]). Its first argument
+(a DataFrame or a project dict) is fingerprinted cheaply: only the listed columns,
+plus updated_at when present, are hashed with pandas' vectorised row hashing. A
+repeated call with unchanged data returns the stored figure instead of building
+it again. Figures are stored as their to_plotly_json() dicts in a process-wide LRU
+cache bounded both by entry count and approximate total size in bytes. A hit
+returns a new, validated figure built from a deep copy of the stored dict, which
+costs a fraction of building the figure (parsing it back from JSON would cost
+about as much as the build itself), and callers may modify it freely. Numeric
+arrays stay in Plotly's base64 typed-array form on the returned figure.
+"""
+import copy
+import functools
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_MB", "64")) * 1024 * 1024
+FIGURE_CACHE_MAX_ENTRIES = 256
+
+def figure_size(value):
+    """Approximate size in bytes of a figure dict: its array buffers and strings."""
+    if isinstance(value, dict):
+        return sum(len(key) + figure_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(figure_size(item) for item in value)
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return sum(figure_size(item) for item in value.flat)
+        return value.nbytes
+    if isinstance(value, str):
+        return len(value)
+    return 8
+
+class FigureCache:
+    """Thread-safe LRU cache of figure dicts, bounded by entries and total bytes."""
+
+    def __init__(self, max_bytes=FIGURE_CACHE_MAX_BYTES, max_entries=FIGURE_CACHE_MAX_ENTRIES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Return the stored figure dict for key, or None. The dict is shared and must not be modified."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.metrics['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.metrics['hits'] += 1
+            return entry[0]
+
+    def put(self, key, figure_dict):
+        size = figure_size(figure_dict)
+        # A figure larger than the whole cache would only evict everything else
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = (figure_dict, size)
+            self.size += size
+            while self.size > self.max_bytes or len(self.entries) > self.max_entries:
+                _key, (_evicted, evicted_size) = self.entries.popitem(last=False)
+                self.size -= evicted_size
+                self.metrics['evictions'] += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_metrics(self):
+        with self.lock:
+            return {**self.metrics, 'entries': len(self.entries), 'bytes': self.size}
+
+figure_cache = FigureCache()
+
+def fingerprint(data, columns=None):
+    """
+    Cheap content hash of a DataFrame (only `columns` and updated_at, if present) or of
+    any JSON-serialisable value such as a project dict.
+    """
+    digest = hashlib.sha256()
+    if isinstance(data, pd.DataFrame):
+        selected = [column for column in (columns or data.columns) if column in data.columns]
+        if 'updated_at' in data.columns and 'updated_at' not in selected:
+            selected.append('updated_at')
+        digest.update(json.dumps(selected).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(data[selected], index=False).to_numpy().tobytes())
+    else:
+        if columns and isinstance(data, dict):
+            data = {key: data.get(key) for key in [*columns, 'updated_at']}
+        digest.update(json.dumps(data, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def _to_dict(figure):
+    return copy.deepcopy(figure.to_plotly_json())
+
+def _to_figure(figure_dict):
+    return go.Figure(copy.deepcopy(figure_dict))
+
+def cached_figure(columns=None, cache=None):
+    """
+    Decorator for figure builders whose figure depends only on their arguments. The first
+    argument is fingerprinted (see fingerprint()); builders returning None are not cached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(data, *args, **kwargs):
+            target = cache or figure_cache
+            key = (func.__module__, func.__qualname__, fingerprint(data, columns),
+                   json.dumps([args, kwargs], sort_keys=True, default=str))
+            figure_dict = target.get(key)
+            if figure_dict is not None:
+                return _to_figure(figure_dict)
+            figure = func(data, *args, **kwargs)
+            if figure is not None:
+                target.put(key, _to_dict(figure))
+            return figure
+        return wrapper
+    return decorator
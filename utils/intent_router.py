@@ -0,0 +1,170 @@
+"""
+Local intent classifier for routing chat queries to their handlers.
+
+Queries are embedded as IDF-weighted hashed bag-of-features vectors (words, word
+bigrams and character trigrams) and compared with one precomputed centroid per
+intent. The centroids are built once per process from the labeled examples below, so routing
+a query is a handful of dictionary lookups and one small matrix-vector product.
+"""
+import re
+import threading
+import zlib
+import numpy as np
+
+FEATURE_DIMENSIONS = 2 ** 12
+# Scales cosine similarities before the softmax; higher values give sharper confidences
+SOFTMAX_SCALE = 12.0
+# Queries routed with lower confidence than this go to the general LLM handler
+MIN_CONFIDENCE = 0.45
+GENERAL_INTENT = 'general'
+
+INTENT_EXAMPLES = {
+    'project_status': [
+        "what is the status of project alpha",
+        "project status",
+        "how is project beta doing",
+        "show me the current status of the projects",
+        "is project gamma on track",
+        "give me a status update on project delta",
+        "what state is the epsilon project in",
+        "current project health",
+        "how are my projects progressing",
+        "status of PRJ001",
+        "how are things going with the alpha project",
+        "what is happening on our projects",
+    ],
+    'risk_report': [
+        "generate a risk report",
+        "give me a summary of all risks",
+        "risk summary across the portfolio",
+        "show the risk report",
+        "summarize project risks",
+        "overview of risk scores for all projects",
+        "portfolio risk overview",
+        "list all projects with their risk scores",
+        "report on current risks",
+        "which projects are high risk",
+        "rank the projects by risk level",
+        "what are the risk levels of each project",
+    ],
+    'mitigation': [
+        "how can we mitigate supply chain delays",
+        "mitigation strategies for budget overruns",
+        "what should we do about resource availability",
+        "how to reduce technical complexity risk",
+        "strategies to handle regulatory approval delays",
+        "recommend actions to lower schedule risk",
+        "how do we address market competition",
+        "suggest ways to prevent cost escalation",
+        "what is the mitigation plan for service disruption",
+        "how can we fix stakeholder alignment issues",
+        "what can be done to reduce this risk",
+        "how do we deal with delays from vendors",
+    ],
+    'risk_trend': [
+        "is risk increasing",
+        "show risk trends",
+        "which projects have decreasing risk",
+        "how has risk changed over time",
+        "risk trend analysis",
+        "are risk scores going up or down",
+        "which projects got worse this month",
+        "has project gamma risk improved",
+        "risk history over the last few months",
+        "which risks are rising",
+        "what is the trend for project delta",
+        "is the portfolio getting riskier",
+    ],
+    GENERAL_INTENT: [
+        "what is risk management",
+        "explain the difference between impact and likelihood",
+        "what does a risk score of 7 mean",
+        "hello",
+        "what can you do",
+        "how is the overall risk score calculated",
+        "what are common risks in software projects",
+        "tell me about market conditions",
+        "what is a risk matrix",
+        "who should own project risks",
+    ],
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+def _features(text):
+    """Yield the string features of a query: words, word bigrams and character trigrams."""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    for word in words:
+        yield "w:" + word
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            yield "c:" + padded[i:i + 3]
+    for first, second in zip(words, words[1:]):
+        yield f"b:{first} {second}"
+
+def _hashed_counts(text):
+    """Count the query's features in a fixed-size hashed vector."""
+    vector = np.zeros(FEATURE_DIMENSIONS, dtype=np.float32)
+    for feature in _features(text):
+        vector[zlib.crc32(feature.encode("utf-8")) % FEATURE_DIMENSIONS] += 1.0
+    return vector
+
+def _normalise(vector):
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+class IntentRouter:
+    """Nearest-centroid intent classifier over hashed query features."""
+
+    def __init__(self, examples=INTENT_EXAMPLES):
+        self.intents = list(examples)
+        counts = {intent: [_hashed_counts(example) for example in examples[intent]] for intent in self.intents}
+
+        # Inverse document frequency over all examples, so words shared by every
+        # intent ("risk", "project", "what") carry less weight than distinctive ones
+        all_counts = np.stack([vector for vectors in counts.values() for vector in vectors])
+        document_frequency = (all_counts > 0).sum(axis=0)
+        self.idf = (np.log((len(all_counts) + 1) / (document_frequency + 1)) + 1).astype(np.float32)
+
+        centroids = np.stack([
+            np.mean([self.embed_counts(vector) for vector in counts[intent]], axis=0)
+            for intent in self.intents
+        ])
+        self.centroids = centroids / np.linalg.norm(centroids, axis=1, keepdims=True)
+
+    def embed_counts(self, counts):
+        return _normalise(counts * self.idf)
+
+    def embed(self, query):
+        """Embed a query as an L2-normalised, IDF-weighted hashed feature vector."""
+        return self.embed_counts(_hashed_counts(query))
+
+    def classify(self, query):
+        """Return (intent, confidence) for a query, with confidence in [0, 1]."""
+        similarities = self.centroids @ self.embed(query)
+        scores = np.exp(SOFTMAX_SCALE * (similarities - similarities.max()))
+        probabilities = scores / scores.sum()
+        best = int(np.argmax(probabilities))
+        return self.intents[best], float(probabilities[best])
+
+    def route(self, query, min_confidence=MIN_CONFIDENCE):
+        """Classify a query, falling back to the general intent when confidence is low."""
+        intent, confidence = self.classify(query)
+        if confidence < min_confidence:
+            return GENERAL_INTENT, confidence
+        return intent, confidence
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """Get the process-wide router, building the intent centroids on first use."""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = IntentRouter()
+    return _router
+
+def route_query(query, min_confidence=MIN_CONFIDENCE):
+    """Route a query to an intent, returning (intent, confidence)."""
+    return get_router().route(query, min_confidence)
@@ -0,0 +1,297 @@
+"""
+Database-backed job queue for long-running crew assessments.
+
+Jobs are rows in the `jobs` table, so the queue works against both SQLite and
+Postgres and survives Streamlit reruns and page navigation. Worker processes
+claim queued jobs, report progress and honour cancellation requests between
+crew tasks.
+
+Run workers with:
+    python -m utils.job_queue --workers 2
+"""
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from utils.pg_database import Session, Job, engine, initialize_database
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+
+# Seconds between heartbeats a worker sends while a job runs, independent of its progress reports
+HEARTBEAT_INTERVAL = 30
+# Running jobs without a heartbeat for this long are assumed to belong to a dead worker
+STALE_JOB_TIMEOUT = timedelta(minutes=5)
+
+JOB_HANDLERS = {}
+
+class JobCancelled(Exception):
+    """Raised inside a job when cancellation has been requested."""
+
+def register_job(kind):
+    """Register a handler for a job kind. Handlers are called as handler(payload, progress)."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+@register_job('risk_assessment')
+def _run_risk_assessment(payload, progress):
+    from agents.crew_setup import RiskManagementCrew
+    result = RiskManagementCrew().run_risk_assessment(payload.get('project_id'), progress_callback=progress)
+    return {'output': str(result)}
+
+@register_job('risk_report')
+def _run_risk_report(payload, progress):
+    from agents.crew_setup import RiskManagementCrew
+    report = RiskManagementCrew().get_risk_report(
+        payload['project_id'],
+        force_refresh=payload.get('force_refresh', False),
+        progress_callback=progress
+    )
+    return {'output': report}
+
+@register_job('report_render')
+def _run_report_render(payload, progress):
+    from utils.report_renderer import render_reports
+    # Job workers are daemon processes, which cannot start a process pool of their own
+    reports = render_reports(
+        payload.get('project_ids'),
+        pdf=payload.get('pdf', True),
+        workers=1,
+        progress=progress
+    )
+    return {'output': f"Rendered {len(reports)} report(s)", 'reports': reports}
+
+def enqueue_job(kind, payload=None):
+    """Add a job to the queue and return its ID."""
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    session = Session()
+    job = Job(id=uuid.uuid4().hex, kind=kind, payload=payload or {}, status=QUEUED, progress=0.0)
+    session.add(job)
+    session.commit()
+    job_id = job.id
+    session.close()
+    return job_id
+
+def get_job(job_id):
+    """Get a job by ID."""
+    session = Session()
+    job = session.get(Job, job_id)
+    result = job.to_dict() if job else None
+    session.close()
+    return result
+
+def list_jobs(status=None, limit=20):
+    """List jobs, newest first, optionally filtered by status."""
+    session = Session()
+    query = session.query(Job)
+    if status:
+        query = query.filter(Job.status == status)
+    jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+    result = [job.to_dict() for job in jobs]
+    session.close()
+    return result
+
+def cancel_job(job_id):
+    """
+    Cancel a job. Queued jobs are cancelled immediately; running jobs are
+    flagged and stop at their next progress report.
+    """
+    session = Session()
+    cancelled = session.query(Job).filter(Job.id == job_id, Job.status == QUEUED).update(
+        {'status': CANCELLED, 'finished_at': datetime.now(), 'message': 'Cancelled before start'},
+        synchronize_session=False
+    )
+    if not cancelled:
+        session.query(Job).filter(Job.id == job_id, Job.status == RUNNING).update(
+            {'cancel_requested': True}, synchronize_session=False
+        )
+    session.commit()
+    session.close()
+
+def claim_next_job(worker_id):
+    """
+    Atomically claim the oldest queued job for this worker.
+    The conditional update only succeeds for one worker, so concurrent workers never run the same job.
+    """
+    session = Session()
+    try:
+        candidates = session.query(Job.id).filter(Job.status == QUEUED).order_by(Job.created_at).limit(5).all()
+        for (job_id,) in candidates:
+            now = datetime.now()
+            claimed = session.query(Job).filter(Job.id == job_id, Job.status == QUEUED).update(
+                {'status': RUNNING, 'worker_id': worker_id, 'started_at': now, 'heartbeat_at': now},
+                synchronize_session=False
+            )
+            session.commit()
+            if claimed:
+                return session.get(Job, job_id).to_dict()
+        return None
+    finally:
+        session.close()
+
+def _owned_by(job_id, worker_id):
+    """Filter for a job that is still running under the given worker."""
+    return (Job.id == job_id, Job.status == RUNNING, Job.worker_id == worker_id)
+
+def report_progress(job_id, worker_id, progress, message=None):
+    """
+    Record job progress and raise JobCancelled if cancellation was requested, or if the job
+    no longer runs under this worker (it was requeued as stale and possibly claimed again).
+    """
+    session = Session()
+    owned = session.query(Job).filter(*_owned_by(job_id, worker_id)).update(
+        {'progress': progress, 'message': message, 'heartbeat_at': datetime.now()},
+        synchronize_session=False
+    )
+    session.commit()
+    cancel_requested = session.query(Job.cancel_requested).filter(Job.id == job_id).scalar()
+    session.close()
+    if not owned or cancel_requested:
+        raise JobCancelled()
+
+def send_heartbeat(job_id, worker_id):
+    """Mark a running job as alive. Returns False if the job no longer runs under this worker."""
+    session = Session()
+    owned = session.query(Job).filter(*_owned_by(job_id, worker_id)).update(
+        {'heartbeat_at': datetime.now()}, synchronize_session=False
+    )
+    session.commit()
+    session.close()
+    return bool(owned)
+
+def _finish_job(job_id, worker_id, status, result=None, error=None, message=None):
+    """Record a job's outcome, unless the job has since been taken over by another worker."""
+    session = Session()
+    values = {'status': status, 'result': result, 'error': error, 'finished_at': datetime.now()}
+    if status == SUCCEEDED:
+        values['progress'] = 1.0
+    if message:
+        values['message'] = message
+    finished = session.query(Job).filter(*_owned_by(job_id, worker_id)).update(values, synchronize_session=False)
+    session.commit()
+    session.close()
+    return bool(finished)
+
+def requeue_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    """Put running jobs whose worker stopped sending heartbeats back on the queue."""
+    session = Session()
+    requeued = session.query(Job).filter(
+        Job.status == RUNNING,
+        Job.heartbeat_at < datetime.now() - timeout
+    ).update({'status': QUEUED, 'worker_id': None, 'progress': 0.0}, synchronize_session=False)
+    session.commit()
+    session.close()
+    return requeued
+
+class _Heartbeat:
+    """Background thread that keeps a running job's heartbeat fresh, however long a single step takes."""
+
+    def __init__(self, job_id, worker_id, interval=HEARTBEAT_INTERVAL):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name=f"heartbeat-{job_id}", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not send_heartbeat(self.job_id, self.worker_id):
+                    return
+            except Exception:
+                traceback.print_exc()
+
+def run_job(job, heartbeat_interval=HEARTBEAT_INTERVAL):
+    """Execute a claimed job and record its outcome."""
+    job_id, worker_id = job['id'], job['worker_id']
+    handler = JOB_HANDLERS.get(job['kind'])
+    if handler is None:
+        _finish_job(job_id, worker_id, FAILED, error=f"Unknown job kind: {job['kind']}")
+        return
+
+    def progress(fraction, message=None):
+        report_progress(job_id, worker_id, fraction, message)
+
+    with _Heartbeat(job_id, worker_id, heartbeat_interval):
+        try:
+            progress(0.0, "Started")
+            result = handler(job['payload'] or {}, progress)
+            _finish_job(job_id, worker_id, SUCCEEDED, result=result, message="Completed")
+        except JobCancelled:
+            _finish_job(job_id, worker_id, CANCELLED, message="Cancelled")
+        except Exception as e:
+            _finish_job(job_id, worker_id, FAILED, error=f"{e}\n{traceback.format_exc()}")
+
+def new_worker_id(name=None):
+    """A worker ID unique across hosts, containers (where PIDs repeat) and restarts."""
+    return f"{socket.gethostname()}:{name or os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+def run_worker(worker_id=None, poll_interval=1.0, max_jobs=None, stop_event=None):
+    """Claim and run jobs until stopped, sleeping `poll_interval` seconds when the queue is empty."""
+    worker_id = worker_id or new_worker_id()
+    # Don't reuse pooled connections inherited from a parent process
+    engine.dispose(close=False)
+    initialize_database()
+    requeue_stale_jobs()
+
+    processed = 0
+    while not (stop_event and stop_event.is_set()):
+        if max_jobs is not None and processed >= max_jobs:
+            break
+        job = claim_next_job(worker_id)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
+
+def start_workers(count, poll_interval=1.0):
+    """Start `count` worker processes and return them."""
+    workers = []
+    for i in range(count):
+        process = multiprocessing.Process(
+            target=run_worker,
+            kwargs={'worker_id': new_worker_id(f"worker-{i}"), 'poll_interval': poll_interval},
+            daemon=True
+        )
+        process.start()
+        workers.append(process)
+    return workers
+
+def main():
+    parser = argparse.ArgumentParser(description="Run risk assessment job queue workers")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    args = parser.parse_args()
+
+    if args.workers == 1:
+        run_worker(poll_interval=args.poll_interval)
+        return
+    workers = start_workers(args.workers, args.poll_interval)
+    for process in workers:
+        process.join()
+
+if __name__ == "__main__":
+    main()
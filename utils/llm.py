@@ -0,0 +1,478 @@
+"""
+Pluggable LLM backends shared by the agents and the chat interface.
+
+The backend is chosen with the LLM_BACKEND environment variable:
+
+- huggingface_hub: remote inference through the Hugging Face Hub (default)
+- local: the same seq2seq model run on the local CPU with transformers. The
+  model is loaded once per process and prompts arriving concurrently from
+  different sessions or crew tasks are batched into a single generate() call.
+- stub: deterministic canned responses, for tests and benchmarks
+
+Every backend is a LangChain LLM, so it can be passed to crewai agents directly.
+get_llm() wraps the backend in a CoalescingLLM, so identical prompts issued
+concurrently by several sessions share a single upstream call. Remote backends are
+also wrapped in a ResilientLLM, which keeps the request rate and concurrency within
+the upstream quota, retries transient failures and stops calling a failing backend.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
+from typing import Any, List, Optional
+from langchain_core.language_models.llms import LLM
+from langchain_core.outputs import Generation, LLMResult
+from utils.tracing import span
+
+MODEL_ID = "google/flan-t5-base"
+MODEL_KWARGS = {"temperature": 0.5, "max_length": 512}
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "huggingface_hub")
+# Largest number of prompts the local backend runs in one forward pass
+LOCAL_MAX_BATCH_SIZE = int(os.environ.get("LOCAL_LLM_MAX_BATCH_SIZE", "16"))
+# How long the local backend waits for more prompts to join a batch
+LOCAL_MAX_WAIT_SECONDS = float(os.environ.get("LOCAL_LLM_MAX_WAIT_MS", "10")) / 1000
+# How long a coalesced call waits for the in-flight call it joined
+COALESCE_TIMEOUT_SECONDS = float(os.environ.get("LLM_COALESCE_TIMEOUT_SECONDS", "120"))
+# Upstream quota for remote backends: sustained requests per minute and burst size
+RATE_LIMIT_PER_MINUTE = float(os.environ.get("LLM_RATE_LIMIT_PER_MINUTE", "60"))
+RATE_LIMIT_BURST = int(os.environ.get("LLM_RATE_LIMIT_BURST", "5"))
+MAX_CONCURRENT_CALLS = int(os.environ.get("LLM_MAX_CONCURRENT_CALLS", "4"))
+MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+# Consecutive failed calls that open the circuit, and how long it stays open
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30.0
+
+_BACKENDS = {}
+_REMOTE_BACKENDS = set()
+_instances = {}
+_instances_lock = threading.Lock()
+
+class LLMUnavailableError(Exception):
+    """Raised when the LLM backend cannot be reached; retry_after is a hint in seconds."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def register_backend(name, remote=False):
+    """
+    Register a factory function that creates the LLM for a backend name.
+    Remote backends are rate limited, retried and guarded by a circuit breaker.
+    """
+    def decorator(factory):
+        _BACKENDS[name] = factory
+        if remote:
+            _REMOTE_BACKENDS.add(name)
+        return factory
+    return decorator
+
+def get_llm(backend=None):
+    """Get the process-wide LLM for a backend (LLM_BACKEND by default), creating it on first use."""
+    backend = backend or LLM_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {backend}. Available backends: {', '.join(sorted(_BACKENDS))}")
+    with _instances_lock:
+        if backend not in _instances:
+            llm = _BACKENDS[backend]()
+            if backend in _REMOTE_BACKENDS:
+                llm = ResilientLLM(llm=llm)
+            _instances[backend] = CoalescingLLM(llm=llm)
+        return _instances[backend]
+
+def get_llm_metrics():
+    """Coalescing and resilience metrics of each LLM created in this process, by backend."""
+    with _instances_lock:
+        instances = dict(_instances)
+    metrics = {}
+    for backend, llm in instances.items():
+        metrics[backend] = {}
+        # Walk the wrapper chain down to the backend
+        while llm is not None:
+            if hasattr(llm, "get_metrics"):
+                metrics[backend].update(llm.get_metrics())
+            llm = getattr(llm, "llm", None)
+    return metrics
+
+def get_llm_config(backend=None):
+    """Describe the model configuration; changes to it invalidate stored reports."""
+    return {"backend": backend or LLM_BACKEND, "repo_id": MODEL_ID, "model_kwargs": MODEL_KWARGS}
+
+class StubLLM(LLM):
+    """Deterministic LLM that answers from a hash of the prompt without any model."""
+    latency_seconds: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+        return f"Stub response {digest} for a {len(prompt)}-character prompt."
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, blocking until one is available. Returns the seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing backend. After failure_threshold consecutive failures the
+    circuit opens and calls are rejected for reset_seconds; then a single trial call is
+    let through, which closes the circuit on success or reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold, reset_seconds):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        return "open" if time.monotonic() - self.opened_at < self.reset_seconds else "half_open"
+
+    def before_call(self):
+        """Raise LLMUnavailableError if the call is not allowed."""
+        with self.lock:
+            state = self.state
+            if state == "closed":
+                return
+            if state == "half_open" and not self.trial_in_progress:
+                self.trial_in_progress = True
+                return
+            retry_after = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        raise LLMUnavailableError("The LLM backend is failing; calls are paused", retry_after=retry_after)
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+
+    def release_trial(self):
+        """End a call that says nothing about the backend's health; a half-open circuit lets another trial through."""
+        with self.lock:
+            self.trial_in_progress = False
+
+def _retry_after(error):
+    """Seconds the upstream asked us to wait (Retry-After header), if any."""
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+def is_retryable(error):
+    """Connection problems, timeouts, rate limiting (429) and server errors (5xx) are worth retrying."""
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (OSError, TimeoutError))
+
+class ResilientLLM(LLM):
+    """
+    Wraps a remote LLM so it stays within the upstream quota: calls take a token from a
+    shared token bucket and a slot from a bounded semaphore, transient failures are
+    retried with jittered exponential backoff, and a circuit breaker fails calls fast
+    with LLMUnavailableError while the backend keeps failing.
+    """
+    llm: Any
+    rate_per_minute: float = RATE_LIMIT_PER_MINUTE
+    burst: int = RATE_LIMIT_BURST
+    max_concurrent_calls: int = MAX_CONCURRENT_CALLS
+    max_retries: int = MAX_RETRIES
+    bucket: Any = None
+    semaphore: Any = None
+    breaker: Any = None
+    metrics: dict = {}
+    metrics_lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.bucket = TokenBucket(self.rate_per_minute / 60, self.burst)
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrent_calls)
+        self.breaker = CircuitBreaker(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+        self.metrics_lock = threading.Lock()
+        self.metrics = {"attempts": 0, "retries": 0, "failures": 0, "rejected": 0, "throttled_seconds": 0.0}
+
+    @property
+    def _llm_type(self):
+        return f"resilient_{self.llm._llm_type}"
+
+    def _count(self, metric, amount=1):
+        with self.metrics_lock:
+            self.metrics[metric] += amount
+
+    def get_metrics(self):
+        """Counts of upstream attempts, retries, failed calls, calls rejected by the open circuit and time spent throttled."""
+        with self.metrics_lock:
+            return {**self.metrics, "circuit": self.breaker.state}
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.before_call()
+            except LLMUnavailableError:
+                self._count("rejected")
+                raise
+            self._count("throttled_seconds", self.bucket.acquire())
+            self._count("attempts")
+            try:
+                with self.semaphore, span("llm.upstream", **{"llm.attempt": attempt + 1}):
+                    result = self.llm.invoke(prompt, stop=stop, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The request itself was bad, which is no evidence either way about the backend
+                    self.breaker.release_trial()
+                    self._count("failures")
+                    raise
+                self.breaker.record_failure()
+                if attempt == self.max_retries:
+                    self._count("failures")
+                    raise LLMUnavailableError(f"The LLM backend failed after {attempt + 1} attempts: {e}") from e
+                # Full jitter keeps retries from many sessions from arriving in lockstep
+                delay = random.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** attempt))
+                time.sleep(max(delay, _retry_after(e) or 0))
+                self._count("retries")
+            else:
+                self.breaker.record_success()
+                return result
+
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+def coalesce_key(prompt, stop=None, **kwargs):
+    """Key identifying calls that must produce the same result: the whitespace-normalised prompt and call options."""
+    normalized = _WHITESPACE_PATTERN.sub(" ", prompt).strip()
+    options = json.dumps({"stop": stop, **kwargs}, sort_keys=True, default=str)
+    return hashlib.sha256(f"{normalized}\0{options}".encode("utf-8")).hexdigest()
+
+class CoalescingLLM(LLM):
+    """
+    Single-flight wrapper: concurrent calls with the same prompt and options share one
+    upstream call. The first caller runs it and the others wait for its result, up to
+    timeout seconds; a waiter that times out raises TimeoutError while the call it
+    joined carries on for the remaining callers. Errors are passed to every waiter.
+    """
+    llm: Any
+    timeout: float = COALESCE_TIMEOUT_SECONDS
+    in_flight: dict = {}
+    lock: Any = None
+    metrics: dict = {}
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.in_flight = {}
+        self.lock = threading.Lock()
+        self.metrics = {"calls": 0, "upstream_calls": 0, "coalesced": 0, "timeouts": 0, "errors": 0}
+
+    @property
+    def _llm_type(self):
+        return f"coalescing_{self.llm._llm_type}"
+
+    def _count(self, metric):
+        with self.lock:
+            self.metrics[metric] += 1
+
+    def get_metrics(self):
+        """Counts of calls, upstream calls made, calls coalesced into another, waiter timeouts and upstream errors."""
+        with self.lock:
+            return {**self.metrics, "in_flight": len(self.in_flight)}
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        with span("llm.invoke", **{"llm.backend": self.llm._llm_type, "llm.prompt_chars": len(prompt)}) as current:
+            result = self._single_flight(prompt, stop, current, **kwargs)
+            current.set_attribute("llm.response_chars", len(result))
+            return result
+
+    def _single_flight(self, prompt, stop, current, **kwargs):
+        key = coalesce_key(prompt, stop, **kwargs)
+        with self.lock:
+            self.metrics["calls"] += 1
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self.in_flight[key] = future
+                self.metrics["upstream_calls"] += 1
+            else:
+                self.metrics["coalesced"] += 1
+
+        current.set_attribute("llm.coalesced", not leader)
+        if not leader:
+            try:
+                return future.result(timeout=self.timeout)
+            except FuturesTimeoutError:
+                self._count("timeouts")
+                raise TimeoutError(f"Timed out after {self.timeout:g}s waiting for an identical LLM call")
+
+        try:
+            result = self.llm.invoke(prompt, stop=stop, **kwargs)
+        except Exception as e:
+            self._count("errors")
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Later calls start a fresh request instead of reusing this result
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+class _PromptBatcher:
+    """Collects prompts from many threads and runs them through the model in batches."""
+
+    def __init__(self, generate_batch, max_batch_size, max_wait_seconds):
+        self.generate_batch = generate_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.pending = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, prompt):
+        future = Future()
+        self.pending.put((prompt, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            prompts = [prompt for prompt, _future in batch]
+            try:
+                outputs = self.generate_batch(prompts)
+            except Exception as e:
+                for _prompt, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_prompt, future), output in zip(batch, outputs):
+                future.set_result(output)
+
+def enforce_stop_sequences(text, stop=None):
+    """Cut text off at the first occurrence of any stop sequence, as API backends do."""
+    if not stop:
+        return text
+    return re.split("|".join(re.escape(sequence) for sequence in stop), text, maxsplit=1)[0]
+
+_local_models = {}
+_local_models_lock = threading.Lock()
+
+def _load_local_model(model_id):
+    """Load a seq2seq model and tokenizer once per process."""
+    with _local_models_lock:
+        if model_id not in _local_models:
+            from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(model_id)
+            model = AutoModelForSeq2SeqLM.from_pretrained(model_id)
+            model.eval()
+            _local_models[model_id] = (tokenizer, model)
+        return _local_models[model_id]
+
+class LocalSeq2SeqLLM(LLM):
+    """Runs a seq2seq model on the local CPU, batching concurrent prompts into one forward pass."""
+    model_id: str = MODEL_ID
+    temperature: float = MODEL_KWARGS["temperature"]
+    max_length: int = MODEL_KWARGS["max_length"]
+    max_batch_size: int = LOCAL_MAX_BATCH_SIZE
+    max_wait_seconds: float = LOCAL_MAX_WAIT_SECONDS
+    batcher: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batcher = _PromptBatcher(self._generate_batch, self.max_batch_size, self.max_wait_seconds)
+
+    @property
+    def _llm_type(self):
+        return "local_seq2seq"
+
+    @property
+    def _identifying_params(self):
+        return {"model_id": self.model_id, "temperature": self.temperature, "max_length": self.max_length}
+
+    def _generate_batch(self, prompts):
+        import torch
+        tokenizer, model = _load_local_model(self.model_id)
+        inputs = tokenizer(prompts, return_tensors="pt", padding=True, truncation=True, max_length=self.max_length)
+        with torch.inference_mode():
+            output_ids = model.generate(
+                **inputs,
+                max_length=self.max_length,
+                do_sample=self.temperature > 0,
+                temperature=self.temperature if self.temperature > 0 else None
+            )
+        return tokenizer.batch_decode(output_ids, skip_special_tokens=True)
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        # generate() has no stop sequences, so the output is truncated afterwards
+        return enforce_stop_sequences(self.batcher.submit(prompt).result(), stop)
+
+    def _generate(self, prompts: List[str], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        # Submit every prompt before waiting so they can share a batch
+        futures = [self.batcher.submit(prompt) for prompt in prompts]
+        return LLMResult(generations=[
+            [Generation(text=enforce_stop_sequences(future.result(), stop))] for future in futures
+        ])
+
+@register_backend("huggingface_hub", remote=True)
+def _huggingface_hub_backend():
+    from langchain_community.llms import HuggingFaceHub
+    return HuggingFaceHub(repo_id=MODEL_ID, model_kwargs=MODEL_KWARGS)
+
+@register_backend("local")
+def _local_backend():
+    return LocalSeq2SeqLLM()
+
+@register_backend("stub")
+def _stub_backend():
+    return StubLLM(latency_seconds=float(os.environ.get("STUB_LLM_LATENCY_MS", "0")) / 1000)
@@ -1,34 +1,65 @@
 import os
 import json
-from datetime import datetime
-from sqlalchemy import Column, Float, String, Integer, ForeignKey, JSON, DateTime, create_engine
+import hashlib
+import heapq
+import numpy as np
+from datetime import datetime, timedelta
+from itertools import groupby
+from sqlalchemy import BigInteger, Boolean, Column, Float, String, Integer, ForeignKey, JSON, DateTime, Index, LargeBinary, case, create_engine, event, func, inspect, or_, select, text
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import relationship, sessionmaker
+from utils.records import ProjectRecord, RiskFactorRecord, RiskHistoryRecord
+from utils.tracing import traced
 # Database setup
 DATABASE_URL = os.environ.get("DATABASE_URL")
 engine = create_engine(DATABASE_URL)
 Base = declarative_base()
 Session = sessionmaker(bind=engine)
+_schema_ready = False
+# Number of rows fetched per round trip by the streaming iterators
+STREAM_BATCH_SIZE = 1000
+# Number of most recent risk history entries that feed into a report fingerprint
+REPORT_HISTORY_TAIL = 5
+# Lightweight project columns used by portfolio-wide summaries
+SUMMARY_COLUMNS = ['id', 'name', 'status', 'risk_score', 'risk_delta']
+# Columns of the paginated project table, and the (indexed) columns it can be sorted by
+TABLE_COLUMNS = ['id', 'name', 'status', 'risk_score', 'schedule_risk', 'budget_risk', 'resource_risk', 'market_risk', 'start_date', 'end_date']
+SORTABLE_COLUMNS = ('risk_score', 'name', 'status')
+PROJECT_PAGE_SIZE = 25
+# Risk score ranges [low, high) of the risk bands used for filtering and facets
+RISK_BANDS = {'high': (7, None), 'medium': (4, 7), 'low': (None, 4)}
+RISK_CATEGORIES = ['schedule_risk', 'budget_risk', 'resource_risk', 'market_risk', 'technical_risk']
+# Project columns returned by the faceted query; enough for the dashboard charts
+FACET_COLUMNS = ['id', 'name', 'status', 'risk_score', 'risk_delta', 'budget', 'start_date', 'end_date'] + RISK_CATEGORIES
+# Settings used until the user saves their own on the Settings page
+DEFAULT_SETTINGS = {
+    'risk_threshold': 7,
+    'email_notifications': True,
+    'notification_email': '',
+    'market_data_source': 'Alpha Vantage',
+    'update_frequency': 'Daily'
+}
 class Project(Base):
     """Project table for storing project information."""
     __tablename__ = 'projects'
     
     id = Column(String, primary_key=True)
-    name = Column(String, nullable=False)
+    name = Column(String, nullable=False, index=True)
     description = Column(String)
-    status = Column(String)
-    start_date = Column(String)
-    end_date = Column(String)
-    budget = Column(Float)
+    status = Column(String, index=True)
+    start_date = Column(String, index=True)
+    end_date = Column(String, index=True)
+    budget = Column(Float, index=True)
     spent = Column(Float)
     team_size = Column(Integer)
-    risk_score = Column(Float)
+    risk_score = Column(Float, index=True)
     risk_delta = Column(Float)
-    schedule_risk = Column(Float)
-    budget_risk = Column(Float)
-    resource_risk = Column(Float)
-    market_risk = Column(Float)
-    technical_risk = Column(Float)
+    schedule_risk = Column(Float, index=True)
+    budget_risk = Column(Float, index=True)
+    resource_risk = Column(Float, index=True)
+    market_risk = Column(Float, index=True)
+    technical_risk = Column(Float, index=True)
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     
@@ -64,7 +95,7 @@ class RiskFactor(Base):
     __tablename__ = 'risk_factors'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    project_id = Column(String, ForeignKey('projects.id'), nullable=False)
+    project_id = Column(String, ForeignKey('projects.id'), nullable=False, index=True)
     name = Column(String, nullable=False)
     description = Column(String)
     category = Column(String)
@@ -91,7 +122,7 @@ class RiskHistory(Base):
     __tablename__ = 'risk_history'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    project_id = Column(String, ForeignKey('projects.id'), nullable=False)
+    project_id = Column(String, ForeignKey('projects.id'), nullable=False, index=True)
     date = Column(String, nullable=False)
     risk_score = Column(Float, nullable=False)
     
@@ -108,12 +139,17 @@ class RiskHistory(Base):
 class RiskReport(Base):
     """Risk reports generated by the system."""
     __tablename__ = 'risk_reports'
+    __table_args__ = (
+        Index('ix_risk_reports_project_created', 'project_id', 'created_at'),
+    )
     
     id = Column(String, primary_key=True)
     project_id = Column(String, ForeignKey('projects.id'), nullable=False)
     date = Column(String, nullable=False)
     risk_score = Column(Float)
     content = Column(JSON)  # Store the full report content as JSON
+    fingerprint = Column(String, index=True)  # Hash of the inputs the report was generated from
+    created_at = Column(DateTime, default=datetime.now)
     
     def to_dict(self):
         """Convert the risk report to a dictionary."""
@@ -122,12 +158,160 @@ class RiskReport(Base):
             'project_id': self.project_id,
             'date': self.date,
             'risk_score': self.risk_score,
-            'content': self.content
+            'content': self.content,
+            'fingerprint': self.fingerprint,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+class Job(Base):
+    """Background jobs processed by the job queue workers."""
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        Index('ix_jobs_status_created', 'status', 'created_at'),
+    )
+    
+    id = Column(String, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(JSON)
+    status = Column(String, nullable=False, default='queued')  # queued, running, succeeded, failed, cancelled
+    progress = Column(Float, default=0.0)
+    message = Column(String)
+    result = Column(JSON)
+    error = Column(String)
+    cancel_requested = Column(Boolean, default=False)
+    worker_id = Column(String)
+    created_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    heartbeat_at = Column(DateTime)
+    
+    def to_dict(self):
+        """Convert the job to a dictionary."""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payload': self.payload,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error': self.error,
+            'cancel_requested': self.cancel_requested,
+            'worker_id': self.worker_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
         }
+class AppSetting(Base):
+    """Persisted application settings, one row per setting."""
+    __tablename__ = 'app_settings'
+    
+    key = Column(String, primary_key=True)
+    value = Column(JSON)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+class ProjectScoreState(Base):
+    """Fingerprint of the risk factors each project was last scored from."""
+    __tablename__ = 'project_score_state'
+    
+    project_id = Column(String, ForeignKey('projects.id'), primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    scored_at = Column(DateTime, default=datetime.now)
+class Lease(Base):
+    """Named, expiring locks shared by every process using the database."""
+    __tablename__ = 'leases'
+    
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+class AlertEvent(Base):
+    """Alerts that have been sent, used to deduplicate and rate-limit notifications."""
+    __tablename__ = 'alert_events'
+    __table_args__ = (
+        Index('ix_alert_events_project_rule_fired', 'project_id', 'rule', 'fired_at'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    project_id = Column(String, ForeignKey('projects.id'), nullable=False)
+    rule = Column(String, nullable=False)
+    value = Column(Float)
+    threshold = Column(Float)
+    fired_at = Column(DateTime, default=datetime.now, index=True)
+class DocumentFile(Base):
+    """Source documents that have been ingested for retrieval."""
+    __tablename__ = 'document_files'
+    
+    path = Column(String, primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    modified_at = Column(Float, nullable=False)  # File modification time as a POSIX timestamp
+    ingested_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+class DocumentChunk(Base):
+    """Text chunks of ingested documents, each starting with the last words of the previous one, with their embeddings."""
+    __tablename__ = 'document_chunks'
+    __table_args__ = (
+        Index('ix_document_chunks_path_hash', 'source_path', 'content_hash'),
+    )
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    source_path = Column(String, ForeignKey('document_files.path'), nullable=False)
+    content_hash = Column(String, nullable=False)
+    text = Column(String, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float16 vector
+class DataVersion(Base):
+    """Counters incremented in the same transaction as every write to the data they cover."""
+    __tablename__ = 'data_versions'
+    
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+# The counter covering the project, risk factor and risk history tables
+PORTFOLIO_VERSION = 'portfolio'
+VERSIONED_TABLES = (Project.__table__, RiskFactor.__table__, RiskHistory.__table__)
+@event.listens_for(DataVersion.__table__, 'after_create')
+def _create_data_versions(table, connection, **kw):
+    connection.execute(table.insert(), [{'name': PORTFOLIO_VERSION, 'version': 0}])
+def bump_data_version(connection):
+    """Increment the portfolio data version; call with the connection of the transaction that wrote the data."""
+    table = DataVersion.__table__
+    bumped = connection.execute(
+        table.update().where(table.c.name == PORTFOLIO_VERSION).values(version=table.c.version + 1)
+    ).rowcount
+    if not bumped:
+        connection.execute(table.insert(), [{'name': PORTFOLIO_VERSION, 'version': 1}])
+@event.listens_for(Session, 'after_flush')
+def _bump_after_flush(session, flush_context):
+    # new, dirty and deleted still hold the objects that were just flushed
+    if any(
+        getattr(instance, '__table__', None) in VERSIONED_TABLES
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    ):
+        bump_data_version(session.connection())
+@event.listens_for(Session, 'do_orm_execute')
+def _bump_after_bulk_write(orm_execute_state):
+    # Bulk inserts, updates and deletes bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if getattr(orm_execute_state.statement, 'table', None) in VERSIONED_TABLES:
+            bump_data_version(orm_execute_state.session.connection())
+def _upgrade_schema():
+    """Add columns and indexes that were introduced after a table was first created."""
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(
+                        f"ALTER TABLE {preparer.quote(table.name)} ADD COLUMN {preparer.quote(column.name)} {column_type}"
+                    ))
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
 def initialize_database():
     """Initialize the database and load sample data if needed."""
-    # Create tables if they don't exist
-    Base.metadata.create_all(engine)
+    global _schema_ready
+    # Create and upgrade tables once per process
+    if not _schema_ready:
+        Base.metadata.create_all(engine)
+        _upgrade_schema()
+        _schema_ready = True
     
     # Check if data already exists
     session = Session()
@@ -427,20 +611,51 @@ def initialize_database():
         print("Database already contains data")
     
     session.close()
-def get_projects():
-    """Get all projects from the database."""
+def _group_by_project(rows, record_type):
+    """Build records from rows and group them by their project_id."""
+    grouped = {}
+    for row in rows:
+        record = record_type(*row)
+        grouped.setdefault(record.project_id, []).append(record)
+    return grouped
+@traced("db.get_project_records", rows=True)
+def get_project_records(project_id=None):
+    """
+    Get projects with their risk factors and history as records.
+    Uses one Core select per table instead of loading ORM objects and their relationships per project.
+    """
+    project_stmt = select(*Project.__table__.columns).order_by(Project.id)
+    factor_stmt = select(*RiskFactor.__table__.columns).order_by(RiskFactor.id)
+    history_stmt = select(*RiskHistory.__table__.columns).order_by(RiskHistory.id)
+    if project_id:
+        project_stmt = project_stmt.where(Project.id == project_id)
+        factor_stmt = factor_stmt.where(RiskFactor.project_id == project_id)
+        history_stmt = history_stmt.where(RiskHistory.project_id == project_id)
+    
     session = Session()
-    projects = session.query(Project).all()
-    result = [project.to_dict() for project in projects]
+    factors = _group_by_project(session.execute(factor_stmt), RiskFactorRecord)
+    history = _group_by_project(session.execute(history_stmt), RiskHistoryRecord)
+    result = [
+        ProjectRecord(
+            *row,
+            risk_factors=tuple(factors.get(row.id, ())),
+            risk_history=tuple(history.get(row.id, ()))
+        )
+        for row in session.execute(project_stmt)
+    ]
     session.close()
     return result
+@traced("db.get_risk_factor_records", rows=True)
+def get_risk_factor_records(project_id=None):
+    """Get risk factors as records, optionally filtered by project ID."""
+    return [RiskFactorRecord(*row) for row in iter_risk_factors(project_id)]
+def get_projects():
+    """Get all projects from the database."""
+    return [record.to_dict() for record in get_project_records()]
 def get_project(project_id):
     """Get a specific project by ID."""
-    session = Session()
-    project = session.query(Project).filter(Project.id == project_id).first()
-    result = project.to_dict() if project else None
-    session.close()
-    return result
+    records = get_project_records(project_id)
+    return records[0].to_dict() if records else None
 def save_risk_report(report_data):
     """Save a risk report to the database."""
     session = Session()
@@ -450,51 +665,449 @@ def save_risk_report(report_data):
         project_id=report_data['project_id'],
         date=report_data['date'],
         risk_score=report_data['risk_score'],
-        content=report_data['content']
+        content=report_data['content'],
+        fingerprint=report_data.get('fingerprint')
     )
     
     session.add(report)
     session.commit()
+    report_id = report.id
+    session.close()
+    
+    return report_id
+@traced("db.get_latest_report")
+def get_latest_report(project_id, fingerprint=None):
+    """
+    Get the most recent stored report for a project.
+    If a fingerprint is given, only a report generated from identical inputs is returned.
+    """
+    session = Session()
+    query = session.query(RiskReport).filter(RiskReport.project_id == project_id)
+    if fingerprint:
+        query = query.filter(RiskReport.fingerprint == fingerprint)
+    report = query.order_by(RiskReport.created_at.desc()).first()
+    result = report.to_dict() if report else None
+    session.close()
+    return result
+@traced("db.list_risk_reports", rows=True)
+def list_risk_reports(project_id=None, limit=20, offset=0):
+    """List stored reports, newest first, optionally filtered by project ID."""
+    session = Session()
+    query = session.query(RiskReport)
+    if project_id:
+        query = query.filter(RiskReport.project_id == project_id)
+    reports = query.order_by(RiskReport.created_at.desc()).offset(offset).limit(limit).all()
+    result = [report.to_dict() for report in reports]
+    session.close()
+    return result
+def get_report_fingerprint(project_id, model_config=None, history_tail=REPORT_HISTORY_TAIL):
+    """
+    Hash everything a report for this project is generated from: the project row,
+    its risk factors, the most recent risk history entries and the model configuration.
+    """
+    project_columns = [c for c in Project.__table__.columns if c.name not in ('created_at', 'updated_at')]
+    session = Session()
+    project = session.execute(
+        select(*project_columns).where(Project.id == project_id)
+    ).first()
+    factors = session.execute(
+        select(*RiskFactor.__table__.columns)
+        .where(RiskFactor.project_id == project_id)
+        .order_by(RiskFactor.id)
+    ).all()
+    history = session.execute(
+        select(RiskHistory.date, RiskHistory.risk_score)
+        .where(RiskHistory.project_id == project_id)
+        .order_by(RiskHistory.id.desc())
+        .limit(history_tail)
+    ).all()
     session.close()
     
-    return report.id
+    payload = {
+        'project': list(project) if project else None,
+        'risk_factors': [list(row) for row in factors],
+        'risk_history': [list(row) for row in history],
+        'model_config': model_config
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
 def get_risk_factors(project_id=None):
     """Get risk factors, optionally filtered by project ID."""
+    return [record.to_dict() for record in get_risk_factor_records(project_id)]
+def _stream_rows(statement, batch_size):
+    """Yield rows for a Core statement in fixed-size batches using a server-side cursor."""
     session = Session()
-    
+    try:
+        result = session.execute(statement.execution_options(yield_per=batch_size))
+        yield from result
+    finally:
+        session.close()
+def iter_projects(batch_size=STREAM_BATCH_SIZE, columns=None):
+    """
+    Stream all projects as lightweight row tuples without their risk factors or history.
+    Rows are fetched in batches of `batch_size`, so memory stays constant regardless of table size.
+    Pass `columns` (a list of column names) to fetch only those columns.
+    """
+    selected = [Project.__table__.c[name] for name in columns] if columns else Project.__table__.columns
+    statement = select(*selected).order_by(Project.id)
+    return _stream_rows(statement, batch_size)
+def iter_risk_factors(project_id=None, batch_size=STREAM_BATCH_SIZE):
+    """
+    Stream risk factors as lightweight row tuples, optionally filtered by project ID.
+    Rows are fetched in batches of `batch_size`, so memory stays constant regardless of table size.
+    """
+    statement = select(*RiskFactor.__table__.columns).order_by(RiskFactor.id)
     if project_id:
-        risk_factors = session.query(RiskFactor).filter(RiskFactor.project_id == project_id).all()
-    else:
-        risk_factors = session.query(RiskFactor).all()
-    
-    result = [factor.to_dict() for factor in risk_factors]
+        statement = statement.where(RiskFactor.project_id == project_id)
+    return _stream_rows(statement, batch_size)
+@traced("db.get_project_summaries", rows=True)
+def get_project_summaries(project_ids=None, columns=SUMMARY_COLUMNS):
+    """Get a few columns for projects (all, or the given IDs) without loading risk factors or history."""
+    statement = select(*[Project.__table__.c[name] for name in columns]).order_by(Project.id)
+    if project_ids is not None:
+        statement = statement.where(Project.id.in_(project_ids))
+    session = Session()
+    result = [dict(row._mapping) for row in session.execute(statement)]
     session.close()
-    
     return result
+@traced("db.get_risk_factors_by_project")
+def get_risk_factors_by_project(project_ids, limit_per_project=None):
+    """
+    Get the risk factors of many projects as {project_id: [factor dict, ...]}, highest scoring
+    (impact x likelihood) first, keeping at most `limit_per_project` per project if given.
+    IDs are queried in chunks of STREAM_BATCH_SIZE, so this is a handful of queries for any number of projects,
+    and the per-project limit is applied in the database, so factors beyond it are never fetched.
+    """
+    project_ids = list(project_ids)
+    result = {project_id: [] for project_id in project_ids}
+    score = func.coalesce(RiskFactor.impact, 0) * func.coalesce(RiskFactor.likelihood, 0)
+    session = Session()
+    for start in range(0, len(project_ids), STREAM_BATCH_SIZE):
+        ranked = (
+            select(
+                *RiskFactor.__table__.columns,
+                func.row_number().over(
+                    partition_by=RiskFactor.project_id, order_by=(score.desc(), RiskFactor.id)
+                ).label('rank')
+            )
+            .where(RiskFactor.project_id.in_(project_ids[start:start + STREAM_BATCH_SIZE]))
+            .subquery()
+        )
+        statement = select(*[ranked.c[column.name] for column in RiskFactor.__table__.columns])
+        if limit_per_project is not None:
+            statement = statement.where(ranked.c.rank <= limit_per_project)
+        statement = statement.order_by(ranked.c.project_id, ranked.c.rank)
+        for project_id, rows in groupby(session.execute(statement), key=lambda row: row.project_id):
+            result[project_id].extend(dict(row._mapping) for row in rows)
+    session.close()
+    return result
+def _risk_band_clause(band):
+    low, high = RISK_BANDS[band]
+    conditions = []
+    if low is not None:
+        conditions.append(Project.risk_score >= low)
+    if high is not None:
+        conditions.append(Project.risk_score < high)
+    return conditions[0] if len(conditions) == 1 else conditions[0] & conditions[1]
+def _project_filter_clauses(filters):
+    """
+    WHERE clauses for a project filters dict. Supported keys, all optional:
+    'statuses' (list), 'name' (substring), 'risk_bands' (list of RISK_BANDS keys),
+    'category_thresholds' ({category column: minimum score}), 'budget_min', 'budget_max',
+    'start_after' and 'end_before' (ISO dates).
+    """
+    filters = filters or {}
+    clauses = []
+    if filters.get('statuses'):
+        clauses.append(Project.status.in_(filters['statuses']))
+    if filters.get('name'):
+        clauses.append(Project.name.ilike(f"%{filters['name']}%"))
+    if filters.get('risk_bands'):
+        clauses.append(or_(*[_risk_band_clause(band) for band in filters['risk_bands']]))
+    for category, minimum in (filters.get('category_thresholds') or {}).items():
+        if category not in RISK_CATEGORIES:
+            raise ValueError(f"Unknown risk category: {category}")
+        clauses.append(Project.__table__.c[category] >= minimum)
+    if filters.get('budget_min') is not None:
+        clauses.append(Project.budget >= filters['budget_min'])
+    if filters.get('budget_max') is not None:
+        clauses.append(Project.budget <= filters['budget_max'])
+    if filters.get('start_after'):
+        clauses.append(Project.start_date >= str(filters['start_after']))
+    if filters.get('end_before'):
+        clauses.append(Project.end_date <= str(filters['end_before']))
+    return clauses
+@traced("db.get_project_page")
+def get_project_page(filters=None, sort_by='risk_score', descending=True, offset=0, limit=PROJECT_PAGE_SIZE, columns=TABLE_COLUMNS):
+    """
+    Get one page of projects, filtered, sorted and sliced in the database.
+    Returns (rows as dicts, total number of projects matching the filters).
+    """
+    if sort_by not in SORTABLE_COLUMNS:
+        raise ValueError(f"Cannot sort projects by {sort_by}; sortable columns are {', '.join(SORTABLE_COLUMNS)}")
+    clauses = _project_filter_clauses(filters)
+    sort_column = Project.__table__.c[sort_by]
+    statement = (
+        select(*[Project.__table__.c[name] for name in columns])
+        .where(*clauses)
+        # The ID breaks ties so pages do not overlap
+        .order_by(sort_column.desc() if descending else sort_column.asc(), Project.id)
+        .offset(offset)
+        .limit(limit)
+    )
+    session = Session()
+    total = session.execute(select(func.count(Project.id)).where(*clauses)).scalar()
+    rows = [dict(row._mapping) for row in session.execute(statement)]
+    session.close()
+    return rows, total
+def _count_where(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+def _facet_counts(session, filters=None):
+    """
+    Status, risk band and high-risk category counts of the projects matching `filters`, counted
+    disjunctively: each facet applies every filter except its own, so its counts show how many
+    projects selecting another value would match. One aggregate query per facet.
+    """
+    filters = filters or {}
+    def clauses_without(key):
+        return _project_filter_clauses({name: value for name, value in filters.items() if name != key})
+    statuses = dict(session.execute(
+        select(Project.status, func.count(Project.id)).where(*clauses_without('statuses')).group_by(Project.status)
+    ).all())
+    band_counts = session.execute(
+        select(*[_count_where(_risk_band_clause(band)) for band in RISK_BANDS]).where(*clauses_without('risk_bands'))
+    ).one()
+    high_low = RISK_BANDS['high'][0]
+    category_counts = session.execute(
+        select(*[_count_where(Project.__table__.c[category] >= high_low) for category in RISK_CATEGORIES])
+        .where(*clauses_without('category_thresholds'))
+    ).one()
+    return {
+        'status': statuses,
+        'risk_band': dict(zip(RISK_BANDS, map(int, band_counts))),
+        'category': dict(zip(RISK_CATEGORIES, map(int, category_counts)))
+    }
+@traced("db.query_projects")
+def query_projects(filters=None, columns=FACET_COLUMNS):
+    """
+    Get the summaries of the projects matching `filters` (see _project_filter_clauses),
+    highest risk first, with facet counts (see _facet_counts). The filters run in the database
+    on indexed columns and the facets are counted there too.
+    Returns {'projects': [...], 'total': n, 'facets': {'status': {...}, 'risk_band': {...}, 'category': {...}}};
+    category counts are the projects scoring in the high band for that category.
+    """
+    columns = list(dict.fromkeys([*columns, 'status', 'risk_score', *RISK_CATEGORIES]))
+    statement = (
+        select(*[Project.__table__.c[name] for name in columns])
+        .where(*_project_filter_clauses(filters))
+        .order_by(Project.risk_score.desc(), Project.id)
+    )
+    session = Session()
+    rows = [dict(row._mapping) for row in session.execute(statement)]
+    facets = _facet_counts(session, filters)
+    session.close()
+    return {'projects': rows, 'total': len(rows), 'facets': facets}
+@traced("db.get_top_risk_factors", rows=True)
+def get_top_risk_factors(filters=None, limit=5):
+    """
+    Get the highest scoring risk factors (impact x likelihood) of the projects matching `filters`,
+    as risk factor dicts with the project's name and ID and a 'risk_score' of impact x likelihood / 10.
+    """
+    score = RiskFactor.impact * RiskFactor.likelihood
+    statement = (
+        select(*RiskFactor.__table__.columns, Project.name.label('project_name'))
+        .join(Project, RiskFactor.project_id == Project.id)
+        .where(*_project_filter_clauses(filters))
+        .order_by(score.desc(), RiskFactor.id)
+        .limit(limit)
+    )
+    session = Session()
+    result = [
+        {**dict(row._mapping), 'risk_score': (row.impact or 0) * (row.likelihood or 0) / 10}
+        for row in session.execute(statement)
+    ]
+    session.close()
+    return result
+def _risk_factor_clauses(filters=None, categories=None):
+    """Filter clauses for risk factors joined to their projects: project filters plus factor categories."""
+    clauses = [*_project_filter_clauses(filters), RiskFactor.impact.isnot(None), RiskFactor.likelihood.isnot(None)]
+    if categories:
+        clauses.append(RiskFactor.category.in_(categories))
+    return clauses
+@traced("db.get_risk_factor_counts", rows=True)
+def get_risk_factor_counts(filters=None, categories=None):
+    """
+    Count the risk factors of the projects matching `filters` (optionally only factors in `categories`)
+    per distinct impact and likelihood, for binning into a risk matrix. Returns three float arrays:
+    impact, likelihood and the number of factors with that pair. The database does the counting, so
+    only one row per pair (at most 100 for 1-10 scores) is transferred however many factors match.
+    """
+    count = func.count().label('count')
+    statement = (
+        select(RiskFactor.impact, RiskFactor.likelihood, count)
+        .join(Project, RiskFactor.project_id == Project.id)
+        .where(*_risk_factor_clauses(filters, categories))
+        .group_by(RiskFactor.impact, RiskFactor.likelihood)
+    )
+    session = Session()
+    rows = session.execute(statement).all()
+    session.close()
+    impact, likelihood, counts = zip(*rows) if rows else ((), (), ())
+    return np.array(impact, dtype=float), np.array(likelihood, dtype=float), np.array(counts, dtype=float)
+@traced("db.get_cell_risk_factors", rows=True)
+def get_cell_risk_factors(impact_range, likelihood_range, filters=None, categories=None, limit=50):
+    """
+    Get the risk factors in one cell of a risk matrix, i.e. with impact and likelihood in the given
+    half-open [low, high) ranges, highest scoring first, with the project's name.
+    """
+    statement = (
+        select(*RiskFactor.__table__.columns, Project.name.label('project_name'))
+        .join(Project, RiskFactor.project_id == Project.id)
+        .where(
+            *_risk_factor_clauses(filters, categories),
+            RiskFactor.impact >= impact_range[0], RiskFactor.impact < impact_range[1],
+            RiskFactor.likelihood >= likelihood_range[0], RiskFactor.likelihood < likelihood_range[1]
+        )
+        .order_by((RiskFactor.impact * RiskFactor.likelihood).desc(), RiskFactor.id)
+        .limit(limit)
+    )
+    session = Session()
+    result = [dict(row._mapping) for row in session.execute(statement)]
+    session.close()
+    return result
+def get_settings():
+    """Get application settings, falling back to defaults for anything not saved."""
+    session = Session()
+    stored = {setting.key: setting.value for setting in session.query(AppSetting).all()}
+    session.close()
+    return {**DEFAULT_SETTINGS, **stored}
+def save_settings(settings):
+    """Persist the given settings, leaving any others unchanged."""
+    session = Session()
+    for key, value in settings.items():
+        session.merge(AppSetting(key=key, value=value))
+    session.commit()
+    session.close()
+def get_data_version():
+    """
+    Get the version of the project, risk factor and risk history tables: a counter that every
+    write to them through a session increments in the same transaction (see bump_data_version).
+    """
+    session = Session()
+    version = session.execute(select(DataVersion.version).where(DataVersion.name == PORTFOLIO_VERSION)).scalar()
+    session.close()
+    return version or 0
+def iter_project_risk_factors(batch_size=STREAM_BATCH_SIZE):
+    """Stream (project_id, [RiskFactorRecord, ...]) groups for every project that has risk factors."""
+    statement = select(*RiskFactor.__table__.columns).order_by(RiskFactor.project_id, RiskFactor.id)
+    records = (RiskFactorRecord(*row) for row in _stream_rows(statement, batch_size))
+    for project_id, factors in groupby(records, key=lambda record: record.project_id):
+        yield project_id, list(factors)
+def get_score_fingerprints():
+    """Get the risk factor fingerprint each project was last scored from, keyed by project ID."""
+    session = Session()
+    result = dict(session.query(ProjectScoreState.project_id, ProjectScoreState.fingerprint).all())
+    session.close()
+    return result
+def save_score_fingerprints(fingerprints):
+    """Record risk factor fingerprints for projects without changing their scores."""
+    session = Session()
+    for project_id, fingerprint in fingerprints.items():
+        session.merge(ProjectScoreState(project_id=project_id, fingerprint=fingerprint, scored_at=datetime.now()))
+    session.commit()
+    session.close()
+def apply_risk_scores(project_id, scores, fingerprint):
+    """Update a project's risk scores, append a history entry and record the fingerprint they came from."""
+    session = Session()
+    project = session.get(Project, project_id)
+    if project is None:
+        session.close()
+        return False
+    
+    previous_score = project.risk_score or 0
+    project.risk_score = scores['overall_risk']
+    project.risk_delta = round(scores['overall_risk'] - previous_score, 1)
+    for category in ('schedule_risk', 'budget_risk', 'resource_risk', 'market_risk', 'technical_risk'):
+        if category in scores:
+            setattr(project, category, scores[category])
+    project.risk_history.append(RiskHistory(date=datetime.now().strftime('%Y-%m-%d'), risk_score=scores['overall_risk']))
+    session.merge(ProjectScoreState(project_id=project_id, fingerprint=fingerprint, scored_at=datetime.now()))
+    session.commit()
+    session.close()
+    return True
+def acquire_lease(name, owner, ttl_seconds):
+    """Try to take a named lock for `ttl_seconds`. Returns True if this owner now holds it."""
+    now = datetime.now()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    session = Session()
+    try:
+        taken = session.query(Lease).filter(
+            Lease.name == name,
+            (Lease.expires_at < now) | (Lease.owner == owner)
+        ).update({'owner': owner, 'expires_at': expires_at}, synchronize_session=False)
+        if not taken:
+            if session.get(Lease, name) is not None:
+                return False
+            session.add(Lease(name=name, owner=owner, expires_at=expires_at))
+        session.commit()
+        return True
+    except IntegrityError:
+        session.rollback()
+        return False
+    finally:
+        session.close()
+def release_lease(name, owner):
+    """Release a named lock if this owner holds it."""
+    session = Session()
+    session.query(Lease).filter(Lease.name == name, Lease.owner == owner).delete(synchronize_session=False)
+    session.commit()
+    session.close()
+def get_recent_alert_keys(since):
+    """Get the (project_id, rule) pairs that have fired an alert since the given time."""
+    session = Session()
+    rows = session.query(AlertEvent.project_id, AlertEvent.rule).filter(AlertEvent.fired_at >= since).distinct().all()
+    session.close()
+    return {(project_id, rule) for project_id, rule in rows}
+def record_alert_events(alerts):
+    """Record sent alerts in a single bulk insert."""
+    if not alerts:
+        return
+    session = Session()
+    fired_at = datetime.now()
+    session.execute(AlertEvent.__table__.insert(), [
+        {
+            'project_id': alert['project_id'],
+            'rule': alert['rule'],
+            'value': alert['value'],
+            'threshold': alert['threshold'],
+            'fired_at': fired_at
+        }
+        for alert in alerts
+    ])
+    session.commit()
+    session.close()
+@traced("db.search_similar_risks", rows=True)
 def search_similar_risks(query_text, n_results=5):
     """
     Search for similar risk factors based on text query.
     Note: This is a simplified implementation that doesn't do semantic search.
     In a real application, you might want to use a vector database or full-text search.
     """
-    session = Session()
-    all_factors = session.query(RiskFactor).all()
+    # Stream factors together with their project name instead of looking up each project
+    statement = (
+        select(*RiskFactor.__table__.columns, Project.name.label('project_name'))
+        .outerjoin(Project, Project.id == RiskFactor.project_id)
+        .order_by(RiskFactor.id)
+    )
     
     # Very basic search by checking if query terms are in name or description
     query_terms = query_text.lower().split()
     matched_factors = []
     
-    for factor in all_factors:
-        factor_dict = factor.to_dict()
-        
-        # Get project name for context
-        project = session.query(Project).filter(Project.id == factor.project_id).first()
-        if project:
-            factor_dict['project_name'] = project.name
-        
+    for row in _stream_rows(statement, STREAM_BATCH_SIZE):
         # Simple keyword matching
-        name_lower = factor.name.lower()
-        desc_lower = factor.description.lower() if factor.description else ""
+        name_lower = row.name.lower()
+        desc_lower = row.description.lower() if row.description else ""
         
         match_score = 0
         for term in query_terms:
@@ -504,12 +1117,15 @@ def search_similar_risks(query_text, n_results=5):
                 match_score += 1
         
         if match_score > 0:
-            factor_dict['match_score'] = match_score
-            matched_factors.append(factor_dict)
+            matched_factors.append((match_score, row))
     
-    # Sort by match score and limit to n_results
-    matched_factors.sort(key=lambda x: x.get('match_score', 0), reverse=True)
-    result = matched_factors[:n_results]
-    
-    session.close()
+    # Keep the n_results best matches and only build dicts for those
+    top_matches = heapq.nlargest(n_results, matched_factors, key=lambda match: match[0])
+    result = []
+    for match_score, row in top_matches:
+        factor_dict = RiskFactorRecord(*row[:-1]).to_dict()
+        if row.project_name is not None:
+            factor_dict['project_name'] = row.project_name
+        factor_dict['match_score'] = match_score
+        result.append(factor_dict)
     return result
\ No newline at end of file
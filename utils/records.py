@@ -0,0 +1,108 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Tuple
+
+# Lightweight record types built directly from Core select() rows. They are plain
+# (not frozen) slotted dataclasses, since freezing makes every construction several
+# times slower; callers treat them as snapshots and do not modify them.
+# Field order matches the column order of the corresponding table so a row
+# tuple can be unpacked straight into a record without any per-column lookups.
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+@dataclass(slots=True)
+class RiskFactorRecord:
+    """A row of the risk_factors table."""
+    id: int
+    project_id: str
+    name: str
+    description: Optional[str]
+    category: Optional[str]
+    impact: Optional[int]
+    likelihood: Optional[int]
+    mitigation: Optional[str]
+
+    @property
+    def score(self):
+        """Combined impact x likelihood score on a 0-10 scale."""
+        return ((self.impact or 0) * (self.likelihood or 0)) / 10
+
+    def to_dict(self):
+        """Convert the record to the same dictionary shape as RiskFactor.to_dict()."""
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'name': self.name,
+            'description': self.description,
+            'category': self.category,
+            'impact': self.impact,
+            'likelihood': self.likelihood,
+            'mitigation': self.mitigation
+        }
+
+@dataclass(slots=True)
+class RiskHistoryRecord:
+    """A row of the risk_history table."""
+    id: int
+    project_id: str
+    date: str
+    risk_score: float
+
+    def to_dict(self):
+        """Convert the record to the same dictionary shape as RiskHistory.to_dict()."""
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'date': self.date,
+            'risk_score': self.risk_score
+        }
+
+@dataclass(slots=True)
+class ProjectRecord:
+    """A row of the projects table with its child records."""
+    id: str
+    name: str
+    description: Optional[str]
+    status: Optional[str]
+    start_date: Optional[str]
+    end_date: Optional[str]
+    budget: Optional[float]
+    spent: Optional[float]
+    team_size: Optional[int]
+    risk_score: Optional[float]
+    risk_delta: Optional[float]
+    schedule_risk: Optional[float]
+    budget_risk: Optional[float]
+    resource_risk: Optional[float]
+    market_risk: Optional[float]
+    technical_risk: Optional[float]
+    created_at: Optional[datetime]
+    updated_at: Optional[datetime]
+    risk_factors: Tuple[RiskFactorRecord, ...] = ()
+    risk_history: Tuple[RiskHistoryRecord, ...] = ()
+
+    def to_dict(self):
+        """Convert the record to the same dictionary shape as Project.to_dict()."""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'status': self.status,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'budget': self.budget,
+            'spent': self.spent,
+            'team_size': self.team_size,
+            'risk_score': self.risk_score,
+            'risk_delta': self.risk_delta,
+            'schedule_risk': self.schedule_risk,
+            'budget_risk': self.budget_risk,
+            'resource_risk': self.resource_risk,
+            'market_risk': self.market_risk,
+            'technical_risk': self.technical_risk,
+            'risk_factors': [rf.to_dict() for rf in self.risk_factors],
+            'risk_history': [rh.to_dict() for rh in self.risk_history],
+            'created_at': _isoformat(self.created_at),
+            'updated_at': _isoformat(self.updated_at)
+        }
@@ -0,0 +1,223 @@
+"""
+Offline rendering of project risk reports to HTML and PDF files.
+
+A report is assembled from stored data only: the project record (scores, risk
+factors and risk history) and the text of its latest generated risk report. The
+trend, matrix and radar figures are rendered to static PNG images with kaleido
+and embedded in a self-contained HTML file (the report.html.j2 template), which
+WeasyPrint prints to PDF. Rendered images are kept on disk per project, keyed
+by a hash of the figure, so a figure that has not changed since the last run is
+never rendered twice; images the project's report no longer uses are deleted.
+
+render_reports() renders many projects in a process pool. Workers load and write
+one project at a time and only file paths travel back, a bounded number of
+projects is in flight at once and each worker process is replaced after
+RENDER_TASKS_PER_WORKER reports, so memory stays flat for any portfolio size.
+
+Usage:
+    python -m utils.report_renderer [--projects PRJ001,PRJ002] [--workers 4] [--no-pdf]
+"""
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from plotly.utils import PlotlyJSONEncoder
+from utils.pg_database import RISK_CATEGORIES, engine, get_latest_report, get_project, iter_projects
+from utils.report_templates import render_template
+
+logger = logging.getLogger(__name__)
+
+REPORT_OUTPUT_DIR = os.environ.get("REPORT_OUTPUT_DIR", os.path.join("data", "reports"))
+RENDER_WORKERS = int(os.environ.get("REPORT_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Reports a worker process renders before it is replaced by a fresh one
+RENDER_TASKS_PER_WORKER = 50
+# Projects submitted to the pool but not yet finished, per worker
+IN_FLIGHT_PER_WORKER = 2
+FIGURE_WIDTH = 900
+FIGURE_HEIGHT = 500
+
+# Missing optional dependencies are reported once per process, not once per figure
+_warned = {'images': False, 'pdf': False}
+
+def figure_image_uri(fig, image_dir, used=None):
+    """
+    Render a figure to PNG, reusing the image stored for an identical figure, and return it
+    as a data URI. The image's file name is added to the set `used`, if given. Returns None
+    if kaleido (or the browser it drives) is not available.
+    """
+    # Sorted keys: a figure served from the figure cache lists its properties in another order
+    figure_json = json.dumps(fig.to_plotly_json(), sort_keys=True, cls=PlotlyJSONEncoder)
+    name = hashlib.sha256(figure_json.encode("utf-8")).hexdigest() + ".png"
+    path = os.path.join(image_dir, name)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            image = f.read()
+    else:
+        try:
+            image = fig.to_image(format="png", width=FIGURE_WIDTH, height=FIGURE_HEIGHT)
+        except (ImportError, ValueError, RuntimeError) as e:
+            if not _warned['images']:
+                logger.warning("Report figures skipped, static image export is unavailable: %s", e)
+                _warned['images'] = True
+            return None
+        # Written under a temporary name first so concurrent workers never read a partial file
+        partial_path = f"{path}.{os.getpid()}.tmp"
+        with open(partial_path, "wb") as f:
+            f.write(image)
+        os.replace(partial_path, path)
+    if used is not None:
+        used.add(name)
+    return "data:image/png;base64," + base64.b64encode(image).decode("ascii")
+
+def build_report_sections(project, report_text=None):
+    """Collect the figures and tables of a project's report from its stored data"""
+    # Imported here: the visualization module pulls in Streamlit, which only rendering needs
+    from components.risk_visualizations import create_risk_matrix, create_risk_radar_chart, create_risk_trend_chart
+
+    factors = sorted(
+        project.get('risk_factors') or [],
+        key=lambda factor: (factor.get('impact') or 0) * (factor.get('likelihood') or 0),
+        reverse=True
+    )
+    figures = [
+        ("Risk Trend", create_risk_trend_chart(project)),
+        ("Risk Matrix", create_risk_matrix(project)),
+        ("Risk Categories", create_risk_radar_chart(project))
+    ]
+    return {
+        'project': project,
+        'generated_at': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'categories': {
+            category: project.get(category) or 0
+            for category in RISK_CATEGORIES
+        },
+        'risk_factors': factors,
+        'figures': [(title, fig) for title, fig in figures if fig is not None],
+        'report_text': report_text
+    }
+
+def prune_images(image_dir, keep):
+    """Delete the files in image_dir whose names are not in `keep`"""
+    for name in os.listdir(image_dir):
+        if name not in keep:
+            try:
+                os.remove(os.path.join(image_dir, name))
+            except FileNotFoundError:
+                pass
+
+def render_report_html(sections, image_dir):
+    """
+    Render report sections as a self-contained HTML document. image_dir holds the images of
+    this report only: those of figures it no longer has are deleted.
+    """
+    images = []
+    used = set()
+    for title, fig in sections['figures']:
+        uri = figure_image_uri(fig, image_dir, used)
+        if uri:
+            images.append((title, uri))
+    prune_images(image_dir, used)
+    return render_template("report.html.j2", images=images, **sections)
+
+def write_pdf(report_html, path):
+    """Print report HTML to a PDF file; returns False if WeasyPrint is not installed"""
+    try:
+        from weasyprint import HTML
+    except ImportError:
+        if not _warned['pdf']:
+            logger.warning("PDF output skipped, WeasyPrint is not installed")
+            _warned['pdf'] = True
+        return False
+    HTML(string=report_html).write_pdf(path)
+    return True
+
+def render_project_report(project_id, output_dir=REPORT_OUTPUT_DIR, pdf=True):
+    """
+    Render one project's report to <output_dir>/<project_id>.html (and .pdf).
+    Returns {'project_id', 'html', 'pdf'} with the written paths, or None if the project does not exist.
+    """
+    project = get_project(project_id)
+    if project is None:
+        return None
+    stored_report = get_latest_report(project_id)
+    report_text = (stored_report['content'] or {}).get('report') if stored_report else None
+
+    # One directory per project: a worker renders a project at a time, so pruning never races
+    image_dir = os.path.join(output_dir, "images", project_id)
+    os.makedirs(image_dir, exist_ok=True)
+    report_html = render_report_html(build_report_sections(project, report_text), image_dir)
+
+    html_path = os.path.join(output_dir, f"{project_id}.html")
+    with open(html_path, "w", encoding="utf-8") as f:
+        f.write(report_html)
+    pdf_path = os.path.join(output_dir, f"{project_id}.pdf")
+    if not (pdf and write_pdf(report_html, pdf_path)):
+        pdf_path = None
+    return {'project_id': project_id, 'html': html_path, 'pdf': pdf_path}
+
+def _init_worker():
+    # Don't reuse pooled connections inherited from the parent process
+    engine.dispose(close=False)
+
+def render_reports(project_ids=None, output_dir=REPORT_OUTPUT_DIR, pdf=True, workers=RENDER_WORKERS, progress=None):
+    """
+    Render the reports of `project_ids` (default: every project) in a pool of `workers`
+    processes. If given, progress(fraction, message) is called as reports finish.
+    Returns the render_project_report() results of the projects that exist.
+    """
+    if project_ids is None:
+        project_ids = [row.id for row in iter_projects(columns=['id'])]
+    project_ids = list(project_ids)
+    if workers <= 1:
+        results = []
+        for i, project_id in enumerate(project_ids):
+            results.append(render_project_report(project_id, output_dir, pdf))
+            if progress:
+                progress((i + 1) / len(project_ids), f"Rendered {i + 1} of {len(project_ids)} reports")
+        return [result for result in results if result]
+
+    results = []
+    completed = 0
+    pending = iter(project_ids)
+    max_in_flight = workers * IN_FLIGHT_PER_WORKER
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             max_tasks_per_child=RENDER_TASKS_PER_WORKER) as pool:
+        in_flight = set()
+        while True:
+            # Top up the window instead of submitting every project at once
+            for project_id in pending:
+                in_flight.add(pool.submit(render_project_report, project_id, output_dir, pdf))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                break
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if result:
+                    results.append(result)
+            completed += len(done)
+            if progress:
+                progress(completed / len(project_ids), f"Rendered {completed} of {len(project_ids)} reports")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Render project risk reports to HTML and PDF")
+    parser.add_argument("--projects", help="comma-separated project IDs (default: all projects)")
+    parser.add_argument("--output-dir", default=REPORT_OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=RENDER_WORKERS)
+    parser.add_argument("--no-pdf", action="store_true", help="only write HTML")
+    args = parser.parse_args()
+
+    project_ids = args.projects.split(",") if args.projects else None
+    start = time.perf_counter()
+    results = render_reports(project_ids, args.output_dir, pdf=not args.no_pdf, workers=args.workers)
+    print(f"Rendered {len(results)} reports to {args.output_dir} in {time.perf_counter() - start:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Jinja2 templates for risk reports and mitigation strategies.
+
+Templates live in utils/templates. They are compiled once per process and kept
+in memory, and the environment does not check the files for changes, so
+rendering a report costs only the template's own Python code. HTML templates
+are autoescaped; markdown templates are not.
+"""
+import functools
+import os
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+# Compiled templates kept in memory; larger than the number of templates shipped
+TEMPLATE_CACHE_SIZE = 100
+
+def category_label(category):
+    """'schedule_risk' -> 'Schedule Risk'"""
+    return (category or 'Uncategorized').replace('_', ' ').title()
+
+@functools.lru_cache(maxsize=None)
+def get_environment():
+    """The shared template environment, created on first use."""
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        # Matched against the full name, so report.html.j2 needs its own entry
+        autoescape=select_autoescape(['html', 'html.j2']),
+        cache_size=TEMPLATE_CACHE_SIZE,
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True
+    )
+    environment.filters['category_label'] = category_label
+    return environment
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def get_template(name):
+    return get_environment().get_template(name)
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def get_mitigation_template(category):
+    """The mitigation template for a risk category, falling back to the generic one."""
+    return get_environment().select_template([f"mitigation/{category}.md.j2", "mitigation/default.md.j2"])
+
+def render_template(name, **context):
+    return get_template(name).render(**context)
@@ -0,0 +1,218 @@
+"""
+In-process refresh scheduler driven by the persisted Settings page values.
+
+At the configured update frequency (with jitter, so several app processes do not
+fire together) the scheduler checks whether any project data changed since the
+last refresh and, if so, runs the refresh steps: incremental rescoring of the
+projects whose risk factors changed, report regeneration for those projects and
+alert evaluation across the portfolio. Runs are serialised with an in-process
+lock plus a database lease, so overlapping runs are skipped rather than stacked.
+The lease is renewed between steps, so a long run keeps it.
+"""
+import hashlib
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime
+from utils.pg_database import (
+    acquire_lease, apply_risk_scores, get_data_version, get_score_fingerprints, get_settings,
+    iter_project_risk_factors, release_lease, save_score_fingerprints, save_settings
+)
+
+FREQUENCY_SECONDS = {
+    'Hourly': 60 * 60,
+    'Daily': 24 * 60 * 60,
+    'Weekly': 7 * 24 * 60 * 60
+}
+# Each wait is randomly stretched or shrunk by up to this fraction of the interval
+JITTER_FRACTION = 0.1
+REFRESH_LEASE = 'scheduled_refresh'
+# A lease not renewed for this long is treated as abandoned by a crashed process
+REFRESH_LEASE_SECONDS = 60 * 60
+# After a run is skipped (another process holds the lease) or fails, wait this long before trying again
+RETRY_BACKOFF_SECONDS = 60
+
+# Steps run on each refresh, in order. Each is called as step(changed_project_ids, settings).
+REFRESH_STEPS = []
+
+def refresh_step(func):
+    """Register a function to run on every scheduled refresh."""
+    REFRESH_STEPS.append(func)
+    return func
+
+def _factor_fingerprint(factors):
+    encoded = repr([(f.id, f.category, f.impact, f.likelihood) for f in factors]).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def rescore_changed_projects():
+    """
+    Rescore only the projects whose risk factors changed since they were last scored.
+    Projects seen for the first time keep their current scores and are only recorded,
+    so imported or manually entered scores are not overwritten.
+    Returns the IDs of the rescored projects.
+    """
+    from agents.risk_scoring_agent import RiskScoringAgent
+    scorer = RiskScoringAgent(llm=None)
+
+    known = get_score_fingerprints()
+    first_seen = {}
+    rescored = []
+    for project_id, factors in iter_project_risk_factors():
+        fingerprint = _factor_fingerprint(factors)
+        previous = known.get(project_id)
+        if previous == fingerprint:
+            continue
+        if previous is None:
+            first_seen[project_id] = fingerprint
+            continue
+
+        project_data = {}
+        for factor in factors:
+            project_data.setdefault(f"{factor.category}_factors", []).append(
+                {'name': factor.name, 'impact': factor.impact or 0, 'likelihood': factor.likelihood or 0}
+            )
+        scores = scorer.score_project_risk(project_id, project_data)
+        if apply_risk_scores(project_id, scores, fingerprint):
+            rescored.append(project_id)
+
+    if first_seen:
+        save_score_fingerprints(first_seen)
+    return rescored
+
+@refresh_step
+def regenerate_reports(changed_project_ids, settings):
+    """Queue report regeneration for projects whose data changed."""
+    from utils.job_queue import enqueue_job
+    for project_id in changed_project_ids:
+        enqueue_job('risk_report', {'project_id': project_id})
+
+@refresh_step
+def evaluate_alerts(changed_project_ids, settings):
+    """Evaluate alert rules across the whole portfolio once rescoring has finished."""
+    from utils.alerts import run_alert_evaluation
+    run_alert_evaluation(settings)
+
+class RefreshScheduler:
+    """Background thread that runs the refresh steps at the configured update frequency."""
+
+    def __init__(self, jitter=JITTER_FRACTION, retry_backoff=RETRY_BACKOFF_SECONDS):
+        self.jitter = jitter
+        self.retry_backoff = retry_backoff
+        # Monotonic time before which no new attempt is made, set when a run is skipped or fails
+        self._retry_at = 0.0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self)}"
+        self._run_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the scheduler thread if it is not already running."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def reschedule(self):
+        """Recompute the next run time, e.g. after the update frequency was changed."""
+        self._wake.set()
+
+    def seconds_until_next_run(self, settings=None):
+        settings = settings or get_settings()
+        interval = FREQUENCY_SECONDS.get(settings.get('update_frequency'), FREQUENCY_SECONDS['Daily'])
+        delay = interval * (1 + random.uniform(-self.jitter, self.jitter))
+        last_refresh = settings.get('last_refresh_at')
+        if last_refresh:
+            elapsed = (datetime.now() - datetime.fromisoformat(last_refresh)).total_seconds()
+            delay -= elapsed
+        # last_refresh_at only moves on completed runs, so skipped and failed ones back off here
+        return max(delay, self._retry_at - time.monotonic(), 0)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            if self._wake.wait(self.seconds_until_next_run()):
+                continue
+            try:
+                self.run_once()
+            except Exception:
+                traceback.print_exc()
+
+    def run_once(self, force=False):
+        """
+        Run a refresh now unless one is already in progress or nothing has changed.
+        Returns the list of rescored project IDs, or None if the run was skipped.
+        """
+        if not self._run_lock.acquire(blocking=False):
+            self._back_off()
+            return None
+        try:
+            if not acquire_lease(REFRESH_LEASE, self.owner, REFRESH_LEASE_SECONDS):
+                self._back_off()
+                return None
+            try:
+                return self._refresh(force)
+            except Exception:
+                self._back_off()
+                raise
+            finally:
+                release_lease(REFRESH_LEASE, self.owner)
+        finally:
+            self._run_lock.release()
+
+    def _renew_lease(self):
+        # If the lease expired and another process took over, the rest of the run is left to it
+        if acquire_lease(REFRESH_LEASE, self.owner, REFRESH_LEASE_SECONDS):
+            return True
+        self._back_off()
+        return False
+
+    def _back_off(self):
+        self._retry_at = time.monotonic() + self.retry_backoff
+
+    def _refresh(self, force):
+        # Documents live outside the database, so they are checked on every run;
+        # unchanged files only cost a stat call
+        from utils.vector_store import ingest_documents
+        ingest_documents()
+
+        settings = get_settings()
+        version = get_data_version()
+        if not force and version == settings.get('last_refresh_version'):
+            save_settings({'last_refresh_at': datetime.now().isoformat()})
+            return None
+
+        if not self._renew_lease():
+            return None
+        changed_project_ids = rescore_changed_projects()
+        for step in REFRESH_STEPS:
+            if not self._renew_lease():
+                return None
+            step(changed_project_ids, settings)
+
+        # Rescoring itself changes the data, so record the version after it ran
+        save_settings({
+            'last_refresh_at': datetime.now().isoformat(),
+            'last_refresh_version': get_data_version()
+        })
+        return changed_project_ids
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Get this process's scheduler, creating and starting it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RefreshScheduler()
+            _scheduler.start()
+    return _scheduler
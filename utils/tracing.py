@@ -0,0 +1,232 @@
+"""
+Lightweight tracing for the chat, database, LLM and agent paths.
+
+Wrap a stage in `with span("stage.name", key=value) as s:` or decorate a function
+with `@traced("stage.name")`. Spans nest through a context variable, so a chat turn
+becomes one trace containing its handler, database queries and LLM calls.
+
+Finished spans are kept in memory per stage for the p50/p95 figures on the
+Diagnostics page. Export is opt-in: when TRACE_EXPORT_PATH is set, spans are also
+appended to that file as OTLP/JSON export requests, one per line, which the
+OpenTelemetry collector's otlpjsonfile receiver can read. Once the file reaches
+TRACE_EXPORT_MAX_MB it is rotated to <path>.1, replacing the previous rotation,
+so the export never takes more than twice that on disk.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+import numpy as np
+
+# e.g. data/traces/spans.jsonl; spans are only exported when this is set
+TRACE_EXPORT_PATH = os.environ.get("TRACE_EXPORT_PATH", "")
+TRACE_EXPORT_MAX_BYTES = int(os.environ.get("TRACE_EXPORT_MAX_MB", "64")) * 1024 * 1024
+# Spans written between checks of the export file's size
+ROTATE_CHECK_INTERVAL = 100
+SERVICE_NAME = "ai-project-risk-management"
+# Most recent durations kept per stage for the percentile figures
+STATS_WINDOW = 1000
+# How much of the end of the export file is read for cross-process statistics
+EXPORT_TAIL_BYTES = 4 * 1024 * 1024
+
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_current_span = ContextVar("current_span", default=None)
+_durations = defaultdict(lambda: deque(maxlen=STATS_WINDOW))
+_stats_lock = threading.Lock()
+_export_file = None
+_export_lock = threading.Lock()
+_written_since_check = 0
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str = None
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: dict = field(default_factory=dict)
+    status: int = STATUS_OK
+    status_message: str = ""
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+def _new_id(size):
+    return os.urandom(size).hex()
+
+def _start_span(name, attributes):
+    parent = _current_span.get()
+    return Span(
+        name=name,
+        trace_id=parent.trace_id if parent else _new_id(16),
+        span_id=_new_id(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=dict(attributes)
+    )
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a span; yields the Span so attributes can be added."""
+    current = _start_span(name, attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter_ns()
+    try:
+        yield current
+    except Exception as e:
+        current.status = STATUS_ERROR
+        current.status_message = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.end_ns = current.start_ns + time.perf_counter_ns() - start
+        _current_span.reset(token)
+        _finish(current)
+
+def traced(name=None, rows=False):
+    """Decorator that runs the function in a span; with rows=True the result's length is recorded as db.rows."""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name) as current:
+                result = func(*args, **kwargs)
+                if rows and result is not None:
+                    current.set_attribute("db.rows", len(result) if hasattr(result, "__len__") else 1)
+                return result
+        return wrapper
+    return decorator
+
+def record_span(name, start_ns, end_ns, **attributes):
+    """Record a stage that was timed elsewhere (e.g. from a callback), as a child of the current span."""
+    current = _start_span(name, attributes)
+    current.start_ns = start_ns
+    current.end_ns = end_ns
+    _finish(current)
+
+def _finish(finished):
+    with _stats_lock:
+        _durations[finished.name].append(finished.duration_ms)
+    if TRACE_EXPORT_PATH:
+        _export(finished)
+
+def _attribute_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _to_otlp(finished):
+    """Wrap a span in an OTLP/JSON ExportTraceServiceRequest."""
+    otlp_span = {
+        "traceId": finished.trace_id,
+        "spanId": finished.span_id,
+        "name": finished.name,
+        "kind": 1,
+        "startTimeUnixNano": str(finished.start_ns),
+        "endTimeUnixNano": str(finished.end_ns),
+        "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in finished.attributes.items()],
+        "status": {"code": finished.status, "message": finished.status_message}
+    }
+    if finished.parent_id:
+        otlp_span["parentSpanId"] = finished.parent_id
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+        "scopeSpans": [{"scope": {"name": __name__}, "spans": [otlp_span]}]
+    }]}
+
+def _open_export():
+    global _export_file
+    os.makedirs(os.path.dirname(TRACE_EXPORT_PATH) or ".", exist_ok=True)
+    _export_file = open(TRACE_EXPORT_PATH, "a", encoding="utf-8", buffering=1)
+
+def _rotate_export():
+    """Rotate the export file once it is full, and follow a rotation done by another process."""
+    global _export_file
+    opened = os.fstat(_export_file.fileno())
+    try:
+        current = os.stat(TRACE_EXPORT_PATH)
+    except FileNotFoundError:
+        current = None
+    if current is not None and current.st_ino == opened.st_ino and opened.st_size < TRACE_EXPORT_MAX_BYTES:
+        return
+    _export_file.close()
+    _export_file = None
+    if current is not None and current.st_ino == opened.st_ino:
+        os.replace(TRACE_EXPORT_PATH, TRACE_EXPORT_PATH + ".1")
+    _open_export()
+
+def _export(finished):
+    global _written_since_check
+    line = json.dumps(_to_otlp(finished))
+    with _export_lock:
+        try:
+            if _export_file is None:
+                _open_export()
+                _rotate_export()
+            elif _written_since_check >= ROTATE_CHECK_INTERVAL:
+                _rotate_export()
+                _written_since_check = 0
+            _export_file.write(line + "\n")
+            _written_since_check += 1
+        except OSError:
+            # Tracing must never break the traced code path
+            pass
+
+def _exported_durations(path, tail_bytes):
+    """Durations per stage from the end of the export file, which also holds spans from other processes."""
+    durations = defaultdict(lambda: deque(maxlen=STATS_WINDOW))
+    try:
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            offset = max(0, f.tell() - tail_bytes)
+            f.seek(offset)
+            lines = f.read().splitlines()
+    except OSError:
+        return {}
+    # The first line is probably cut short when reading from the middle of the file
+    for line in lines[1:] if offset else lines:
+        try:
+            for resource_spans in json.loads(line)["resourceSpans"]:
+                for scope_spans in resource_spans["scopeSpans"]:
+                    for exported in scope_spans["spans"]:
+                        duration = int(exported["endTimeUnixNano"]) - int(exported["startTimeUnixNano"])
+                        durations[exported["name"]].append(duration / 1e6)
+        except (ValueError, KeyError):
+            continue
+    return durations
+
+def get_stage_stats(from_export=False, tail_bytes=EXPORT_TAIL_BYTES):
+    """
+    Per-stage count and p50/p95/max latency in ms over the most recent spans, slowest p95 first.
+    With from_export the spans are read from the export file, so background workers are included.
+    """
+    if from_export:
+        durations = {name: np.fromiter(values, dtype=float) for name, values in _exported_durations(TRACE_EXPORT_PATH, tail_bytes).items()}
+    else:
+        with _stats_lock:
+            durations = {name: np.fromiter(values, dtype=float) for name, values in _durations.items() if values}
+    stats = []
+    for name, values in durations.items():
+        p50, p95 = np.percentile(values, [50, 95])
+        stats.append({'stage': name, 'count': len(values), 'p50_ms': p50, 'p95_ms': p95, 'max_ms': values.max()})
+    return sorted(stats, key=lambda stage: stage['p95_ms'], reverse=True)
+
+def reset_stats():
+    with _stats_lock:
+        _durations.clear()
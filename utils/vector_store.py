@@ -0,0 +1,329 @@
+"""
+Chunked ingestion and retrieval for the market intelligence documents in data/docs.
+
+Files are streamed in bounded blocks, so a file never has to fit in memory, and
+split into overlapping chunks at paragraph breaks and, within long paragraphs, at
+content-defined boundaries; short paragraphs such as headings are merged into the
+next one. Chunk boundaries depend only on the text around them, so an edit changes
+the chunks it touches (and the overlap of the chunk after them) and the rest of
+the document keeps its content hashes. Files whose size and modification time are unchanged since the
+last ingest are skipped without being read; in changed files, chunks whose
+content hash is already stored are kept as they are and only new chunks are
+embedded, in batches. Embeddings are hashed bag-of-words vectors, which need no
+model download and embed a whole batch with a few numpy operations.
+
+Ingest runs at app startup and on every scheduled refresh, never in a search, and
+is guarded by a lease so only one process ingests at a time. Searches score an
+in-memory embedding matrix of up to INDEX_MAX_CHUNKS chunks; larger corpora are
+scanned from the database batch by batch instead of being held in memory.
+
+Ingest manually with:
+    python -m utils.vector_store [--docs-dir data/docs]
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import uuid
+import zlib
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from utils.pg_database import (
+    DocumentChunk, DocumentFile, Session, acquire_lease, initialize_database, release_lease
+)
+from utils.tracing import traced
+
+DOCS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "docs")
+DOCUMENT_EXTENSIONS = ('.txt', '.md')
+# Within a paragraph, a chunk ends after a word pair whose hash is divisible by CHUNK_BOUNDARY_DIVISOR,
+# so chunks average about that many words, bounded by CHUNK_MIN_WORDS and CHUNK_MAX_WORDS
+CHUNK_MIN_WORDS = 40
+CHUNK_MAX_WORDS = 400
+CHUNK_BOUNDARY_DIVISOR = 150
+# Words of the previous chunk repeated at the start of the next, so text crossing a boundary is whole in one chunk
+CHUNK_OVERLAP_WORDS = 30
+READ_BLOCK_SIZE = 1024 * 1024
+EMBED_BATCH_SIZE = 256
+EMBEDDING_DIMENSIONS = 1024
+# Chunks whose embeddings are kept in memory for search; about 4 KB each
+INDEX_MAX_CHUNKS = int(os.environ.get("VECTOR_INDEX_MAX_CHUNKS", "50000"))
+SCAN_BATCH_SIZE = 5000
+INGEST_LEASE = 'document_ingest'
+# Renewed after every file, so this only has to cover ingesting the largest single file
+INGEST_LEASE_SECONDS = 600
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Yielded by iter_words between paragraphs
+PARAGRAPH_BREAK = None
+
+def iter_words(path, block_size=READ_BLOCK_SIZE):
+    """
+    Stream the whitespace-separated words of a text file without reading it all at once,
+    yielding PARAGRAPH_BREAK for each run of blank lines.
+    """
+    with open(path, encoding="utf-8", errors="replace") as f:
+        remainder = ""
+        in_break = False
+        while True:
+            # Lines are read at most block_size characters at a time
+            line = f.readline(block_size)
+            if not line:
+                break
+            if not remainder and line.endswith("\n") and line.isspace():
+                if not in_break:
+                    yield PARAGRAPH_BREAK
+                    in_break = True
+                continue
+            in_break = False
+            line = remainder + line
+            words = line.split()
+            # A word cut off at the end of the block continues in the next one
+            remainder = words.pop() if words and not line[-1].isspace() else ""
+            yield from words
+        if remainder:
+            yield remainder
+
+def _is_boundary(previous_word, word, divisor):
+    return zlib.crc32(f"{previous_word} {word}".encode("utf-8")) % divisor == 0
+
+def iter_chunks(words, min_words=CHUNK_MIN_WORDS, max_words=CHUNK_MAX_WORDS, divisor=CHUNK_BOUNDARY_DIVISOR,
+                overlap=CHUNK_OVERLAP_WORDS):
+    """
+    Group words into chunks of at least `min_words` new words that end at paragraph breaks and, inside long
+    paragraphs, after word pairs whose hash is divisible by `divisor`, or at `max_words`. Paragraphs shorter
+    than `min_words` are merged into the next one. Each chunk starts with the last `overlap` words of the
+    previous chunk.
+    """
+    tail, chunk = [], []
+    for word in words:
+        if word is PARAGRAPH_BREAK:
+            if len(chunk) < min_words:
+                continue
+        else:
+            chunk.append(word)
+            if len(chunk) < max_words and (len(chunk) < min_words or not _is_boundary(chunk[-2], word, divisor)):
+                continue
+        yield " ".join(tail + chunk)
+        tail = chunk[-overlap:] if overlap else []
+        chunk = []
+    if chunk:
+        yield " ".join(tail + chunk)
+
+def embed_texts(texts):
+    """Embed a batch of texts as L2-normalised hashed bag-of-words vectors."""
+    rows, columns = [], []
+    for row, text in enumerate(texts):
+        for word in _WORD_PATTERN.findall(text.lower()):
+            rows.append(row)
+            columns.append(zlib.crc32(word.encode("utf-8")) % EMBEDDING_DIMENSIONS)
+    vectors = np.zeros((len(texts), EMBEDDING_DIMENSIONS), dtype=np.float32)
+    np.add.at(vectors, (rows, columns), 1.0)
+    # Sublinear term frequency so repeated words do not dominate a chunk
+    np.log1p(vectors, out=vectors)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+def _list_documents(docs_dir):
+    for root, _dirs, files in os.walk(os.path.abspath(docs_dir)):
+        for name in sorted(files):
+            if name.lower().endswith(DOCUMENT_EXTENSIONS):
+                yield os.path.join(root, name)
+
+def _flush(session, path, pending):
+    vectors = embed_texts([text for _hash, text in pending]).astype(np.float16)
+    session.execute(DocumentChunk.__table__.insert(), [
+        {'source_path': path, 'content_hash': content_hash, 'text': text, 'embedding': vector.tobytes()}
+        for (content_hash, text), vector in zip(pending, vectors)
+    ])
+    pending.clear()
+
+def ingest_file(session, path, stat):
+    """Ingest one changed file: embed and store new chunks, drop chunks that disappeared. Returns chunks added."""
+    document = session.get(DocumentFile, path)
+    if document is None:
+        try:
+            with session.begin_nested():
+                session.add(DocumentFile(path=path, size=stat.st_size, modified_at=stat.st_mtime))
+        except IntegrityError:
+            # Added by another process since the lookup above; update its row instead
+            pass
+        document = session.get(DocumentFile, path)
+
+    stored = dict(session.query(DocumentChunk.content_hash, DocumentChunk.id).filter(DocumentChunk.source_path == path))
+    seen = set()
+    pending = []
+    added = 0
+    for text in iter_chunks(iter_words(path)):
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        if content_hash in stored:
+            continue
+        pending.append((content_hash, text))
+        added += 1
+        if len(pending) >= EMBED_BATCH_SIZE:
+            _flush(session, path, pending)
+    if pending:
+        _flush(session, path, pending)
+
+    removed_ids = [chunk_id for content_hash, chunk_id in stored.items() if content_hash not in seen]
+    if removed_ids:
+        session.query(DocumentChunk).filter(DocumentChunk.id.in_(removed_ids)).delete(synchronize_session=False)
+    document.size = stat.st_size
+    document.modified_at = stat.st_mtime
+    session.commit()
+    return added
+
+def ingest_documents(docs_dir=DOCS_DIR):
+    """
+    Bring the stored chunks in line with the documents in docs_dir, unless another process is already
+    ingesting. Returns a dict with the number of files processed, skipped and removed, chunks added,
+    and whether the run was skipped because the ingest lease was held.
+    """
+    stats = {'files_processed': 0, 'files_skipped': 0, 'files_removed': 0, 'chunks_added': 0, 'lease_held': False}
+    if not os.path.isdir(docs_dir):
+        return stats
+
+    owner = uuid.uuid4().hex
+    if not acquire_lease(INGEST_LEASE, owner, INGEST_LEASE_SECONDS):
+        stats['lease_held'] = True
+        return stats
+    try:
+        _ingest_documents(os.path.abspath(docs_dir), owner, stats)
+    finally:
+        release_lease(INGEST_LEASE, owner)
+    return stats
+
+def _ingest_documents(docs_dir, owner, stats):
+    session = Session()
+    known = {
+        document.path: document
+        for document in session.query(DocumentFile).filter(DocumentFile.path.startswith(docs_dir + os.sep))
+    }
+    present = set()
+    for path in _list_documents(docs_dir):
+        present.add(path)
+        stat = os.stat(path)
+        document = known.get(path)
+        if document is not None and document.size == stat.st_size and document.modified_at == stat.st_mtime:
+            stats['files_skipped'] += 1
+            continue
+        stats['chunks_added'] += ingest_file(session, path, stat)
+        stats['files_processed'] += 1
+        if not acquire_lease(INGEST_LEASE, owner, INGEST_LEASE_SECONDS):
+            # The lease expired and another process took over; leave the rest to it
+            session.close()
+            return
+
+    for path in set(known) - present:
+        session.query(DocumentChunk).filter(DocumentChunk.source_path == path).delete(synchronize_session=False)
+        session.query(DocumentFile).filter(DocumentFile.path == path).delete(synchronize_session=False)
+        stats['files_removed'] += 1
+    session.commit()
+    session.close()
+
+_ingest_thread = None
+_ingest_thread_lock = threading.Lock()
+
+def start_ingest(docs_dir=DOCS_DIR):
+    """Ingest the documents in a background thread, once per process. Returns the thread."""
+    global _ingest_thread
+    with _ingest_thread_lock:
+        if _ingest_thread is None:
+            _ingest_thread = threading.Thread(
+                target=ingest_documents, args=(docs_dir,), name="document-ingest", daemon=True
+            )
+            _ingest_thread.start()
+        return _ingest_thread
+
+_index = None
+_index_version = None
+_index_lock = threading.Lock()
+
+def _embedding_matrix(rows):
+    ids = np.array([row.id for row in rows], dtype=np.int64)
+    matrix = np.frombuffer(b"".join(row.embedding for row in rows), dtype=np.float16)
+    return ids, matrix.reshape(len(rows), EMBEDDING_DIMENSIONS).astype(np.float32)
+
+def _chunk_index():
+    """
+    Get the (chunk IDs, embedding matrix) index, reloading it when chunks were added or removed,
+    or None if there are more than INDEX_MAX_CHUNKS chunks to hold in memory.
+    """
+    global _index, _index_version
+    session = Session()
+    try:
+        version = session.execute(select(func.count(DocumentChunk.id), func.max(DocumentChunk.id))).one()
+        with _index_lock:
+            if version[0] > INDEX_MAX_CHUNKS:
+                _index = _index_version = None
+                return None
+            if _index is None or version != _index_version:
+                _index = _embedding_matrix(session.execute(select(DocumentChunk.id, DocumentChunk.embedding)).all())
+                _index_version = version
+            return _index
+    finally:
+        session.close()
+
+def _best_matches(ids, scores, n_results):
+    """The IDs and scores of the n_results best positive scores, best first."""
+    count = min(n_results, len(ids))
+    if count == 0:
+        return ids[:0], scores[:0]
+    top = np.argpartition(-scores, count - 1)[:count]
+    top = top[np.argsort(-scores[top])]
+    top = top[scores[top] > 0]
+    return ids[top], scores[top]
+
+def _scan_matches(query_vector, n_results):
+    """Find the best matches by streaming the stored embeddings, keeping only the best so far in memory."""
+    best_ids, best_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    session = Session()
+    result = session.execute(
+        select(DocumentChunk.id, DocumentChunk.embedding).execution_options(yield_per=SCAN_BATCH_SIZE)
+    )
+    for rows in result.partitions():
+        ids, matrix = _embedding_matrix(rows)
+        best_ids, best_scores = _best_matches(
+            np.concatenate([best_ids, ids]), np.concatenate([best_scores, matrix @ query_vector]), n_results
+        )
+    session.close()
+    return best_ids, best_scores
+
+@traced("db.search_risks", rows=True)
+def search_risks(query, n_results=5):
+    """Return the document chunks most similar to the query, best first, as dicts with text, source and score."""
+    query_vector = embed_texts([query])[0]
+    index = _chunk_index()
+    if index is None:
+        ids, scores = _scan_matches(query_vector, n_results)
+    else:
+        ids, matrix = index
+        ids, scores = _best_matches(ids, matrix @ query_vector, n_results)
+    if len(ids) == 0:
+        return []
+
+    session = Session()
+    chunks = {
+        chunk.id: chunk
+        for chunk in session.query(DocumentChunk.id, DocumentChunk.source_path, DocumentChunk.text)
+        .filter(DocumentChunk.id.in_([int(chunk_id) for chunk_id in ids]))
+    }
+    session.close()
+    return [
+        {'text': chunks[chunk_id].text, 'source': chunks[chunk_id].source_path, 'score': float(score)}
+        for chunk_id, score in zip(ids.tolist(), scores) if chunk_id in chunks
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest market intelligence documents for retrieval")
+    parser.add_argument("--docs-dir", default=DOCS_DIR)
+    args = parser.parse_args()
+    initialize_database()
+    print(ingest_documents(args.docs_dir))
+
+if __name__ == "__main__":
+    main()